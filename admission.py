@@ -0,0 +1,83 @@
+"""
+Kiểm soát truy cập lệnh tra cứu - giới hạn tốc độ theo người dùng/chat, bỏ yêu cầu lặp lại và giảm tải khi quá tải
+"""
+
+import threading
+
+from cache import BoNhoDemTTL
+from scheduler import BoDemToken
+
+# Kết quả kiểm tra
+CHO_PHEP = "cho_phep"
+GIOI_HAN_USER = "gioi_han_user"
+GIOI_HAN_CHAT = "gioi_han_chat"
+TRUNG_LAP = "trung_lap"
+QUA_TAI = "qua_tai"
+
+KHOANG_THONG_BAO = 30.0  # Giây giữa hai lần thông báo từ chối cho cùng người dùng/chat
+
+class BoKiemSoatTruyCap:
+    """
+    Đứng trước các lệnh tra cứu: token bucket theo user và theo group, bỏ các yêu cầu giống hệt
+    của cùng người dùng trong khoảng flood_dedupe_window giây, và từ chối khi số việc tồn đọng
+    vượt shed_backlog. Mỗi người dùng/chat chỉ nhận một thông báo từ chối trong mỗi khoảng thời gian.
+    """
+    def __init__(self, cau_hinh):
+        self.cau_hinh = cau_hinh
+        # Giữ bucket ít nhất bằng thời gian nạp đầy, bucket hết hạn được thay bằng bucket đầy nên không sai lệch
+        self._ttl_bucket = max(60.0, 2 * 60.0 * max(
+            cau_hinh.flood_user_burst / max(cau_hinh.flood_user_rate, 0.001),
+            cau_hinh.flood_chat_burst / max(cau_hinh.flood_chat_rate, 0.001)
+        ))
+        self._theo_user = BoNhoDemTTL(20000, self._ttl_bucket)
+        self._theo_chat = BoNhoDemTTL(20000, self._ttl_bucket)
+        self._gan_day = BoNhoDemTTL(20000, cau_hinh.flood_dedupe_window)
+        self._da_thong_bao = BoNhoDemTTL(20000, KHOANG_THONG_BAO)
+        self._khoa = threading.Lock()
+        self.thong_ke = {CHO_PHEP: 0, GIOI_HAN_USER: 0, GIOI_HAN_CHAT: 0, TRUNG_LAP: 0, QUA_TAI: 0}
+
+    def _lay_bucket(self, bo_nho: BoNhoDemTTL, khoa, toc_do_phut: float, dung_luong: float) -> BoDemToken:
+        with self._khoa:
+            bucket = bo_nho.lay(khoa)
+            if bucket is None:
+                bucket = BoDemToken(toc_do_phut / 60.0, dung_luong)
+            # Đặt lại để gia hạn TTL khi người dùng vẫn còn hoạt động
+            bo_nho.dat(khoa, bucket)
+            return bucket
+
+    def kiem_tra(self, user_id: int, chat_id: int, yeu_cau: str, so_viec_dang_cho: int = 0) -> str:
+        """Trả về CHO_PHEP hoặc lý do từ chối yêu cầu tra cứu"""
+        ket_qua = self._kiem_tra(user_id, chat_id, yeu_cau, so_viec_dang_cho)
+        self.thong_ke[ket_qua] += 1
+        return ket_qua
+
+    def _kiem_tra(self, user_id: int, chat_id: int, yeu_cau: str, so_viec_dang_cho: int) -> str:
+        if self.cau_hinh.shed_backlog and so_viec_dang_cho >= self.cau_hinh.shed_backlog:
+            return QUA_TAI
+
+        khoa_lap = (user_id, chat_id, yeu_cau)
+        if self._gan_day.lay(khoa_lap):
+            return TRUNG_LAP
+
+        if self.cau_hinh.flood_user_rate > 0 and not self._lay_bucket(
+                self._theo_user, user_id, self.cau_hinh.flood_user_rate, self.cau_hinh.flood_user_burst).lay():
+            return GIOI_HAN_USER
+
+        if chat_id < 0 and self.cau_hinh.flood_chat_rate > 0 and not self._lay_bucket(
+                self._theo_chat, chat_id, self.cau_hinh.flood_chat_rate, self.cau_hinh.flood_chat_burst).lay():
+            return GIOI_HAN_CHAT
+
+        if self.cau_hinh.flood_dedupe_window > 0:
+            self._gan_day.dat(khoa_lap, True)
+        return CHO_PHEP
+
+    def nen_thong_bao(self, ket_qua: str, user_id: int, chat_id: int) -> bool:
+        """Chỉ thông báo một lần cho mỗi người dùng (hoặc chat khi quá tải) trong mỗi khoảng thời gian"""
+        if ket_qua in (CHO_PHEP, TRUNG_LAP):
+            return False
+        khoa = (ket_qua, chat_id if ket_qua in (QUA_TAI, GIOI_HAN_CHAT) else user_id)
+        with self._khoa:
+            if self._da_thong_bao.lay(khoa):
+                return False
+            self._da_thong_bao.dat(khoa, True)
+            return True
@@ -3,62 +3,230 @@
 File chính khởi chạy bot với cấu hình tập trung
 """
 
+import copy
+import json
 import os
 import time
 import signal
 import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime as _dt, timezone, timedelta
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
 import logging
 
+from cache import BoNhoDemGameThu, BoNhoDemTTL
+from command import URL_THONG_TIN_GAME_THU, la_update_bo_qua, lay_loai_update
+from admission import BoKiemSoatTruyCap
+from dispatch import BoTriHoan
+from logs import thiet_lap_log
+from metrics import BoDoLuong, MayChuMetrics
+from scheduler import BoLapLichGui, UU_TIEN_KET_QUA, UU_TIEN_THUONG, da_xong, noi_tiep
+from upstream import KetNoiUpstream
+
 # ===== CẤU HÌNH =====
 class CauHinh:
     """Quản lý cấu hình tập trung"""
     def __init__(self):
-        self.token = os.getenv("BOT_TOKEN")
+        # Nhiều bot trong cùng process: BOT_TOKENS cách nhau bởi dấu phẩy, để trống nếu chỉ dùng BOT_TOKEN
+        self.tokens = [t.strip() for t in os.getenv("BOT_TOKENS", "").split(",") if t.strip()]
+        if not self.tokens and os.getenv("BOT_TOKEN"):
+            self.tokens = [os.getenv("BOT_TOKEN")]
+        self.token = self.tokens[0] if self.tokens else None
         self.poll_timeout = int(os.getenv("POLL_TIMEOUT", "20"))
         self.request_timeout = float(os.getenv("REQUEST_TIMEOUT", "10.0"))
         self.default_region = os.getenv("DEFAULT_REGION", "SG")
+        # Vùng được dò đồng thời khi không nhập vùng và chưa biết vùng của UID (ví dụ SG,VN,ID,TH).
+        # Mặc định tắt vì mỗi UID mới tốn một yêu cầu upstream cho mỗi vùng, để trống = dùng DEFAULT_REGION
+        self.auto_regions = [r.strip().upper() for r in os.getenv("AUTO_REGIONS", "").split(",") if r.strip()]
         self.admin_ids = [int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip()]
         self.timezone_offset = int(os.getenv("TIMEZONE_OFFSET", "7"))  # Múi giờ Việt Nam (UTC+7)
         self.enable_photos = os.getenv("ENABLE_PHOTOS", "true").lower() == "true"
         self.bot_username = os.getenv("BOT_USERNAME", "").strip()
+        self.enable_inline = os.getenv("ENABLE_INLINE", "true").lower() == "true"
+        self.telegram_api_base = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org").rstrip("/")
+        self.player_info_url = os.getenv("PLAYER_INFO_URL", URL_THONG_TIN_GAME_THU)
+        # Danh sách mirror cách nhau bởi dấu phẩy, để trống nếu chỉ dùng PLAYER_INFO_URL
+        self.player_info_urls = [
+            u.strip() for u in os.getenv("PLAYER_INFO_URLS", "").split(",") if u.strip()
+        ] or [self.player_info_url]
+        self.worker_count = int(os.getenv("WORKER_COUNT", "4"))  # 0 = xử lý tuần tự trong vòng lặp polling
+        self.worker_queue_size = int(os.getenv("WORKER_QUEUE_SIZE", "100"))
+        self.cache_ttl = float(os.getenv("CACHE_TTL", "300"))
+        self.cache_size = int(os.getenv("CACHE_SIZE", "5000"))
+        self.cache_negative_ttl = float(os.getenv("CACHE_NEGATIVE_TTL", "30"))
+        self.cache_db = os.getenv("CACHE_DB", "").strip()  # Đường dẫn SQLite, để trống nếu chỉ cache trong bộ nhớ
+        self.permission_ttl = float(os.getenv("PERMISSION_TTL", "600"))
+        self.connect_timeout = float(os.getenv("CONNECT_TIMEOUT", "3.05"))
+        self.read_timeout = float(os.getenv("READ_TIMEOUT", "10.0"))
+        self.upstream_pool_size = int(os.getenv("UPSTREAM_POOL_SIZE", "10"))
+        self.upstream_retries = int(os.getenv("UPSTREAM_RETRIES", "2"))
+        self.upstream_backoff = float(os.getenv("UPSTREAM_BACKOFF", "0.3"))
+        self.upstream_backoff_max = float(os.getenv("UPSTREAM_BACKOFF_MAX", "5.0"))
+        self.upstream_hedge_percentile = float(os.getenv("UPSTREAM_HEDGE_PERCENTILE", "95"))  # 0 = không hedge
+        self.upstream_hedge_min_delay = float(os.getenv("UPSTREAM_HEDGE_MIN_DELAY", "0.2"))
+        self.breaker_failures = int(os.getenv("BREAKER_FAILURES", "5"))  # lỗi liên tiếp để ngắt mirror, 0 = tắt
+        self.breaker_cooldown = float(os.getenv("BREAKER_COOLDOWN", "30"))
+        self.runtime = os.getenv("RUNTIME", "thread").strip().lower()  # thread, async hoặc sharded
+        self.async_concurrency = int(os.getenv("ASYNC_CONCURRENCY", "1000"))
+        self.update_mode = os.getenv("UPDATE_MODE", "polling").strip().lower()  # polling hoặc webhook
+        self.webhook_url = os.getenv("WEBHOOK_URL", "").strip()  # URL công khai, ví dụ https://example.com/webhook
+        self.webhook_secret = os.getenv("WEBHOOK_SECRET", "").strip()
+        self.webhook_host = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+        self.webhook_port = int(os.getenv("WEBHOOK_PORT", os.getenv("PORT", "8080")))
+        self.webhook_path = os.getenv("WEBHOOK_PATH", "/webhook")
+        self.send_rate_global = float(os.getenv("SEND_RATE_GLOBAL", "30"))  # tin nhắn/giây cho toàn bot
+        self.send_rate_chat = float(os.getenv("SEND_RATE_CHAT", "1"))  # tin nhắn/giây cho mỗi chat riêng
+        self.send_rate_group = float(os.getenv("SEND_RATE_GROUP", "20"))  # tin nhắn/phút cho mỗi group
+        self.send_burst = float(os.getenv("SEND_BURST", "3"))
+        self.send_workers = int(os.getenv("SEND_WORKERS", "8"))
+        self.send_max_retries = int(os.getenv("SEND_MAX_RETRIES", "3"))
+        self.send_queue_timeout = float(os.getenv("SEND_QUEUE_TIMEOUT", "60"))
+        self.batch_max_uids = int(os.getenv("BATCH_MAX_UIDS", "30"))
+        self.batch_concurrency = int(os.getenv("BATCH_CONCURRENCY", "8"))
+        self.flood_user_rate = float(os.getenv("FLOOD_USER_RATE", "10"))  # lệnh tra cứu/phút mỗi người dùng, 0 = tắt
+        self.flood_user_burst = float(os.getenv("FLOOD_USER_BURST", "3"))
+        self.flood_chat_rate = float(os.getenv("FLOOD_CHAT_RATE", "30"))  # lệnh tra cứu/phút mỗi group, 0 = tắt
+        self.flood_chat_burst = float(os.getenv("FLOOD_CHAT_BURST", "10"))
+        self.flood_dedupe_window = float(os.getenv("FLOOD_DEDUPE_WINDOW", "10"))  # giây, 0 = không bỏ yêu cầu lặp lại
+        self.shed_backlog = int(os.getenv("SHED_BACKLOG", "300"))  # số việc tồn đọng để bắt đầu từ chối, 0 = tắt
+        self.inline_debounce = float(os.getenv("INLINE_DEBOUNCE", "0.6"))
+        self.inline_cache_time = int(os.getenv("INLINE_CACHE_TIME", "300"))
+        self.photo_cache_ttl = float(os.getenv("PHOTO_CACHE_TTL", "86400"))
+        self.photo_cache_size = int(os.getenv("PHOTO_CACHE_SIZE", "10000"))
+        self.prewarm_chat_id = int(os.getenv("PREWARM_CHAT_ID", "0"))  # 0 = không làm nóng file_id
+        self.prewarm_count = int(os.getenv("PREWARM_COUNT", "50"))
+        self.metrics_host = os.getenv("METRICS_HOST", "0.0.0.0")
+        self.metrics_port = int(os.getenv("METRICS_PORT", "0"))  # 0 = không mở endpoint /metrics
+        self.shard_count = int(os.getenv("SHARD_COUNT", str(os.cpu_count() or 2)))  # Số process worker khi RUNTIME=sharded
+        self.shard_queue_size = int(os.getenv("SHARD_QUEUE_SIZE", "1000"))
+        self.offset_file = os.getenv("OFFSET_FILE", "").strip()  # File lưu update_offset qua các lần khởi động lại
+        self.log_level = os.getenv("LOG_LEVEL", "INFO").strip().upper()
+        self.log_mode = os.getenv("LOG_MODE", "queue").strip().lower()  # queue (ghi trong luồng nền) hoặc sync
+        self.log_format = os.getenv("LOG_FORMAT", "text").strip().lower()  # text hoặc json
+        self.log_rate_limit = float(os.getenv("LOG_RATE_LIMIT", "20"))  # dòng/giây mỗi vị trí log, 0 = không giới hạn
+        self.log_sample = float(os.getenv("LOG_SAMPLE", "1.0"))  # tỉ lệ giữ lại dòng DEBUG/INFO
+        self.log_queue_size = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
         
         # Kiểm tra cấu hình quan trọng
         if not self.token:
             self._log_and_exit("❌ BOT_TOKEN chưa được thiết lập trong biến môi trường")
+        if len(self.tokens) > 1 and (self.update_mode == "webhook" or self.runtime == "sharded"):
+            self._log_and_exit("❌ BOT_TOKENS chỉ hỗ trợ UPDATE_MODE=polling với RUNTIME=thread hoặc async")
+        if self.update_mode == "webhook" and self.runtime == "async":
+            self._log_and_exit("❌ RUNTIME=async chỉ hỗ trợ long polling, dùng RUNTIME=thread để chạy webhook")
 
     def _log_and_exit(self, message: str):
         print(message)
         sys.exit(1)
     
+    def cho_token(self, token: str) -> "CauHinh":
+        """Bản sao cấu hình cho một bot trong BOT_TOKENS (username và OFFSET_FILE riêng từng bot)"""
+        ban_sao = copy.copy(self)
+        ban_sao.token = token
+        ban_sao.tokens = [token]
+        if len(self.tokens) > 1:
+            # BOT_USERNAME chỉ đúng cho một bot, các bot tự lấy username qua getMe
+            ban_sao.bot_username = ""
+            if self.offset_file:
+                ban_sao.offset_file = f"{self.offset_file}.{token.split(':')[0]}"
+        return ban_sao
+    
     @property
     def timezone(self):
         return timezone(timedelta(hours=self.timezone_offset))
 
 # ===== THIẾT LẬP LOGGER =====
-def thiet_lap_logger(log_level: str = "INFO"):
+def thiet_lap_logger(cau_hinh: CauHinh):
     """Cấu hình hệ thống ghi log"""
-    logging.basicConfig(
-        format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
-        level=getattr(logging, log_level),
-        datefmt='%Y-%m-%d %H:%M:%S'
+    thiet_lap_log(
+        cau_hinh.log_level,
+        cau_hinh.log_mode,
+        cau_hinh.log_format,
+        cau_hinh.log_rate_limit,
+        cau_hinh.log_sample,
+        cau_hinh.log_queue_size
     )
     return logging.getLogger("FreeFireBot")
 
+# ===== TÀI NGUYÊN DÙNG CHUNG =====
+class TaiNguyenChung:
+    """
+    Cache thông tin game thủ, kết nối upstream, thread pool tra cứu và bộ đo của process.
+    Các bot trong BOT_TOKENS dùng chung để UID được tra cứu ở bot này không phải tải lại ở bot khác.
+    """
+    def __init__(self, cau_hinh: CauHinh, logger, dang_async: bool = False):
+        self.dang_async = dang_async
+        self.bo_do = BoDoLuong()  # Độ trễ từng giai đoạn và bộ đếm cho /status và /metrics
+        self.bo_nho_dem = BoNhoDemGameThu(
+            cau_hinh.cache_size,
+            cau_hinh.cache_ttl,
+            cau_hinh.cache_negative_ttl,
+            cau_hinh.cache_db,
+            logger
+        )
+        if dang_async:
+            # Engine asyncio tra cứu bằng aiohttp trên event loop, không cần thread pool
+            from upstream import KetNoiUpstreamAsync
+            self.ket_noi_upstream = KetNoiUpstreamAsync(cau_hinh, logger, self.bo_do)
+            self.bo_thuc_thi_tra_cuu = None
+            self.bo_thuc_thi_vung = None
+            return
+        self.ket_noi_upstream = KetNoiUpstream(cau_hinh, logger, self.bo_do)
+        # Số bot nhân lên số luồng để các bot không phải chờ lẫn nhau
+        so_bot = max(1, len(cau_hinh.tokens))
+        self.bo_thuc_thi_tra_cuu = ThreadPoolExecutor(cau_hinh.batch_concurrency * so_bot, thread_name_prefix="ff-lookup")
+        # Pool riêng cho dò vùng để không chờ lẫn nhau với các lượt tra cứu chạy trên bo_thuc_thi_tra_cuu.
+        # Không vượt quá UPSTREAM_POOL_SIZE để không phải mở thêm kết nối rồi bỏ đi khi pool keep-alive đầy
+        self.bo_thuc_thi_vung = ThreadPoolExecutor(
+            max(1, min(
+                cau_hinh.upstream_pool_size,
+                max(1, cau_hinh.worker_count) * max(1, len(cau_hinh.auto_regions)) * so_bot
+            )),
+            thread_name_prefix="ff-region"
+        )
+    
+    def dong(self):
+        """Đóng các pool (kết nối aiohttp được đóng trong event loop)"""
+        if self.dang_async:
+            return
+        self.bo_thuc_thi_tra_cuu.shutdown(wait=False)
+        self.bo_thuc_thi_vung.shutdown(wait=False)
+        self.ket_noi_upstream.dong()
+
 # ===== LỚP BOT CHÍNH =====
 class FreeFireBot:
     """Lớp chính của bot xử lý tất cả các chức năng"""
-    def __init__(self, cau_hinh: CauHinh):
+    dang_async = False  # Engine asyncio ghi đè thành True
+    
+    def __init__(self, cau_hinh: CauHinh, tai_nguyen: TaiNguyenChung = None):
         self.cau_hinh = cau_hinh
-        self.logger = thiet_lap_logger()
-        self.api_url = f"https://api.telegram.org/bot{cau_hinh.token}"
+        self.logger = thiet_lap_logger(cau_hinh)
+        self.api_url = f"{cau_hinh.telegram_api_base}/bot{cau_hinh.token}"
         self.session = self._tao_session()
         self.update_offset = 0
         self.running = True
         self.start_time = time.time()
         self.bot_id = None  # Sẽ được thiết lập sau khi khởi động
+        # Bot chạy một mình tự tạo và tự đóng tài nguyên, bot trong NhomBot dùng chung của nhóm
+        self._rieng_tai_nguyen = tai_nguyen is None
+        self.tai_nguyen = tai_nguyen or TaiNguyenChung(cau_hinh, self.logger, self.dang_async)
+        self.bo_do = self.tai_nguyen.bo_do
+        self.bo_nho_dem = self.tai_nguyen.bo_nho_dem
+        self.ket_noi_upstream = self.tai_nguyen.ket_noi_upstream
+        self.bo_thuc_thi_tra_cuu = self.tai_nguyen.bo_thuc_thi_tra_cuu
+        self.bo_thuc_thi_vung = self.tai_nguyen.bo_thuc_thi_vung
+        # Quyền gửi, file_id ảnh và giới hạn gửi gắn với từng bot nên không dùng chung
+        self.quyen_chat = BoNhoDemTTL(10000, cau_hinh.permission_ttl)  # chat_id -> có quyền gửi hay không
+        self.file_id_anh = BoNhoDemTTL(cau_hinh.photo_cache_size, cau_hinh.photo_cache_ttl)  # uid -> file_id ảnh đại diện
+        self.bo_lap_lich = None if self.dang_async else BoLapLichGui(self._goi_api_telegram, cau_hinh, self.logger)
+        self.bo_tri_hoan_inline = (
+            None if self.dang_async else BoTriHoan(cau_hinh.inline_debounce, self.bo_thuc_thi_tra_cuu.submit)
+        )
+        self.kiem_soat = BoKiemSoatTruyCap(cau_hinh)
+        self.bo_dieu_phoi = None  # Nhóm worker đang chạy, dùng để đo số việc tồn đọng
         
         # Đăng ký xử lý tắt bot an toàn
         signal.signal(signal.SIGINT, self._tat_an_toan)
@@ -67,6 +235,13 @@ class FreeFireBot:
     def _tao_session(self) -> requests.Session:
         """Tạo và cấu hình session requests"""
         session = requests.Session()
+        # Session được dùng đồng thời bởi luồng gửi, pool tra cứu (sendChatAction, deleteMessage),
+        # worker xử lý update (getChatMember) và luồng polling: mỗi luồng cần một kết nối trong pool
+        so_ket_noi = (self.cau_hinh.send_workers + self.cau_hinh.batch_concurrency
+                      + max(1, self.cau_hinh.worker_count) + 1)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=so_ket_noi, pool_block=False)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
         session.headers.update({
             "User-Agent": "FreeFireInfoBot/2.0",
             "Accept": "application/json",
@@ -121,112 +296,457 @@ class FreeFireBot:
         """Kiểm tra xem đây có phải là tin nhắn riêng không"""
         return chat_type == "private"
     
+    @staticmethod
+    def _thanh_vien_co_quyen(member: dict) -> bool:
+        """Kiểm tra trạng thái thành viên của bot có cho phép gửi tin nhắn không"""
+        status = member.get("status", "")
+        if status == "restricted":
+            return bool(member.get("can_send_messages"))
+        return status in ["creator", "administrator", "member"]
+    
+    @classmethod
+    def _quyen_tu_phan_hoi(cls, status_code: int, data: dict):
+        """Quyền gửi từ phản hồi getChatMember: True/False để cache, None nếu phản hồi không kết luận được"""
+        if status_code == 200 and data.get("ok"):
+            return cls._thanh_vien_co_quyen(data.get("result", {}))
+        if status_code in (400, 403):
+            # Chat không tồn tại hoặc bot đã bị kick: gửi chắc chắn thất bại
+            return False
+        # Lỗi tạm thời (429, 5xx...) không nói gì về quyền
+        return None
+
     def co_quyen_gui_tin_nhan(self, chat_id: int) -> bool:
-        """Kiểm tra xem bot có quyền gửi tin nhắn trong group không"""
+        """Kiểm tra xem bot có quyền gửi tin nhắn trong group không (có cache theo chat)"""
+        # chat_id dương là tin nhắn riêng, luôn gửi được
+        if chat_id > 0:
+            return True
+        
+        co_quyen = self.quyen_chat.lay(chat_id)
+        if co_quyen is not None:
+            return co_quyen
+        
         try:
-            resp = self.session.get(
-                f"{self.api_url}/getChatMember",
-                params={"chat_id": chat_id, "user_id": self.bot_id},
-                timeout=5.0
-            )
-            if resp.status_code == 200:
-                data = resp.json()
-                if data.get("ok"):
-                    status = data.get("result", {}).get("status", "")
-                    return status in ["creator", "administrator", "member"]
-            return False
+            with self.bo_do.do("quyen"):
+                resp = self.session.get(
+                    f"{self.api_url}/getChatMember",
+                    params={"chat_id": chat_id, "user_id": self.bot_id},
+                    timeout=5.0
+                )
+            data = resp.json() if resp.status_code == 200 else {}
+            co_quyen = self._quyen_tu_phan_hoi(resp.status_code, data)
+            if co_quyen is None:
+                return True  # Không cache, cứ thử gửi
+            self.quyen_chat.dat(chat_id, co_quyen)
+            return co_quyen
         except Exception:
             return True  # Mặc định là có quyền nếu không kiểm tra được
+    
+    def cap_nhat_quyen_chat(self, chat_id: int, member: dict):
+        """Cập nhật cache quyền từ update my_chat_member"""
+        self.quyen_chat.dat(chat_id, self._thanh_vien_co_quyen(member))
+    
+    def _xu_ly_loi_gui(self, chat_id: int, status_code: int):
+        """Xóa cache quyền khi Telegram từ chối gửi (bot bị kick, bị hạn chế...)"""
+        if status_code in (400, 403):
+            self.quyen_chat.xoa(chat_id)
 
     # ===== API TELEGRAM =====
-    def gui_tin_nhan(self, chat_id: int, text: str, reply_to: int = None, disable_preview: bool = True):
-        """Gửi tin nhắn văn bản"""
+    def _goi_api_telegram(self, method: str, data: dict) -> requests.Response:
+        try:
+            with self.bo_do.do(method):
+                resp = self.session.post(f"{self.api_url}/{method}", data=data, timeout=self.cau_hinh.request_timeout)
+        except RequestException:
+            self.bo_do.dem("errors", kind="telegram_connection")
+            raise
+        if resp.status_code != 200:
+            self.bo_do.dem("errors", kind=f"telegram_http_{resp.status_code}")
+        return resp
+    
+    def _gui_qua_hang_doi(self, chat_id: int, method: str, data: dict, uu_tien: int) -> Future:
+        """
+        Gửi qua bộ lập lịch (giới hạn tốc độ, tự gửi lại khi 429), trả về Future chứa requests.Response.
+        Không chờ phản hồi để worker xử lý update không bị giữ lại bởi giới hạn gửi của một chat.
+        """
+        if self.bo_lap_lich is None:
+            future = Future()
+            try:
+                future.set_result(self._goi_api_telegram(method, data))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return self.bo_lap_lich.gui(chat_id, method, data, uu_tien)
+    
+    def gui_tin_nhan(self, chat_id: int, text: str, reply_to: int = None, disable_preview: bool = True,
+                     uu_tien: int = UU_TIEN_THUONG) -> Future:
+        """
+        Gửi tin nhắn văn bản (uu_tien=UU_TIEN_KET_QUA để gửi trước các tin nhắn hướng dẫn).
+        Không chờ gửi xong: trả về Future chứa tin nhắn đã gửi (dict Message của Telegram) hoặc None nếu thất bại
+        """
         if not self.co_quyen_gui_tin_nhan(chat_id):
-            self.logger.warning(f"🚫 Bot không có quyền gửi tin nhắn trong chat {chat_id}")
-            return False
+            self.logger.warning("🚫 Bot không có quyền gửi tin nhắn trong chat %s", chat_id)
+            return da_xong(None)
+        
+        data = {
+            "chat_id": chat_id, 
+            "text": text, 
+            "parse_mode": "HTML",
+            "disable_web_page_preview": disable_preview
+        }
+        if reply_to:
+            data["reply_to_message_id"] = reply_to
+        
+        def khi_gui_xong(future: Future):
+            try:
+                resp = future.result()
+                if resp.status_code == 200:
+                    self.logger.debug("✅ Đã gửi tin nhắn đến chat %s", chat_id)
+                    return resp.json().get("result") or {}
+                self._xu_ly_loi_gui(chat_id, resp.status_code)
+                self.logger.error("❌ Gửi tin nhắn thất bại đến %s: HTTP %s", chat_id, resp.status_code)
+            except Exception as e:
+                self.logger.error("❌ Gửi tin nhắn thất bại đến %s: %s", chat_id, e)
+            return None
+        
+        return noi_tiep(self._gui_qua_hang_doi(chat_id, "sendMessage", data, uu_tien), khi_gui_xong)
+    
+    def sua_tin_nhan(self, chat_id: int, message_id: int, text: str, disable_preview: bool = True) -> Future:
+        """Sửa nội dung tin nhắn đã gửi (editMessageText), trả về Future chứa tin nhắn sau khi sửa hoặc None"""
+        def khi_sua_xong(future: Future):
+            try:
+                resp = future.result()
+                if resp.status_code == 200:
+                    self.logger.debug("✅ Đã cập nhật tin nhắn trong chat %s", chat_id)
+                    return resp.json().get("result") or {}
+                self.logger.warning("⚠️ Sửa tin nhắn thất bại trong chat %s: HTTP %s", chat_id, resp.status_code)
+            except Exception as e:
+                self.logger.warning("⚠️ Sửa tin nhắn thất bại trong chat %s: %s", chat_id, e)
+            return None
+        
+        return noi_tiep(self._gui_qua_hang_doi(chat_id, "editMessageText", {
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "text": text,
+            "parse_mode": "HTML",
+            "disable_web_page_preview": disable_preview
+        }, UU_TIEN_KET_QUA), khi_sua_xong)
+    
+    def xoa_tin_nhan(self, chat_id: int, message_id: int):
+        """Xóa tin nhắn của bot (deleteMessage) mà không chờ phản hồi"""
+        def xoa():
+            try:
+                self._goi_api_telegram("deleteMessage", {"chat_id": chat_id, "message_id": message_id})
+            except Exception as e:
+                self.logger.warning("⚠️ Xóa tin nhắn thất bại trong chat %s: %s", chat_id, e)
         
         try:
-            data = {
-                "chat_id": chat_id, 
-                "text": text, 
-                "parse_mode": "HTML",
-                "disable_web_page_preview": disable_preview
-            }
-            if reply_to:
-                data["reply_to_message_id"] = reply_to
-            
-            resp = self.session.post(f"{self.api_url}/sendMessage", data=data, timeout=self.cau_hinh.request_timeout)
-            if resp.status_code == 200:
-                self.logger.info(f"✅ Đã gửi tin nhắn đến chat {chat_id}")
-                return True
-            else:
-                self.logger.error(f"❌ Gửi tin nhắn thất bại đến {chat_id}: HTTP {resp.status_code}")
-                return False
-        except Exception as e:
-            self.logger.error(f"❌ Gửi tin nhắn thất bại đến {chat_id}: {str(e)}")
-            return False
+            # Chạy trên pool tra cứu vì thường được gọi từ luồng gửi khi việc gửi kết quả vừa xong
+            self.bo_thuc_thi_tra_cuu.submit(xoa)
+        except RuntimeError:
+            pass  # Pool đã đóng khi bot đang dừng
     
-    def gui_anh_dai_dien(self, chat_id: int, uid: str, caption: str, reply_to: int = None):
-        """Gửi ảnh đại diện kèm chú thích"""
+    def gui_hanh_dong(self, chat_id: int, hanh_dong: str = "typing"):
+        """Hiện trạng thái "đang nhập..."/"đang gửi ảnh..." (sendChatAction) mà không chờ phản hồi"""
+        try:
+            # Chạy trên pool tra cứu để không chờ Telegram trước khi bắt đầu tra cứu
+            self.bo_thuc_thi_tra_cuu.submit(
+                self._goi_api_telegram, "sendChatAction", {"chat_id": chat_id, "action": hanh_dong}
+            )
+        except RuntimeError:
+            pass  # Pool đã đóng khi bot đang dừng
+    
+    def gui_anh_dai_dien(self, chat_id: int, uid: str, caption: str, reply_to: int = None) -> Future:
+        """Gửi ảnh đại diện kèm chú thích, trả về Future chứa tin nhắn đã gửi hoặc None"""
         if not self.co_quyen_gui_tin_nhan(chat_id):
-            self.logger.warning(f"🚫 Bot không có quyền gửi ảnh trong chat {chat_id}")
-            return False
+            self.logger.warning("🚫 Bot không có quyền gửi ảnh trong chat %s", chat_id)
+            return da_xong(None)
         
         if not self.cau_hinh.enable_photos:
             self.logger.info("📸 Tính năng ảnh đã bị tắt, chuyển sang gửi tin nhắn văn bản")
-            return self.gui_tin_nhan(chat_id, caption, reply_to)
+            return self.gui_tin_nhan(chat_id, caption, reply_to, uu_tien=UU_TIEN_KET_QUA)
         
         photo_url = f"https://profile.thug4ff.com/api/profile?uid={uid}"
+        file_id = self.file_id_anh.lay(uid)
+        
+        data = {
+            "chat_id": chat_id,
+            "photo": file_id or photo_url,
+            "caption": caption,
+            "parse_mode": "HTML"
+        }
+        if reply_to:
+            data["reply_to_message_id"] = reply_to
+        
+        def khi_gui_xong(future: Future):
+            try:
+                resp = future.result()
+                if resp.status_code == 200 and resp.json().get("ok"):
+                    self._luu_file_id(uid, resp.json())
+                    self.logger.debug("✅ Đã gửi ảnh đại diện đến chat %s", chat_id)
+                    return resp.json().get("result") or {}
+                self._xu_ly_loi_gui(chat_id, resp.status_code)
+                error_msg = resp.json().get("description", "Không rõ lỗi") if resp.status_code != 200 else "API trả về không thành công"
+                self.logger.warning("⚠️ Gửi ảnh thất bại: %s", error_msg)
+            except Exception as e:
+                self.logger.warning("⚠️ Gửi ảnh thất bại: %s", e)
+            return None
+        
+        def khi_gui_lan_dau(future: Future):
+            if file_id and future.exception() is None and future.result().status_code == 400:
+                # file_id hết hạn hoặc bị từ chối: bỏ khỏi cache và gửi lại bằng URL
+                self.file_id_anh.xoa(uid)
+                return self._gui_qua_hang_doi(chat_id, "sendPhoto", {**data, "photo": photo_url}, UU_TIEN_KET_QUA)
+            return future
         
+        lan_dau = self._gui_qua_hang_doi(chat_id, "sendPhoto", data, UU_TIEN_KET_QUA)
+        return noi_tiep(noi_tiep(lan_dau, khi_gui_lan_dau), khi_gui_xong)
+    
+    def _luu_file_id(self, uid: str, ket_qua: dict):
+        """Ghi nhớ file_id của ảnh vừa gửi để lần sau Telegram không phải tải lại ảnh"""
+        photos = ket_qua.get("result", {}).get("photo") or []
+        if photos:
+            self.file_id_anh.dat(uid, photos[-1].get("file_id"))
+    
+    def lam_nong_file_id(self):
+        """Gửi trước ảnh của các UID được tra cứu gần đây vào PREWARM_CHAT_ID để có sẵn file_id"""
+        uids = [uid for uid in self.bo_nho_dem.uid_gan_day(self.cau_hinh.prewarm_count) if not self.file_id_anh.lay(uid)]
+        so_thanh_cong = 0
+        for uid in uids:
+            if not self.running:
+                break
+            try:
+                # Luồng làm nóng riêng nên chờ từng ảnh, tránh dồn cả loạt vào hàng đợi gửi
+                resp = self._gui_qua_hang_doi(self.cau_hinh.prewarm_chat_id, "sendPhoto", {
+                    "chat_id": self.cau_hinh.prewarm_chat_id,
+                    "photo": f"https://profile.thug4ff.com/api/profile?uid={uid}",
+                    "disable_notification": True
+                }, UU_TIEN_THUONG).result()
+                if resp.status_code == 200 and resp.json().get("ok"):
+                    self._luu_file_id(uid, resp.json())
+                    so_thanh_cong += 1
+            except Exception as e:
+                self.logger.warning(f"⚠️ Làm nóng ảnh UID {uid} thất bại: {str(e)}")
+        self.logger.info(f"🔥 Đã làm nóng file_id ảnh cho {so_thanh_cong}/{len(uids)} UID")
+    
+    def tra_loi_inline(self, query_id: str, results: list, cache_time: int) -> bool:
+        """Trả lời inline query (answerInlineQuery), cache_time để Telegram tự cache các query lặp lại"""
         try:
-            data = {
-                "chat_id": chat_id,
-                "photo": photo_url,
-                "caption": caption,
-                "parse_mode": "HTML"
-            }
-            if reply_to:
-                data["reply_to_message_id"] = reply_to
-            
-            resp = self.session.post(
-                f"{self.api_url}/sendPhoto", 
-                data=data, 
-                timeout=self.cau_hinh.request_timeout
-            )
-            
-            if resp.status_code == 200 and resp.json().get("ok"):
-                self.logger.info(f"✅ Đã gửi ảnh đại diện đến chat {chat_id}")
+            resp = self._goi_api_telegram("answerInlineQuery", {
+                "inline_query_id": query_id,
+                "results": json.dumps(results),
+                "cache_time": cache_time
+            })
+            if resp.status_code == 200:
                 return True
-            else:
-                error_msg = resp.json().get("description", "Không rõ lỗi") if resp.status_code != 200 else "API trả về không thành công"
-                self.logger.warning(f"⚠️ Gửi ảnh thất bại: {error_msg}")
-                return False
+            self.logger.warning("⚠️ Trả lời inline query thất bại: HTTP %s", resp.status_code)
+            return False
         except Exception as e:
-            self.logger.warning(f"⚠️ Gửi ảnh thất bại: {str(e)}")
+            self.logger.warning("⚠️ Trả lời inline query thất bại: %s", e)
+            return False
+    
+    # ===== WEBHOOK =====
+    def dat_webhook(self) -> bool:
+        """Đăng ký webhook với Telegram (setWebhook)"""
+        if not self.cau_hinh.webhook_url:
+            self.logger.error("❌ WEBHOOK_URL chưa được thiết lập")
+            return False
+        
+        data = {"url": self.cau_hinh.webhook_url, "allowed_updates": json.dumps(lay_loai_update(self.cau_hinh))}
+        if self.cau_hinh.webhook_secret:
+            data["secret_token"] = self.cau_hinh.webhook_secret
+        return self._goi_quan_ly_webhook("setWebhook", data)
+    
+    def xoa_webhook(self, bo_update_cho: bool = False) -> bool:
+        """Hủy webhook để quay lại dùng getUpdates (deleteWebhook)"""
+        return self._goi_quan_ly_webhook("deleteWebhook", {"drop_pending_updates": bo_update_cho})
+    
+    def _goi_quan_ly_webhook(self, method: str, data: dict) -> bool:
+        try:
+            resp = self.session.post(f"{self.api_url}/{method}", data=data, timeout=self.cau_hinh.request_timeout)
+            result = resp.json()
+            if resp.status_code == 200 and result.get("ok"):
+                self.logger.info(f"✅ {method}: {result.get('description', 'thành công')}")
+                return True
+            self.logger.error(f"❌ {method} thất bại: {result.get('description', f'HTTP {resp.status_code}')}")
+            return False
+        except Exception as e:
+            self.logger.error(f"❌ {method} thất bại: {str(e)}")
             return False
     
     # ===== VÒNG LẶP CHÍNH =====
+    def _ghi_log_khoi_dong(self):
+        self.logger.info("🚀 Bot đã sẵn sàng hoạt động")
+        self.logger.info(f"🌍 Môi trường: {os.getenv('VERCEL', 'LOCAL')}")
+        self.logger.info(f"🐍 Python version: {os.getenv('PYTHON_VERSION', sys.version)}")
+        self.logger.info(f"⏰ Sử dụng múi giờ UTC{self.cau_hinh.timezone_offset:+d} (Việt Nam)")
+        
+        if self.cau_hinh.prewarm_chat_id and self.cau_hinh.enable_photos:
+            threading.Thread(target=self.lam_nong_file_id, name="ff-prewarm", daemon=True).start()
+    
+    def _tao_bo_dieu_phoi(self, so_worker: int):
+        """Tạo và khởi chạy nhóm worker xử lý update (process riêng khi RUNTIME=sharded)"""
+        # Import ở đây để tránh vòng lặp import
+        from command import xu_ly_lenh
+        from dispatch import BoDieuPhoi
+        
+        if self.cau_hinh.runtime == "sharded":
+            from sharded import BoPhanManh
+            self.bo_dieu_phoi = BoPhanManh(self.cau_hinh.shard_count, self.cau_hinh.shard_queue_size, self.logger)
+            self.bo_dieu_phoi.bat_dau()
+            return self.bo_dieu_phoi
+        
+        bo_dieu_phoi = BoDieuPhoi(
+            lambda update: xu_ly_lenh(update, self),
+            so_worker,
+            self.cau_hinh.worker_queue_size,
+            self.logger
+        )
+        bo_dieu_phoi.bat_dau()
+        self.bo_dieu_phoi = bo_dieu_phoi
+        return bo_dieu_phoi
+    
+    def so_viec_dang_cho(self) -> int:
+        """Số update chờ worker và tin nhắn chờ gửi (dùng để quyết định giảm tải)"""
+        tong = 0
+        if self.bo_dieu_phoi is not None:
+            tong += self.bo_dieu_phoi.so_viec_dang_cho()
+        if self.bo_lap_lich is not None:
+            tong += self.bo_lap_lich.so_viec_dang_cho()
+        return tong
+    
+    def _dung_bo_dieu_phoi(self, bo_dieu_phoi):
+        self.logger.info(f"⏳ Đang chờ xử lý nốt {bo_dieu_phoi.so_viec_dang_cho()} update...")
+        bo_dieu_phoi.dung()
+    
+    def _giai_phong_tai_nguyen(self):
+        """Gửi nốt tin nhắn trong hàng đợi và đóng các pool dùng chung (nếu bot không thuộc NhomBot)"""
+        self.bo_lap_lich.dung()
+        if self._rieng_tai_nguyen:
+            self.tai_nguyen.dong()
+    
+    def _doc_offset(self):
+        """Đọc update_offset đã lưu (OFFSET_FILE) để không xử lý lại update sau khi khởi động lại"""
+        if not self.cau_hinh.offset_file:
+            return
+        try:
+            with open(self.cau_hinh.offset_file, encoding="utf-8") as f:
+                self.update_offset = int(f.read().strip() or 0)
+            self.logger.info(f"📍 Tiếp tục từ update_offset {self.update_offset}")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"⚠️ Không đọc được OFFSET_FILE: {str(e)}")
+    
+    def _luu_offset(self):
+        """Ghi update_offset ra OFFSET_FILE (ghi file tạm rồi đổi tên để không bị hỏng giữa chừng)"""
+        if not self.cau_hinh.offset_file:
+            return
+        try:
+            tam = f"{self.cau_hinh.offset_file}.tmp"
+            offset = self.update_offset
+            # RUNTIME=sharded: không lưu qua các update shard chưa xử lý xong
+            offset_an_toan = getattr(self.bo_dieu_phoi, "offset_an_toan", None)
+            if offset_an_toan is not None:
+                offset = offset_an_toan(offset)
+            with open(tam, "w", encoding="utf-8") as f:
+                f.write(str(offset))
+            os.replace(tam, self.cau_hinh.offset_file)
+        except OSError as e:
+            self.logger.warning(f"⚠️ Không ghi được OFFSET_FILE: {str(e)}")
+    
+    def _bat_dau_metrics(self):
+        """Mở endpoint /metrics cho Prometheus nếu METRICS_PORT được thiết lập"""
+        if not self.cau_hinh.metrics_port:
+            return None
+        try:
+            may_chu = MayChuMetrics(self.cau_hinh.metrics_host, self.cau_hinh.metrics_port, self.bo_do, self.logger)
+            may_chu.bat_dau()
+            return may_chu
+        except OSError as e:
+            self.logger.error(f"❌ Không thể mở endpoint metrics: {str(e)}")
+            return None
+    
     def chay(self):
-        """Vòng lặp chính của bot"""
+        """Chạy bot theo chế độ nhận update được cấu hình (UPDATE_MODE)"""
+        # Bot trong NhomBot dùng chung bộ đo nên endpoint /metrics do nhóm mở
+        may_chu_metrics = self._bat_dau_metrics() if self._rieng_tai_nguyen else None
+        try:
+            if self.cau_hinh.update_mode == "webhook":
+                self.chay_webhook()
+            else:
+                self.chay_polling()
+        finally:
+            if may_chu_metrics:
+                may_chu_metrics.dung()
+    
+    def chay_webhook(self):
+        """Nhận update qua máy chủ webhook tích hợp thay vì long polling"""
         if not self.khoi_dong():
             self.logger.error("❌ Không thể khởi động bot, dừng hoạt động")
             return
         
-        self.logger.info("🚀 Bot đã sẵn sàng hoạt động")
-        self.logger.info(f"🌍 Môi trường: {os.getenv('VERCEL', 'LOCAL')}")
-        self.logger.info(f"🐍 Python version: {os.getenv('PYTHON_VERSION', sys.version)}")
-        self.logger.info(f"⏰ Sử dụng múi giờ UTC{self.cau_hinh.timezone_offset:+d} (Việt Nam)")
+        self._ghi_log_khoi_dong()
+        
+        from webhook import MayChuWebhook
+        
+        # Webhook luôn cần worker để xác nhận Telegram ngay mà không chờ xử lý xong
+        bo_dieu_phoi = self._tao_bo_dieu_phoi(max(1, self.cau_hinh.worker_count))
+        
+        def nhan_update(update: dict):
+            if not la_update_bo_qua(update, self.cau_hinh.bot_username):
+                bo_dieu_phoi.gui(update)
+        
+        may_chu = MayChuWebhook(
+            self.cau_hinh.webhook_host,
+            self.cau_hinh.webhook_port,
+            self.cau_hinh.webhook_path,
+            self.cau_hinh.webhook_secret,
+            nhan_update,
+            self.logger
+        )
+        may_chu.bat_dau()
+        
+        while self.running:
+            time.sleep(0.5)
+        
+        may_chu.dung()
+        self._dung_bo_dieu_phoi(bo_dieu_phoi)
+        self._giai_phong_tai_nguyen()
+        self.logger.info("⏹️ Bot đã dừng hoạt động")
+    
+    def chay_polling(self):
+        """Vòng lặp long polling getUpdates"""
+        if not self.khoi_dong():
+            self.logger.error("❌ Không thể khởi động bot, dừng hoạt động")
+            return
+        
+        self._ghi_log_khoi_dong()
         
         # Import ở đây để tránh vòng lặp import
         from command import xu_ly_lenh
         
+        self._doc_offset()
+        bo_dieu_phoi = None
+        if self.cau_hinh.worker_count > 0 or self.cau_hinh.runtime == "sharded":
+            bo_dieu_phoi = self._tao_bo_dieu_phoi(self.cau_hinh.worker_count)
+        loai_update = json.dumps(lay_loai_update(self.cau_hinh))
+        
         while self.running:
             try:
-                resp = self.session.get(
-                    f"{self.api_url}/getUpdates",
-                    params={"offset": self.update_offset, "timeout": self.cau_hinh.poll_timeout},
-                    timeout=self.cau_hinh.poll_timeout + 5
-                )
+                with self.bo_do.do("poll"):
+                    resp = self.session.get(
+                        f"{self.api_url}/getUpdates",
+                        params={
+                            "offset": self.update_offset,
+                            "timeout": self.cau_hinh.poll_timeout,
+                            "allowed_updates": loai_update
+                        },
+                        timeout=self.cau_hinh.poll_timeout + 5
+                    )
+                
+                if resp.status_code == 409:
+                    self.logger.error("❌ Webhook đang được bật, chạy `python app.py deletewebhook` để dùng polling")
+                    time.sleep(5)
+                    continue
                 
                 if resp.status_code != 200:
                     self.logger.error(f"❌ Lỗi khi lấy cập nhật: HTTP {resp.status_code}")
@@ -239,10 +759,20 @@ class FreeFireBot:
                     if not self.running:
                         break
                     
-                    self.update_offset = update.get("update_id", self.update_offset) + 1
-                    xu_ly_lenh(update, self)
+                    offset_moi = update.get("update_id", self.update_offset) + 1
+                    if la_update_bo_qua(update, self.cau_hinh.bot_username):
+                        pass  # Tin nhắn group không phải lệnh: bỏ ngay, không tốn worker lẫn log
+                    elif bo_dieu_phoi:
+                        # Chỉ ghi nhận offset sau khi update đã được giao cho worker
+                        bo_dieu_phoi.gui(update)
+                    else:
+                        # Xử lý tuần tự: ghi nhận offset trước để update gây lỗi không bị lấy lại mãi
+                        self.update_offset = offset_moi
+                        xu_ly_lenh(update, self)
+                    self.update_offset = offset_moi
                 
-                time.sleep(0.1)
+                if updates:
+                    self._luu_offset()
                 
             except RequestException as e:
                 self.logger.error(f"❌ Lỗi kết nối: {str(e)}")
@@ -251,13 +781,106 @@ class FreeFireBot:
                 self.logger.exception(f"🔥 Lỗi không mong đợi: {str(e)}")
                 time.sleep(1)
         
+        if bo_dieu_phoi:
+            self._dung_bo_dieu_phoi(bo_dieu_phoi)
+            self._luu_offset()  # Các update shard xử lý nốt khi dừng cũng được ghi nhận
+        
+        self._giai_phong_tai_nguyen()
         self.logger.info("⏹️ Bot đã dừng hoạt động")
 
+# ===== NHIỀU BOT TRONG MỘT PROCESS =====
+class NhomBot:
+    """
+    Chạy mọi bot trong BOT_TOKENS trong cùng process: mỗi bot giữ offset, bot_id, username,
+    hàng đợi gửi và cache quyền/file_id riêng, còn cache game thủ, kết nối upstream và
+    thread pool tra cứu được dùng chung.
+    """
+    def __init__(self, cau_hinh: CauHinh):
+        self.cau_hinh = cau_hinh
+        self.logger = thiet_lap_logger(cau_hinh)
+        if cau_hinh.runtime == "async":
+            from async_runtime import FreeFireBotAsync as lop_bot
+        else:
+            lop_bot = FreeFireBot
+        self.tai_nguyen = TaiNguyenChung(cau_hinh, self.logger, lop_bot.dang_async)
+        self.bots = [lop_bot(cau_hinh.cho_token(token), self.tai_nguyen) for token in cau_hinh.tokens]
+        
+        # Mỗi bot đăng ký signal handler riêng (chỉ bot tạo sau cùng được giữ), nhóm đăng ký lại để dừng tất cả
+        signal.signal(signal.SIGINT, self._tat_an_toan)
+        signal.signal(signal.SIGTERM, self._tat_an_toan)
+    
+    @property
+    def running(self) -> bool:
+        return any(bot.running for bot in self.bots)
+    
+    @running.setter
+    def running(self, gia_tri: bool):
+        for bot in self.bots:
+            bot.running = gia_tri
+    
+    def _tat_an_toan(self, signum, frame):
+        self.logger.info(f"Nhận tín hiệu {signum}, đang tắt {len(self.bots)} bot một cách an toàn...")
+        self.running = False
+    
+    def dat_webhook(self) -> bool:
+        self.logger.error("❌ BOT_TOKENS chỉ hỗ trợ long polling, không thể đăng ký webhook")
+        return False
+    
+    def xoa_webhook(self, bo_update_cho: bool = False) -> bool:
+        return all([bot.xoa_webhook(bo_update_cho) for bot in self.bots])
+    
+    async def _chay_async(self):
+        """Các bot asyncio chạy chung một event loop để dùng chung session aiohttp tới upstream"""
+        import asyncio
+        try:
+            await asyncio.gather(*(bot.chay_async() for bot in self.bots))
+        finally:
+            await self.tai_nguyen.ket_noi_upstream.dong()
+    
+    def chay(self):
+        """Chạy tất cả bot, mỗi bot một luồng (hoặc chung một event loop khi RUNTIME=async)"""
+        self.logger.info(f"🤖 Chạy {len(self.bots)} bot trong cùng process")
+        may_chu_metrics = self.bots[0]._bat_dau_metrics()
+        try:
+            if self.tai_nguyen.dang_async:
+                import asyncio
+                asyncio.run(self._chay_async())
+                return
+            
+            cac_luong = [
+                threading.Thread(target=bot.chay, name=f"ff-bot-{i}", daemon=True)
+                for i, bot in enumerate(self.bots)
+            ]
+            for luong in cac_luong:
+                luong.start()
+            # Chờ từng đoạn ngắn để luồng chính vẫn nhận được tín hiệu dừng
+            while any(luong.is_alive() for luong in cac_luong):
+                for luong in cac_luong:
+                    luong.join(0.5)
+        finally:
+            if may_chu_metrics:
+                may_chu_metrics.dung()
+            self.tai_nguyen.dong()
+
 # ===== THỰC THI CHÍNH =====
+def tao_bot(cau_hinh: CauHinh):
+    """Tạo bot theo engine được cấu hình (RUNTIME), hoặc NhomBot khi BOT_TOKENS có nhiều token"""
+    if len(cau_hinh.tokens) > 1:
+        return NhomBot(cau_hinh)
+    if cau_hinh.runtime == "async":
+        from async_runtime import FreeFireBotAsync
+        return FreeFireBotAsync(cau_hinh)
+    return FreeFireBot(cau_hinh)
+
 if __name__ == "__main__":
     try:
         cau_hinh = CauHinh()
-        bot = FreeFireBot(cau_hinh)
+        bot = tao_bot(cau_hinh)
+        lenh = sys.argv[1].lower() if len(sys.argv) > 1 else ""
+        if lenh == "setwebhook":
+            sys.exit(0 if bot.dat_webhook() else 1)
+        elif lenh == "deletewebhook":
+            sys.exit(0 if bot.xoa_webhook("--drop-pending" in sys.argv) else 1)
         bot.chay()
     except Exception as e:
         print(f"🚨 Lỗi nghiêm trọng: {str(e)}")
@@ -0,0 +1,440 @@
+"""
+Engine asyncio cho bot (RUNTIME=async) - polling, tra cứu và gửi tin nhắn chạy trên một event loop
+"""
+
+import asyncio
+import json
+import os
+import sys
+import weakref
+
+from app import FreeFireBot
+from command import (
+    TIN_DANG_TRA_CUU, TRA_CUU, TRA_CUU_HANG_LOAT, TRA_CUU_INLINE, TRA_LOI, TRA_LOI_INLINE,
+    cac_vung_ung_vien, co_thong_tin, gui_kem_anh, kieu_bao_dang_tra_cuu, la_update_bo_qua, lay_loai_update,
+    lay_thong_tin_game_thu_async, quyet_dinh_update, tao_tra_loi_ff, tao_tra_loi_hang_loat, tao_tra_loi_inline
+)
+from scheduler import UU_TIEN_KET_QUA, UU_TIEN_THUONG, BoLapLichGuiAsync
+from upstream import aiohttp
+
+class FreeFireBotAsync(FreeFireBot):
+    """
+    Bot chạy bằng asyncio: mỗi update là một coroutine, số update xử lý đồng thời
+    được giới hạn bởi ASYNC_CONCURRENCY và các update cùng chat vẫn giữ đúng thứ tự.
+    """
+    # Engine asyncio gửi bằng aiohttp qua BoLapLichGuiAsync và tra cứu bằng KetNoiUpstreamAsync,
+    # không dùng bộ lập lịch đa luồng lẫn thread pool tra cứu
+    dang_async = True
+
+    def __init__(self, cau_hinh, tai_nguyen=None):
+        if aiohttp is None:
+            raise RuntimeError("RUNTIME=async cần thư viện aiohttp (pip install aiohttp)")
+        super().__init__(cau_hinh, tai_nguyen)
+        self.http = None  # Session aiohttp tới Telegram, tạo trong event loop
+        # Cùng giới hạn tốc độ và cách gửi lại khi 429 như engine đa luồng
+        self.bo_lap_lich = BoLapLichGuiAsync(self._goi_api, cau_hinh, self.logger)
+        self._khoa_chat = weakref.WeakValueDictionary()  # chat_id -> asyncio.Lock
+        self._dang_xu_ly = set()
+        self._tac_vu_nen = set()  # Giữ tham chiếu tới các lệnh gọi không chờ kết quả (sendChatAction)
+        self._inline_moi_nhat = {}  # user_id -> id của inline query mới nhất (debounce)
+
+    def so_viec_dang_cho(self) -> int:
+        """Số update đang được xử lý đồng thời trên event loop"""
+        return len(self._dang_xu_ly)
+
+    # ===== API TELEGRAM =====
+    async def _goi_api(self, method: str, data: dict = None, timeout: float = None) -> tuple:
+        """Gọi Bot API, trả về (mã HTTP, JSON phản hồi)"""
+        giai_doan = {"getUpdates": "poll", "getChatMember": "quyen"}.get(method, method)
+        try:
+            with self.bo_do.do(giai_doan):
+                async with self.http.post(
+                    f"{self.api_url}/{method}",
+                    data=data or {},
+                    timeout=aiohttp.ClientTimeout(total=timeout or self.cau_hinh.request_timeout)
+                ) as resp:
+                    try:
+                        ket_qua = resp.status, await resp.json(content_type=None)
+                    except ValueError:
+                        ket_qua = resp.status, {}
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.bo_do.dem("errors", kind="telegram_connection")
+            raise
+        if ket_qua[0] != 200:
+            self.bo_do.dem("errors", kind=f"telegram_http_{ket_qua[0]}")
+        return ket_qua
+
+    async def _gui_qua_hang_doi_async(self, chat_id: int, method: str, data: dict, uu_tien: int) -> tuple:
+        """Gửi qua bộ lập lịch (giới hạn tốc độ, tự gửi lại khi 429), trả về (mã HTTP, JSON phản hồi)"""
+        return await self.bo_lap_lich.gui(chat_id, method, data, uu_tien)
+
+    async def khoi_dong_async(self) -> bool:
+        """Khởi động bot và lấy thông tin cơ bản"""
+        try:
+            status, data = await self._goi_api("getMe", timeout=10.0)
+            if status == 200 and data.get("ok"):
+                bot_info = data.get("result", {})
+                self.bot_id = bot_info.get("id")
+                if not self.cau_hinh.bot_username and bot_info.get("username"):
+                    self.cau_hinh.bot_username = bot_info.get("username")
+                self.logger.info(f"✅ Khởi động thành công! Bot ID: {self.bot_id}, Username: @{self.cau_hinh.bot_username}")
+                return True
+            self.logger.error("❌ Không thể khởi động bot")
+            return False
+        except Exception as e:
+            self.logger.error(f"❌ Lỗi khi khởi động bot: {str(e)}")
+            return False
+
+    async def co_quyen_gui_tin_nhan_async(self, chat_id: int) -> bool:
+        """Kiểm tra quyền gửi tin nhắn (dùng chung cache quyền với engine đồng bộ)"""
+        if chat_id > 0:
+            return True
+
+        co_quyen = self.quyen_chat.lay(chat_id)
+        if co_quyen is not None:
+            return co_quyen
+
+        try:
+            status, data = await self._goi_api(
+                "getChatMember", {"chat_id": chat_id, "user_id": self.bot_id}, timeout=5.0
+            )
+            co_quyen = self._quyen_tu_phan_hoi(status, data)
+            if co_quyen is None:
+                return True  # Không cache, cứ thử gửi
+            self.quyen_chat.dat(chat_id, co_quyen)
+            return co_quyen
+        except Exception:
+            return True  # Mặc định là có quyền nếu không kiểm tra được
+
+    async def gui_tin_nhan_async(self, chat_id: int, text: str, reply_to: int = None, disable_preview: bool = True,
+                                 uu_tien: int = UU_TIEN_THUONG):
+        """Gửi tin nhắn văn bản, trả về tin nhắn đã gửi hoặc None"""
+        if not await self.co_quyen_gui_tin_nhan_async(chat_id):
+            self.logger.warning("🚫 Bot không có quyền gửi tin nhắn trong chat %s", chat_id)
+            return None
+
+        data = {
+            "chat_id": chat_id,
+            "text": text,
+            "parse_mode": "HTML",
+            "disable_web_page_preview": "true" if disable_preview else "false"
+        }
+        if reply_to:
+            data["reply_to_message_id"] = reply_to
+
+        try:
+            status, result = await self._gui_qua_hang_doi_async(chat_id, "sendMessage", data, uu_tien)
+            if status == 200:
+                self.logger.debug("✅ Đã gửi tin nhắn đến chat %s", chat_id)
+                return result.get("result") or {}
+            self._xu_ly_loi_gui(chat_id, status)
+            self.logger.error(f"❌ Gửi tin nhắn thất bại đến {chat_id}: HTTP {status}")
+            return None
+        except Exception as e:
+            self.logger.error(f"❌ Gửi tin nhắn thất bại đến {chat_id}: {str(e)}")
+            return None
+
+    async def sua_tin_nhan_async(self, chat_id: int, message_id: int, text: str, disable_preview: bool = True):
+        """Sửa nội dung tin nhắn đã gửi (editMessageText), trả về tin nhắn sau khi sửa hoặc None"""
+        try:
+            status, result = await self._gui_qua_hang_doi_async(chat_id, "editMessageText", {
+                "chat_id": chat_id,
+                "message_id": message_id,
+                "text": text,
+                "parse_mode": "HTML",
+                "disable_web_page_preview": "true" if disable_preview else "false"
+            }, UU_TIEN_KET_QUA)
+            if status == 200:
+                self.logger.debug("✅ Đã cập nhật tin nhắn trong chat %s", chat_id)
+                return result.get("result") or {}
+            self.logger.warning("⚠️ Sửa tin nhắn thất bại trong chat %s: HTTP %s", chat_id, status)
+            return None
+        except Exception as e:
+            self.logger.warning("⚠️ Sửa tin nhắn thất bại trong chat %s: %s", chat_id, e)
+            return None
+
+    async def xoa_tin_nhan_async(self, chat_id: int, message_id: int) -> bool:
+        """Xóa tin nhắn của bot (deleteMessage)"""
+        try:
+            status, _ = await self._goi_api("deleteMessage", {"chat_id": chat_id, "message_id": message_id})
+            return status == 200
+        except Exception as e:
+            self.logger.warning("⚠️ Xóa tin nhắn thất bại trong chat %s: %s", chat_id, e)
+            return False
+
+    def gui_hanh_dong_async(self, chat_id: int, hanh_dong: str = "typing"):
+        """Hiện trạng thái "đang nhập..."/"đang gửi ảnh..." (sendChatAction) mà không chờ phản hồi"""
+        async def gui():
+            try:
+                await self._goi_api("sendChatAction", {"chat_id": chat_id, "action": hanh_dong})
+            except Exception as e:
+                self.logger.debug("sendChatAction thất bại trong chat %s: %s", chat_id, e)
+
+        tac_vu = asyncio.create_task(gui())
+        self._tac_vu_nen.add(tac_vu)
+        tac_vu.add_done_callback(self._tac_vu_nen.discard)
+
+    async def gui_anh_dai_dien_async(self, chat_id: int, uid: str, caption: str, reply_to: int = None):
+        """Gửi ảnh đại diện kèm chú thích, trả về tin nhắn đã gửi hoặc None"""
+        if not await self.co_quyen_gui_tin_nhan_async(chat_id):
+            self.logger.warning("🚫 Bot không có quyền gửi ảnh trong chat %s", chat_id)
+            return None
+
+        photo_url = f"https://profile.thug4ff.com/api/profile?uid={uid}"
+        file_id = self.file_id_anh.lay(uid)
+        data = {
+            "chat_id": chat_id,
+            "photo": file_id or photo_url,
+            "caption": caption,
+            "parse_mode": "HTML"
+        }
+        if reply_to:
+            data["reply_to_message_id"] = reply_to
+
+        try:
+            status, result = await self._gui_qua_hang_doi_async(chat_id, "sendPhoto", data, UU_TIEN_KET_QUA)
+            if file_id and status == 400:
+                self.file_id_anh.xoa(uid)
+                data["photo"] = photo_url
+                status, result = await self._gui_qua_hang_doi_async(chat_id, "sendPhoto", data, UU_TIEN_KET_QUA)
+            if status == 200 and result.get("ok"):
+                self._luu_file_id(uid, result)
+                self.logger.debug("✅ Đã gửi ảnh đại diện đến chat %s", chat_id)
+                return result.get("result") or {}
+            self._xu_ly_loi_gui(chat_id, status)
+            self.logger.warning("⚠️ Gửi ảnh thất bại: %s", result.get('description', 'Không rõ lỗi'))
+            return None
+        except Exception as e:
+            self.logger.warning("⚠️ Gửi ảnh thất bại: %s", e)
+            return None
+
+    async def tra_loi_inline_async(self, query_id: str, results: list, cache_time: int) -> bool:
+        """Trả lời inline query (answerInlineQuery)"""
+        try:
+            status, _ = await self._goi_api("answerInlineQuery", {
+                "inline_query_id": query_id,
+                "results": json.dumps(results),
+                "cache_time": cache_time
+            })
+            if status == 200:
+                return True
+            self.logger.warning("⚠️ Trả lời inline query thất bại: HTTP %s", status)
+            return False
+        except Exception as e:
+            self.logger.warning("⚠️ Trả lời inline query thất bại: %s", e)
+            return False
+
+    # ===== XỬ LÝ LỆNH =====
+    async def tra_cuu_game_thu_async(self, uid: str, region: str) -> dict:
+        """Tra cứu thông tin game thủ qua cache dùng chung"""
+        async def tai():
+            with self.bo_do.do("upstream"):
+                return await lay_thong_tin_game_thu_async(
+                    uid, region, self.ket_noi_upstream, self.cau_hinh.player_info_urls
+                )
+
+        return await self.bo_nho_dem.lay_hoac_tai_async(uid, region, tai)
+
+    async def tra_cuu_tu_dong_vung_async(self, uid: str) -> tuple:
+        """Giống command.tra_cuu_tu_dong_vung nhưng các yêu cầu thua cuộc được hủy ngay. Trả về (dữ liệu, vùng)"""
+        cac_vung = cac_vung_ung_vien(self.cau_hinh)
+        tac_vu = {asyncio.ensure_future(self.tra_cuu_game_thu_async(uid, region)): region for region in cac_vung}
+        dang_cho = set(tac_vu)
+        try:
+            while dang_cho:
+                xong, dang_cho = await asyncio.wait(dang_cho, return_when=asyncio.FIRST_COMPLETED)
+                for t in xong:
+                    data = None if t.exception() else t.result()
+                    if co_thong_tin(data):
+                        return data, tac_vu[t]
+            return None, cac_vung[0]
+        finally:
+            for t in dang_cho:
+                t.cancel()
+
+    async def _bao_dang_tra_cuu(self, chat_id: int, chat_type: str, reply_id: int, text: str, co_anh: bool = False):
+        """Giống command.bao_dang_tra_cuu, trả về tin nhắn placeholder hoặc None"""
+        hanh_dong = kieu_bao_dang_tra_cuu(self, chat_type, co_anh)
+        if hanh_dong is None:
+            return await self.gui_tin_nhan_async(chat_id, text, reply_id)
+        self.gui_hanh_dong_async(chat_id, hanh_dong)
+        return None
+
+    async def _tra_loi_ket_qua(self, chat_id: int, reply_id: int, placeholder, text: str, uid: str = ""):
+        """Giống command.tra_loi_ket_qua: sửa placeholder thành kết quả, không được thì gửi mới và xóa placeholder"""
+        message_id = (placeholder or {}).get("message_id")
+        co_anh = gui_kem_anh(self, uid)
+        if message_id and not co_anh:
+            da_sua = await self.sua_tin_nhan_async(chat_id, message_id, text)
+            if da_sua is not None:
+                return da_sua
+
+        if co_anh:
+            da_gui = await self.gui_anh_dai_dien_async(chat_id, uid, text, reply_id)
+        else:
+            da_gui = await self.gui_tin_nhan_async(chat_id, text, reply_id, uu_tien=UU_TIEN_KET_QUA)
+        if message_id:
+            await self.xoa_tin_nhan_async(chat_id, message_id)
+        return da_gui
+
+    async def _tra_cuu_va_tra_loi(self, ke_hoach: dict):
+        """Giống command._tra_cuu_va_tra_loi: tra cứu một UID theo kế hoạch từ quyet_dinh_ff"""
+        chat_id, reply_id = ke_hoach["chat_id"], ke_hoach["reply_id"]
+        data, region = ke_hoach["data"], ke_hoach["region"]
+        placeholder = None
+        if not ke_hoach["co_trong_cache"]:
+            placeholder = await self._bao_dang_tra_cuu(chat_id, ke_hoach["chat_type"], reply_id, TIN_DANG_TRA_CUU,
+                                                       co_anh=self.cau_hinh.enable_photos)
+            if region:
+                data = await self.tra_cuu_game_thu_async(ke_hoach["uid"], region)
+            else:
+                data, region = await self.tra_cuu_tu_dong_vung_async(ke_hoach["uid"])
+
+        msg, player_uid = tao_tra_loi_ff(self, ke_hoach, data, region)
+        await self._tra_loi_ket_qua(chat_id, reply_id, placeholder, msg, player_uid)
+
+    async def _tra_cuu_hang_loat_va_tra_loi(self, ke_hoach: dict):
+        """Giống command._tra_cuu_hang_loat_va_tra_loi, số UID tra cứu đồng thời giới hạn bởi BATCH_CONCURRENCY"""
+        chat_id, reply_id = ke_hoach["chat_id"], ke_hoach["reply_id"]
+        placeholder = await self._bao_dang_tra_cuu(chat_id, ke_hoach["chat_type"], reply_id, ke_hoach["tin_cho"])
+
+        gioi_han = asyncio.Semaphore(self.cau_hinh.batch_concurrency)
+
+        async def tra_cuu(uid: str):
+            async with gioi_han:
+                return uid, await self.tra_cuu_game_thu_async(uid, ke_hoach["region"])
+
+        ket_qua = await asyncio.gather(*(tra_cuu(uid) for uid in ke_hoach["uids"]))
+        cac_tin = tao_tra_loi_hang_loat(self, ke_hoach, ket_qua)
+        await self._tra_loi_ket_qua(chat_id, reply_id, placeholder, cac_tin[0])
+        for tin in cac_tin[1:]:
+            await self.gui_tin_nhan_async(chat_id, tin, reply_id, uu_tien=UU_TIEN_KET_QUA)
+
+    async def _tra_cuu_inline(self, query_id: str, user_id: int, uid: str, region: str):
+        """Giống command._tra_cuu_inline: chỉ tra cứu query cuối cùng của người dùng sau debounce"""
+        self._inline_moi_nhat[user_id] = query_id
+        await asyncio.sleep(self.cau_hinh.inline_debounce)
+        if self._inline_moi_nhat.get(user_id) != query_id:
+            return  # Người dùng đã gõ tiếp, query này bị thay thế
+        del self._inline_moi_nhat[user_id]
+        data = await self.tra_cuu_game_thu_async(uid, region)
+        await self.tra_loi_inline_async(query_id, *tao_tra_loi_inline(self, uid, region, data))
+
+    async def thuc_hien_async(self, hanh_dong):
+        """Giống command.thuc_hien: thực hiện hành động từ quyet_dinh_* bằng API gửi asyncio"""
+        if hanh_dong is None:
+            return
+        loai, tham_so = hanh_dong
+        if loai == TRA_LOI:
+            await self.gui_tin_nhan_async(*tham_so)
+        elif loai == TRA_CUU:
+            await self._tra_cuu_va_tra_loi(tham_so)
+        elif loai == TRA_CUU_HANG_LOAT:
+            await self._tra_cuu_hang_loat_va_tra_loi(tham_so)
+        elif loai == TRA_LOI_INLINE:
+            await self.tra_loi_inline_async(*tham_so)
+        elif loai == TRA_CUU_INLINE:
+            await self._tra_cuu_inline(*tham_so)
+
+    async def xu_ly_update(self, update: dict):
+        """Tương đương xu_ly_tin_nhan của engine đồng bộ: cùng phần quyết định, chỉ khác phần gửi/nhận"""
+        await self.thuc_hien_async(quyet_dinh_update(self, update))
+
+    async def _xu_ly_theo_thu_tu(self, update: dict, chat_id: int, gioi_han: asyncio.Semaphore):
+        """Xử lý update sau các update trước đó của cùng chat"""
+        try:
+            if "inline_query" in update:
+                # Inline query không cần giữ thứ tự, và không được chặn debounce của query sau
+                await self.xu_ly_update(update)
+                return
+            khoa = self._khoa_chat.get(chat_id)
+            if khoa is None:
+                khoa = asyncio.Lock()
+                self._khoa_chat[chat_id] = khoa
+            async with khoa:
+                await self.xu_ly_update(update)
+        except Exception as e:
+            self.logger.exception(f"🔥 Lỗi khi xử lý update {update.get('update_id')}: {str(e)}")
+        finally:
+            gioi_han.release()
+
+    # ===== VÒNG LẶP CHÍNH =====
+    async def chay_async(self):
+        """Vòng lặp long polling, mỗi update được xử lý trong một task riêng"""
+        from dispatch import lay_khoa_dinh_tuyen
+
+        self.http = aiohttp.ClientSession(headers={"User-Agent": "FreeFireInfoBot/2.0"})
+        gioi_han = asyncio.Semaphore(self.cau_hinh.async_concurrency)
+        try:
+            if not await self.khoi_dong_async():
+                self.logger.error("❌ Không thể khởi động bot, dừng hoạt động")
+                return
+
+            self.logger.info("🚀 Bot đã sẵn sàng hoạt động (asyncio)")
+            self.logger.info(f"🌍 Môi trường: {os.getenv('VERCEL', 'LOCAL')}")
+            self.logger.info(f"🐍 Python version: {os.getenv('PYTHON_VERSION', sys.version)}")
+            self.logger.info(f"⏰ Sử dụng múi giờ UTC{self.cau_hinh.timezone_offset:+d} (Việt Nam)")
+
+            self._doc_offset()
+            loai_update = json.dumps(lay_loai_update(self.cau_hinh))
+            while self.running:
+                try:
+                    status, data = await self._goi_api(
+                        "getUpdates",
+                        {"offset": self.update_offset, "timeout": self.cau_hinh.poll_timeout,
+                         "allowed_updates": loai_update},
+                        timeout=self.cau_hinh.poll_timeout + 5
+                    )
+                    if status == 409:
+                        self.logger.error("❌ Webhook đang được bật, chạy `python app.py deletewebhook` để dùng polling")
+                        await asyncio.sleep(5)
+                        continue
+
+                    if status != 200:
+                        self.logger.error(f"❌ Lỗi khi lấy cập nhật: HTTP {status}")
+                        await asyncio.sleep(1)
+                        continue
+
+                    updates = data.get("result", [])
+                    for update in updates:
+                        if not self.running:
+                            break
+                        if la_update_bo_qua(update, self.cau_hinh.bot_username):
+                            self.update_offset = update.get("update_id", self.update_offset) + 1
+                            continue
+                        # Chờ khi đã đủ số update đang xử lý đồng thời (backpressure)
+                        await gioi_han.acquire()
+                        task = asyncio.create_task(
+                            self._xu_ly_theo_thu_tu(update, lay_khoa_dinh_tuyen(update), gioi_han)
+                        )
+                        self._dang_xu_ly.add(task)
+                        task.add_done_callback(self._dang_xu_ly.discard)
+                        self.update_offset = update.get("update_id", self.update_offset) + 1
+                    if updates:
+                        self._luu_offset()
+
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    self.logger.error(f"❌ Lỗi kết nối: {str(e)}")
+                    await asyncio.sleep(2)
+                except Exception as e:
+                    self.logger.exception(f"🔥 Lỗi không mong đợi: {str(e)}")
+                    await asyncio.sleep(1)
+
+            if self._dang_xu_ly:
+                self.logger.info(f"⏳ Đang chờ xử lý nốt {len(self._dang_xu_ly)} update...")
+                await asyncio.gather(*self._dang_xu_ly, return_exceptions=True)
+        finally:
+            if self._rieng_tai_nguyen:
+                await self.ket_noi_upstream.dong()
+            await self.http.close()
+
+        self.logger.info("⏹️ Bot đã dừng hoạt động")
+
+    def chay(self):
+        """Chạy bot trên một event loop asyncio"""
+        may_chu_metrics = self._bat_dau_metrics() if self._rieng_tai_nguyen else None
+        try:
+            asyncio.run(self.chay_async())
+        finally:
+            if may_chu_metrics:
+                may_chu_metrics.dung()
@@ -0,0 +1,3 @@
+"""
+Bộ benchmark tải cho bot - chạy bot với máy chủ Telegram và /player-info giả lập cục bộ
+"""
@@ -0,0 +1,248 @@
+"""
+Máy chủ giả lập Telegram Bot API và API /player-info cho benchmark - chạy cục bộ, có thể
+cấu hình độ trễ, tỉ lệ lỗi và chèn 429
+"""
+
+import json
+import random
+import sys
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class CauHinhGiaLap:
+    """Độ trễ (giây) và tỉ lệ lỗi của một máy chủ giả lập"""
+    def __init__(self, do_tre: float = 0.0, dao_dong: float = 0.0, ti_le_loi: float = 0.0,
+                 ti_le_429: float = 0.0, retry_after: int = 1):
+        self.do_tre = do_tre
+        self.dao_dong = dao_dong
+        self.ti_le_loi = ti_le_loi
+        self.ti_le_429 = ti_le_429
+        self.retry_after = retry_after
+
+    def cho(self):
+        tre = self.do_tre + random.uniform(0, self.dao_dong)
+        if tre > 0:
+            time.sleep(tre)
+
+    def loi_ngau_nhien(self):
+        """Trả về mã lỗi được chèn (429/500) hoặc None"""
+        x = random.random()
+        if x < self.ti_le_429:
+            return 429
+        if x < self.ti_le_429 + self.ti_le_loi:
+            return 500
+        return None
+
+class _HandlerJSON(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _doc_tham_so(self) -> dict:
+        url = urllib.parse.urlparse(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        do_dai = int(self.headers.get("Content-Length") or 0)
+        if do_dai:
+            body = self.rfile.read(do_dai).decode()
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                params.update(json.loads(body))
+            else:
+                params.update(dict(urllib.parse.parse_qsl(body)))
+        return params
+
+    def _tra_loi(self, obj, code: int = 200, headers: dict = None):
+        body = json.dumps(obj).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class _MayChuHTTP(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Client đóng kết nối giữa chừng (yêu cầu hedge bị hủy, bot dừng) là bình thường khi benchmark
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+class _MayChu:
+    def __init__(self, handler_cls):
+        self.server = _MayChuHTTP(("127.0.0.1", 0), handler_cls)
+        self.server.gia_lap = self
+        self._luong = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def bat_dau(self):
+        self._luong.start()
+        return self
+
+    def dung(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+# ===== TELEGRAM BOT API =====
+class _HandlerTelegram(_HandlerJSON):
+    def _xu_ly(self):
+        gia_lap = self.server.gia_lap
+        method = urllib.parse.urlparse(self.path).path.rsplit("/", 1)[-1]
+        params = self._doc_tham_so()
+        gia_lap.dem_goi[method] += 1
+
+        if method == "getMe":
+            self._tra_loi({"ok": True, "result": {"id": 1, "is_bot": True, "username": "bench_bot"}})
+            return
+        if method == "getUpdates":
+            self._tra_loi({"ok": True, "result": gia_lap.lay_updates(
+                int(params.get("offset", 0)), float(params.get("timeout", 0)))})
+            return
+
+        gia_lap.cau_hinh.cho()
+        ma_loi = gia_lap.cau_hinh.loi_ngau_nhien()
+        if ma_loi == 429:
+            gia_lap.dem_goi["_429"] += 1
+            self._tra_loi({"ok": False, "error_code": 429, "description": "Too Many Requests",
+                           "parameters": {"retry_after": gia_lap.cau_hinh.retry_after}}, 429)
+            return
+        if ma_loi:
+            self._tra_loi({"ok": False, "error_code": ma_loi, "description": "Internal Server Error"}, ma_loi)
+            return
+
+        if method == "getChatMember":
+            self._tra_loi({"ok": True, "result": {"status": "member"}})
+            return
+
+        message_id = gia_lap.ghi_nhan_gui(method, params)
+        self._tra_loi({"ok": True, "result": {
+            "message_id": message_id,
+            "chat": {"id": int(params.get("chat_id", 0) or 0)},
+            "photo": [{"file_id": f"bench-file-{message_id}", "file_unique_id": str(message_id)}]
+        }})
+
+    do_GET = _xu_ly
+    do_POST = _xu_ly
+
+class TelegramGiaLap(_MayChu):
+    """
+    Giả lập Telegram: phát update qua getUpdates (long polling thật sự theo offset)
+    và ghi lại thời điểm bot gửi phản hồi cho từng tin nhắn.
+    """
+    def __init__(self, cau_hinh: CauHinhGiaLap):
+        super().__init__(_HandlerTelegram)
+        self.cau_hinh = cau_hinh
+        self.dem_goi = Counter()
+        self._updates = []
+        self._cond = threading.Condition()
+        self._message_id = 10 ** 6
+        self.thoi_diem_phat = {}   # (chat_id, message_id) -> thời điểm update sẵn sàng
+        self.thoi_diem_tra_loi = {}  # (chat_id, message_id) -> thời điểm phản hồi cuối cùng
+        self._goc_cua_tin_nhan = {}  # tin nhắn bot đã gửi -> tin nhắn gốc nó trả lời
+
+    def them_update(self, update: dict):
+        message = update["message"]
+        with self._cond:
+            self.thoi_diem_phat[(message["chat"]["id"], message["message_id"])] = time.monotonic()
+            self._updates.append(update)
+            self._cond.notify_all()
+
+    def lay_updates(self, offset: int, timeout: float) -> list:
+        het_han = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                # Telegram xóa các update có id nhỏ hơn offset đã xác nhận
+                self._updates = [u for u in self._updates if u["update_id"] >= offset]
+                if self._updates:
+                    return self._updates[:100]
+                con_lai = het_han - time.monotonic()
+                if con_lai <= 0:
+                    return []
+                self._cond.wait(con_lai)
+
+    def ghi_nhan_gui(self, method: str, params: dict) -> int:
+        """
+        Ghi nhận một lần gửi/sửa tin nhắn. Tin nhắn "🔍 Đang tra cứu..." chỉ là placeholder,
+        phản hồi cuối cùng là tin nhắn/ảnh kết quả hoặc lần sửa placeholder thành kết quả.
+        """
+        with self._cond:
+            self._message_id += 1
+            chat_id = int(params.get("chat_id", 0) or 0)
+            reply_to = params.get("reply_to_message_id")
+            if method.startswith("edit"):
+                khoa = self._goc_cua_tin_nhan.get((chat_id, int(params.get("message_id", 0))))
+            else:
+                khoa = (chat_id, int(reply_to)) if reply_to else None
+            if khoa is None:
+                return self._message_id
+
+            self._goc_cua_tin_nhan[(chat_id, self._message_id)] = khoa
+            noi_dung = params.get("text") or params.get("caption") or ""
+            if not noi_dung.startswith("🔍"):
+                self.thoi_diem_tra_loi[khoa] = time.monotonic()
+                self._cond.notify_all()
+            return self._message_id
+
+    def cho_tra_loi(self, so_luong: int, timeout: float) -> bool:
+        """Chờ tới khi có so_luong tin nhắn đã được trả lời"""
+        het_han = time.monotonic() + timeout
+        with self._cond:
+            while len(self.thoi_diem_tra_loi) < so_luong:
+                con_lai = het_han - time.monotonic()
+                if con_lai <= 0:
+                    return False
+                self._cond.wait(con_lai)
+            return True
+
+# ===== API /player-info =====
+class _HandlerThongTin(_HandlerJSON):
+    def do_GET(self):
+        gia_lap = self.server.gia_lap
+        params = self._doc_tham_so()
+        gia_lap.dem_goi["player-info"] += 1
+        gia_lap.cau_hinh.cho()
+
+        ma_loi = gia_lap.cau_hinh.loi_ngau_nhien()
+        if ma_loi == 429:
+            self._tra_loi({"error": "rate limited"}, 429, {"Retry-After": str(gia_lap.cau_hinh.retry_after)})
+            return
+        if ma_loi:
+            self._tra_loi({"error": "upstream error"}, ma_loi)
+            return
+
+        uid = params.get("uid", "")
+        if gia_lap.cac_vung and params.get("region") != gia_lap.vung_cua(uid):
+            self._tra_loi({"error": "player not found"}, 404)
+            return
+        self._tra_loi({"basicInfo": {
+            "accountId": uid,
+            "nickname": f"Bench{uid[-4:]}",
+            "region": params.get("region", "SG"),
+            "level": 60,
+            "liked": 1234,
+            "rank": 300,
+            "createAt": "1686800000",
+            "lastLoginAt": str(int(time.time()))
+        }})
+
+class ThongTinGiaLap(_MayChu):
+    """Giả lập API /player-info (cac_vung: mỗi UID chỉ tồn tại ở một vùng trong danh sách)"""
+    def __init__(self, cau_hinh: CauHinhGiaLap, cac_vung: list = None):
+        super().__init__(_HandlerThongTin)
+        self.cau_hinh = cau_hinh
+        self.cac_vung = cac_vung or []
+        self.dem_goi = Counter()
+
+    def vung_cua(self, uid: str) -> str:
+        return self.cac_vung[int(uid or 0) % len(self.cac_vung)]
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}/player-info"
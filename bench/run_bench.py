@@ -0,0 +1,169 @@
+"""
+Chạy benchmark tải: phát một luồng update /ff tổng hợp vào Telegram giả lập và đo
+throughput, độ trễ phản hồi và số lần gọi API trên mỗi lệnh.
+
+Ví dụ:
+    python -m bench.run_bench --updates 500 --rate 50 --group-ratio 0.3 --hot-ratio 0.8
+    RUNTIME=async python -m bench.run_bench --updates 1000 --rate 0
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+from bench.fake_servers import CauHinhGiaLap, TelegramGiaLap, ThongTinGiaLap
+
+def doc_tham_so(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark tải cho Free Fire bot")
+    parser.add_argument("--updates", type=int, default=300, help="Số update /ff được phát")
+    parser.add_argument("--rate", type=float, default=50.0, help="Số update mỗi giây (0 = phát dồn một lần)")
+    parser.add_argument("--chats", type=int, default=50, help="Số chat khác nhau")
+    parser.add_argument("--group-ratio", type=float, default=0.3, help="Tỉ lệ update đến từ group")
+    parser.add_argument("--hot-ratio", type=float, default=0.7, help="Tỉ lệ update tra cứu UID nóng")
+    parser.add_argument("--hot-uids", type=int, default=20, help="Số UID nóng (được tra cứu lặp lại)")
+    parser.add_argument("--tg-latency", type=float, default=0.02, help="Độ trễ Telegram giả lập (giây)")
+    parser.add_argument("--tg-error-rate", type=float, default=0.0)
+    parser.add_argument("--tg-429-rate", type=float, default=0.0)
+    parser.add_argument("--upstream-latency", type=float, default=0.2, help="Độ trễ /player-info giả lập (giây)")
+    parser.add_argument("--upstream-jitter", type=float, default=0.1)
+    parser.add_argument("--upstream-error-rate", type=float, default=0.0)
+    parser.add_argument("--upstream-429-rate", type=float, default=0.0)
+    parser.add_argument("--mirrors", type=int, default=1, help="Số mirror /player-info giả lập (PLAYER_INFO_URLS)")
+    parser.add_argument("--down-mirrors", type=int, default=0, help="Số mirror đầu tiên luôn trả về lỗi 500")
+    parser.add_argument("--spread-regions", default="",
+                        help="Chia UID vào các vùng này (ví dụ SG,VN,ID,TH), tra cứu sai vùng trả về 404")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Thời gian chờ phản hồi tối đa (giây)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="Hiện log INFO của bot")
+    parser.add_argument("--output", default="", help="Ghi thêm báo cáo ra file")
+    return parser.parse_args(argv)
+
+# ===== LUỒNG UPDATE TỔNG HỢP =====
+def tao_luong_update(tham_so) -> list:
+    """Tạo danh sách update /ff: chat riêng/group và UID nóng/lạnh theo tỉ lệ cấu hình"""
+    rng = random.Random(tham_so.seed)
+    uid_nong = [str(1000000000 + i) for i in range(tham_so.hot_uids)]
+    so_group = int(tham_so.chats * tham_so.group_ratio)
+    chat_rieng = [100000 + i for i in range(tham_so.chats - so_group)] or [100000]
+    chat_group = [-(100000 + i) for i in range(so_group)] or [-100000]
+
+    updates = []
+    for i in range(tham_so.updates):
+        la_group = rng.random() < tham_so.group_ratio
+        chat_id = rng.choice(chat_group if la_group else chat_rieng)
+        if uid_nong and rng.random() < tham_so.hot_ratio:
+            uid = rng.choice(uid_nong)
+        else:
+            uid = str(2000000000 + i)
+        user_id = abs(chat_id) if not la_group else 500000 + rng.randrange(1000)
+        updates.append({
+            "update_id": i + 1,
+            "message": {
+                "message_id": i + 1,
+                "from": {"id": user_id, "username": f"bench{user_id}"},
+                "chat": {"id": chat_id, "type": "group" if la_group else "private"},
+                "date": int(time.time()),
+                "text": f"/ff {uid}"
+            }
+        })
+    return updates
+
+def phat_update(telegram: TelegramGiaLap, updates: list, rate: float):
+    if rate <= 0:
+        for update in updates:
+            telegram.them_update(update)
+        return
+    bat_dau = time.monotonic()
+    for i, update in enumerate(updates):
+        cho = bat_dau + i / rate - time.monotonic()
+        if cho > 0:
+            time.sleep(cho)
+        telegram.them_update(update)
+
+# ===== BÁO CÁO =====
+def phan_vi(mau: list, p: float) -> float:
+    if not mau:
+        return 0.0
+    mau = sorted(mau)
+    return mau[min(len(mau) - 1, int(round(p / 100 * (len(mau) - 1))))]
+
+def tao_bao_cao(tham_so, telegram: TelegramGiaLap, cac_mirror: list, so_update: int) -> str:
+    xong = [k for k in telegram.thoi_diem_phat if k in telegram.thoi_diem_tra_loi]
+    do_tre = [telegram.thoi_diem_tra_loi[k] - telegram.thoi_diem_phat[k] for k in xong]
+    thoi_gian = (max(telegram.thoi_diem_tra_loi[k] for k in xong) - min(telegram.thoi_diem_phat.values())) if xong else 0.0
+    goi_telegram = sum(v for k, v in telegram.dem_goi.items() if k not in ("getUpdates", "getMe", "_429"))
+    chi_tiet = ", ".join(f"{k}={v}" for k, v in sorted(telegram.dem_goi.items()) if k not in ("getUpdates", "getMe"))
+    goi_upstream = sum(m.dem_goi["player-info"] for m in cac_mirror)
+    theo_mirror = ", ".join(f"mirror{i}={m.dem_goi['player-info']}" for i, m in enumerate(cac_mirror))
+
+    dong = [
+        f"Engine: {os.getenv('RUNTIME', 'thread')} | updates={so_update} rate={tham_so.rate or 'burst'}/s "
+        f"chats={tham_so.chats} group={tham_so.group_ratio:.0%} hot={tham_so.hot_ratio:.0%}x{tham_so.hot_uids}",
+        f"Đã trả lời: {len(xong)}/{so_update} trong {thoi_gian:.2f}s",
+        f"Throughput: {len(xong) / thoi_gian if thoi_gian else 0.0:.1f} update/s",
+        f"Độ trễ phản hồi: p50={phan_vi(do_tre, 50) * 1000:.0f}ms "
+        f"p95={phan_vi(do_tre, 95) * 1000:.0f}ms p99={phan_vi(do_tre, 99) * 1000:.0f}ms "
+        f"max={max(do_tre, default=0.0) * 1000:.0f}ms",
+        f"Gọi /player-info: {goi_upstream} ({goi_upstream / max(so_update, 1):.2f}/lệnh)"
+        + (f" [{theo_mirror}]" if len(cac_mirror) > 1 else ""),
+        f"Gọi Telegram: {goi_telegram} ({goi_telegram / max(so_update, 1):.2f}/lệnh) [{chi_tiet}]"
+    ]
+    return "\n".join(dong)
+
+# ===== THỰC THI CHÍNH =====
+def main(argv=None) -> int:
+    tham_so = doc_tham_so(argv)
+    random.seed(tham_so.seed)
+
+    telegram = TelegramGiaLap(CauHinhGiaLap(
+        tham_so.tg_latency, 0.0, tham_so.tg_error_rate, tham_so.tg_429_rate)).bat_dau()
+    cac_mirror = [
+        ThongTinGiaLap(CauHinhGiaLap(
+            tham_so.upstream_latency, tham_so.upstream_jitter,
+            1.0 if i < tham_so.down_mirrors else tham_so.upstream_error_rate, tham_so.upstream_429_rate),
+            [r.strip().upper() for r in tham_so.spread_regions.split(",") if r.strip()]).bat_dau()
+        for i in range(max(1, tham_so.mirrors))
+    ]
+
+    os.environ["BOT_TOKEN"] = "bench"
+    os.environ["TELEGRAM_API_BASE"] = telegram.base_url
+    os.environ["PLAYER_INFO_URL"] = cac_mirror[0].url
+    os.environ["PLAYER_INFO_URLS"] = ",".join(m.url for m in cac_mirror)
+    os.environ.setdefault("POLL_TIMEOUT", "1")
+    # Luồng update tổng hợp gửi dồn dập từ ít người dùng: tắt kiểm soát truy cập trừ khi được đặt rõ
+    for bien in ("FLOOD_USER_RATE", "FLOOD_CHAT_RATE", "FLOOD_DEDUPE_WINDOW", "SHED_BACKLOG"):
+        os.environ.setdefault(bien, "0")
+
+    import app
+
+    # Bot phải được tạo trong luồng chính vì đăng ký signal handler
+    bot = app.tao_bot(app.CauHinh())
+    logging.getLogger("FreeFireBot").setLevel(logging.INFO if tham_so.verbose else logging.WARNING)
+    luong_bot = threading.Thread(target=bot.chay, name="bench-bot", daemon=True)
+    luong_bot.start()
+
+    updates = tao_luong_update(tham_so)
+    phat_update(telegram, updates, tham_so.rate)
+    if not telegram.cho_tra_loi(len(updates), tham_so.timeout):
+        print(f"⚠️ Hết thời gian chờ, mới có {len(telegram.thoi_diem_tra_loi)}/{len(updates)} phản hồi",
+              file=sys.stderr)
+
+    bot.running = False
+    luong_bot.join(30.0)
+    telegram.dung()
+    for mirror in cac_mirror:
+        mirror.dung()
+
+    bao_cao = tao_bao_cao(tham_so, telegram, cac_mirror, len(updates))
+    print(bao_cao)
+    if tham_so.output:
+        with open(tham_so.output, "a", encoding="utf-8") as f:
+            f.write(bao_cao + "\n\n")
+    return 0 if len(telegram.thoi_diem_tra_loi) == len(updates) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
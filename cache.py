@@ -0,0 +1,294 @@
+"""
+Bộ nhớ đệm dùng chung cho bot - LRU có thời hạn và cache thông tin game thủ
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+class BoNhoDemTTL:
+    """Bộ nhớ đệm LRU có thời hạn (TTL), an toàn khi dùng từ nhiều luồng"""
+    def __init__(self, kich_thuoc_toi_da: int, ttl: float):
+        self.kich_thuoc_toi_da = kich_thuoc_toi_da
+        self.ttl = ttl
+        self._du_lieu = OrderedDict()  # khóa -> (thời điểm hết hạn, giá trị)
+        self._khoa = threading.Lock()
+
+    def lay(self, khoa, mac_dinh=None):
+        """Lấy giá trị còn hạn, trả về mac_dinh nếu không có hoặc đã hết hạn"""
+        with self._khoa:
+            muc = self._du_lieu.get(khoa)
+            if muc is None:
+                return mac_dinh
+            het_han, gia_tri = muc
+            if het_han < time.monotonic():
+                del self._du_lieu[khoa]
+                return mac_dinh
+            self._du_lieu.move_to_end(khoa)
+            return gia_tri
+
+    def dat(self, khoa, gia_tri, ttl: float = None):
+        """Lưu giá trị, loại bỏ mục ít dùng nhất khi vượt kích thước"""
+        het_han = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._khoa:
+            self._du_lieu[khoa] = (het_han, gia_tri)
+            self._du_lieu.move_to_end(khoa)
+            while len(self._du_lieu) > self.kich_thuoc_toi_da:
+                self._du_lieu.popitem(last=False)
+
+    def xoa(self, khoa):
+        with self._khoa:
+            self._du_lieu.pop(khoa, None)
+
+    def __len__(self):
+        return len(self._du_lieu)
+
+class _YeuCauDangTai:
+    """Một lượt tải đang chạy mà các yêu cầu trùng lặp có thể chờ chung"""
+    def __init__(self):
+        self.xong = threading.Event()
+        self.ket_qua = None
+
+class _NguoiTaiThatBai(Exception):
+    """Yêu cầu đang tải (engine asyncio) bị hủy hoặc lỗi trước khi có kết quả, yêu cầu gộp phải tự tải lại"""
+
+# Đánh dấu dữ liệu không hợp lệ trong cache (negative caching)
+_KHONG_CO = object()
+
+TTL_VUNG = 30 * 86400.0  # Game thủ hiếm khi đổi vùng nên chỉ mục uid→vùng được giữ lâu
+
+class BoNhoDemGameThu:
+    """
+    Cache thông tin game thủ theo (uid, vùng):
+    - LRU trong bộ nhớ với TTL, lưu ngắn hạn cả các UID không tìm thấy
+    - Gộp các yêu cầu trùng nhau đang chạy thành một lần gọi upstream (single-flight)
+    - Tùy chọn lưu xuống SQLite để khởi động lại không bị cache rỗng
+    - Chỉ mục uid→vùng của các lần tra cứu thành công (lưu cùng file SQLite nếu có)
+    """
+    def __init__(self, kich_thuoc_toi_da: int, ttl: float, ttl_am: float, duong_dan_db: str = "", logger=None):
+        self.ttl = ttl
+        self.ttl_am = ttl_am
+        self.logger = logger
+        self._bo_nho = BoNhoDemTTL(kich_thuoc_toi_da, ttl)
+        self._vung = BoNhoDemTTL(kich_thuoc_toi_da * 4, TTL_VUNG)  # uid -> vùng, "" = chưa biết
+        self._dang_tai = {}
+        self._dang_tai_async = {}  # khóa -> asyncio.Future, dùng cho engine asyncio
+        self._khoa = threading.Lock()
+        self.thong_ke = {"hit": 0, "miss": 0, "hit_db": 0, "gop": 0}
+
+        self._db = None
+        self._khoa_db = threading.Lock()
+        if duong_dan_db:
+            self._mo_db(duong_dan_db)
+
+    # ===== SQLITE =====
+    def _mo_db(self, duong_dan: str):
+        try:
+            self._db = sqlite3.connect(duong_dan, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS player_cache ("
+                "uid TEXT, region TEXT, data TEXT, luu_luc REAL, PRIMARY KEY (uid, region))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS player_region (uid TEXT PRIMARY KEY, region TEXT, luu_luc REAL)"
+            )
+            self._db.execute("DELETE FROM player_cache WHERE luu_luc < ?", (time.time() - self.ttl,))
+            self._db.execute("DELETE FROM player_region WHERE luu_luc < ?", (time.time() - TTL_VUNG,))
+            self._db.commit()
+        except sqlite3.Error as e:
+            self._ghi_loi(f"⚠️ Không mở được cache SQLite {duong_dan}: {str(e)}")
+            self._db = None
+
+    def _doc_db(self, uid: str, region: str):
+        if self._db is None:
+            return None
+        try:
+            with self._khoa_db:
+                row = self._db.execute(
+                    "SELECT data FROM player_cache WHERE uid = ? AND region = ? AND luu_luc >= ?",
+                    (uid, region, time.time() - self.ttl)
+                ).fetchone()
+            return json.loads(row[0]) if row else None
+        except (sqlite3.Error, ValueError) as e:
+            self._ghi_loi(f"⚠️ Lỗi đọc cache SQLite: {str(e)}")
+            return None
+
+    def _ghi_db(self, uid: str, region: str, data: dict):
+        if self._db is None:
+            return
+        try:
+            with self._khoa_db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO player_cache (uid, region, data, luu_luc) VALUES (?, ?, ?, ?)",
+                    (uid, region, json.dumps(data), time.time())
+                )
+                self._db.commit()
+        except sqlite3.Error as e:
+            self._ghi_loi(f"⚠️ Lỗi ghi cache SQLite: {str(e)}")
+
+    def _doc_vung_db(self, uid: str) -> str:
+        if self._db is None:
+            return ""
+        try:
+            with self._khoa_db:
+                row = self._db.execute(
+                    "SELECT region FROM player_region WHERE uid = ? AND luu_luc >= ?", (uid, time.time() - TTL_VUNG)
+                ).fetchone()
+            return row[0] if row else ""
+        except sqlite3.Error as e:
+            self._ghi_loi(f"⚠️ Lỗi đọc cache SQLite: {str(e)}")
+            return ""
+
+    def _ghi_vung_db(self, uid: str, region: str):
+        if self._db is None:
+            return
+        try:
+            with self._khoa_db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO player_region (uid, region, luu_luc) VALUES (?, ?, ?)",
+                    (uid, region, time.time())
+                )
+                self._db.commit()
+        except sqlite3.Error as e:
+            self._ghi_loi(f"⚠️ Lỗi ghi cache SQLite: {str(e)}")
+
+    def uid_gan_day(self, so_luong: int) -> list:
+        """Các UID được lưu gần đây nhất trong SQLite (dùng để làm nóng file_id ảnh)"""
+        if self._db is None:
+            return []
+        try:
+            with self._khoa_db:
+                rows = self._db.execute(
+                    "SELECT uid FROM player_cache GROUP BY uid ORDER BY MAX(luu_luc) DESC LIMIT ?", (so_luong,)
+                ).fetchall()
+            return [row[0] for row in rows]
+        except sqlite3.Error as e:
+            self._ghi_loi(f"⚠️ Lỗi đọc cache SQLite: {str(e)}")
+            return []
+
+    def _ghi_loi(self, message: str):
+        if self.logger:
+            self.logger.warning(message)
+
+    # ===== CHỈ MỤC UID → VÙNG =====
+    def vung_cua(self, uid: str) -> str:
+        """Vùng của lần tra cứu thành công gần nhất của UID, chuỗi rỗng nếu chưa biết"""
+        region = self._vung.lay(uid)
+        if region is None:
+            region = self._doc_vung_db(uid)
+            # Ghi nhớ cả UID chưa biết (ngắn hạn) để không đọc SQLite ở mỗi lần tra cứu
+            self._vung.dat(uid, region, None if region else self.ttl_am)
+        return region
+
+    def ghi_vung(self, uid: str, region: str):
+        """Ghi nhận vùng của UID, chỉ ghi xuống SQLite khi vùng thay đổi"""
+        region = region.upper()
+        if self._vung.lay(uid) == region:
+            return
+        self._vung.dat(uid, region)
+        self._ghi_vung_db(uid, region)
+
+    # ===== TRA CỨU =====
+    @staticmethod
+    def la_du_lieu_hop_le(data) -> bool:
+        """Dữ liệu hợp lệ là dict có basicInfo"""
+        return isinstance(data, dict) and bool(data.get("basicInfo"))
+
+    def xem(self, uid: str, region: str) -> tuple:
+        """Chỉ đọc cache trong bộ nhớ, không gọi upstream. Trả về (có trong cache, dữ liệu)"""
+        gia_tri = self._bo_nho.lay((uid, region.upper()))
+        if gia_tri is None:
+            return False, None
+        self.thong_ke["hit"] += 1
+        return True, None if gia_tri is _KHONG_CO else gia_tri
+
+    def lay_hoac_tai(self, uid: str, region: str, tai):
+        """Trả về dữ liệu trong cache, hoặc gọi tai() một lần duy nhất cho các yêu cầu trùng nhau"""
+        khoa = (uid, region.upper())
+        gia_tri = self._bo_nho.lay(khoa)
+        if gia_tri is not None:
+            self.thong_ke["hit"] += 1
+            return None if gia_tri is _KHONG_CO else gia_tri
+
+        with self._khoa:
+            yeu_cau = self._dang_tai.get(khoa)
+            la_nguoi_tai = yeu_cau is None
+            if la_nguoi_tai:
+                yeu_cau = _YeuCauDangTai()
+                self._dang_tai[khoa] = yeu_cau
+
+        if not la_nguoi_tai:
+            self.thong_ke["gop"] += 1
+            yeu_cau.xong.wait()
+            return yeu_cau.ket_qua
+
+        try:
+            data = self._doc_db(*khoa)
+            if data is not None:
+                self.thong_ke["hit_db"] += 1
+                self._bo_nho.dat(khoa, data)
+            else:
+                self.thong_ke["miss"] += 1
+                data = tai()
+                self._luu_ket_qua(khoa, data)
+            yeu_cau.ket_qua = data
+            return data
+        finally:
+            with self._khoa:
+                self._dang_tai.pop(khoa, None)
+            yeu_cau.xong.set()
+
+    def _luu_ket_qua(self, khoa: tuple, data):
+        if self.la_du_lieu_hop_le(data):
+            self._bo_nho.dat(khoa, data)
+            self._ghi_db(*khoa, data)
+            self.ghi_vung(*khoa)
+        else:
+            self._bo_nho.dat(khoa, data or _KHONG_CO, self.ttl_am)
+
+    async def lay_hoac_tai_async(self, uid: str, region: str, tai):
+        """Phiên bản asyncio của lay_hoac_tai, tai là coroutine function"""
+        khoa = (uid, region.upper())
+        while True:
+            gia_tri = self._bo_nho.lay(khoa)
+            if gia_tri is not None:
+                self.thong_ke["hit"] += 1
+                return None if gia_tri is _KHONG_CO else gia_tri
+
+            dang_tai = self._dang_tai_async.get(khoa)
+            if dang_tai is None:
+                break
+            self.thong_ke["gop"] += 1
+            try:
+                return await asyncio.shield(dang_tai)
+            except _NguoiTaiThatBai:
+                continue  # Thử lại, có thể tự trở thành người tải
+
+        dang_tai = asyncio.get_running_loop().create_future()
+        self._dang_tai_async[khoa] = dang_tai
+        try:
+            data = self._doc_db(*khoa)
+            if data is not None:
+                self.thong_ke["hit_db"] += 1
+                self._bo_nho.dat(khoa, data)
+            else:
+                self.thong_ke["miss"] += 1
+                data = await tai()
+                self._luu_ket_qua(khoa, data)
+        except BaseException:
+            # Bị hủy (vùng thua cuộc khi dò vùng tự động...) hoặc lỗi: không trả None cho các yêu cầu
+            # đang chờ vì None nghĩa là không tìm thấy
+            dang_tai.set_exception(_NguoiTaiThatBai())
+            dang_tai.exception()  # Đánh dấu đã đọc để asyncio không cảnh báo khi không có ai chờ
+            raise
+        else:
+            dang_tai.set_result(data)
+            return data
+        finally:
+            self._dang_tai_async.pop(khoa, None)
+
+    def __len__(self):
+        return len(self._bo_nho)
@@ -2,11 +2,49 @@
 Xử lý các lệnh và tin nhắn từ người dùng - chỉ tập trung vào lệnh /ff với hướng dẫn tích hợp
 """
 
+import html
 import re
 import time
+from concurrent.futures import Future, as_completed
+from contextlib import nullcontext
+
 import requests
 from requests.exceptions import RequestException
 from datetime import datetime as _dt
+from urllib.parse import urlparse
+
+from admission import CHO_PHEP, GIOI_HAN_CHAT, GIOI_HAN_USER, QUA_TAI
+from logs import so_log_bi_bo
+from scheduler import UU_TIEN_KET_QUA, noi_tiep
+
+URL_THONG_TIN_GAME_THU = "https://free-fire-info-site-oe7p.vercel.app/player-info"
+GIOI_HAN_TIN_NHAN = 4096  # Số ký tự tối đa của một tin nhắn Telegram
+
+def lay_loai_update(cau_hinh) -> list:
+    """Các loại update bot cần nhận (allowed_updates), Telegram sẽ không gửi các loại khác"""
+    loai = ["message", "edited_message", "my_chat_member"]
+    if getattr(cau_hinh, "enable_inline", True):
+        loai.append("inline_query")
+    return loai
+
+def la_update_bo_qua(update: dict, bot_username: str = "") -> bool:
+    """
+    Kiểm tra nhanh (trước khi giao cho worker và ghi log) xem update có bị bỏ qua không:
+    tin nhắn group không phải lệnh, hoặc lệnh dành cho bot khác (/lenh@bot_khac)
+    """
+    message = update.get("message") or update.get("edited_message")
+    if message is None or message.get("chat", {}).get("type", "private") == "private":
+        return False
+    
+    text = message.get("text")
+    if not text or text[0] != "/":
+        return True
+    
+    if bot_username:
+        lenh = text.split(None, 1)[0]
+        if "@" in lenh and lenh.split("@", 1)[1].lower() != bot_username.lower():
+            return True
+    return False
 
 def phan_tich_lenh(text: str, bot_username: str = "") -> tuple:
     """
@@ -28,29 +66,107 @@ def phan_tich_lenh(text: str, bot_username: str = "") -> tuple:
     
     return command, args
 
+def do_giai_doan(bot, giai_doan: str):
+    """Đo thời gian một giai đoạn xử lý nếu bot có bộ đo (bot.bo_do)"""
+    bo_do = getattr(bot, "bo_do", None)
+    return bo_do.do(giai_doan) if bo_do is not None else nullcontext()
+
+def dem_su_kien(bot, ten: str, **nhan):
+    """Tăng bộ đếm có nhãn (theo lệnh, vùng, loại lỗi...) nếu bot có bộ đo"""
+    bo_do = getattr(bot, "bo_do", None)
+    if bo_do is not None:
+        bo_do.dem(ten, **nhan)
+
+def nhan_vung(region: str) -> str:
+    """Nhãn vùng cho số liệu - gộp các giá trị lạ để số nhãn không tăng vô hạn"""
+    return region if region.isalpha() and len(region) <= 4 else "other"
+
 def xac_thuc_uid(uid_str: str) -> str:
     """Xác thực và làm sạch UID đầu vào"""
     uid = uid_str.strip()
     return uid if uid.isdigit() else ""
 
-def lay_thong_tin_game_thu(uid: str, region: str = "SG") -> dict:
-    """Lấy thông tin game thủ từ API Free Fire"""
-    url = "https://free-fire-info-site-oe7p.vercel.app/player-info"
+def lay_thong_tin_game_thu(uid: str, region: str = "SG", ket_noi=None, url=URL_THONG_TIN_GAME_THU) -> dict:
+    """Lấy thông tin game thủ từ API Free Fire (qua client upstream dùng chung nếu có), url có thể là danh sách mirror"""
     params = {"region": region.upper(), "uid": uid.strip()}
+    cac_url = [url] if isinstance(url, str) else list(url)
+    
+    if ket_noi is not None:
+        return ket_noi.lay_json_nhieu_nguon(cac_url, params)
     
     try:
-        session = requests.Session()
-        session.headers.update({"User-Agent": "FreeFireInfoBot/2.0"})
-        
-        resp = session.get(url, params=params, timeout=10.0)
+        resp = requests.get(cac_url[0], params=params, timeout=10.0, headers={"User-Agent": "FreeFireInfoBot/2.0"})
         resp.raise_for_status()
         return resp.json()
     except Exception as e:
         print(f"Lỗi khi lấy thông tin: {str(e)}")
         return None
 
-def tao_tin_nhan_game_thu(data, timezone_converter) -> tuple:
-    """Tạo tin nhắn định dạng từ dữ liệu game thủ"""
+async def lay_thong_tin_game_thu_async(uid: str, region: str, ket_noi, url=URL_THONG_TIN_GAME_THU) -> dict:
+    """Phiên bản asyncio của lay_thong_tin_game_thu (ket_noi là KetNoiUpstreamAsync)"""
+    params = {"region": region.upper(), "uid": uid.strip()}
+    return await ket_noi.lay_json_nhieu_nguon([url] if isinstance(url, str) else list(url), params)
+
+def tra_cuu_game_thu(bot, uid: str, region: str) -> dict:
+    """Tra cứu thông tin game thủ qua cache của bot (nếu có)"""
+    ket_noi = getattr(bot, "ket_noi_upstream", None)
+    url = getattr(bot.cau_hinh, "player_info_urls", None) or getattr(bot.cau_hinh, "player_info_url", URL_THONG_TIN_GAME_THU)
+    bo_nho_dem = getattr(bot, "bo_nho_dem", None)
+    
+    def tai():
+        with do_giai_doan(bot, "upstream"):
+            return lay_thong_tin_game_thu(uid, region, ket_noi, url)
+    
+    if bo_nho_dem is None:
+        return tai()
+    return bo_nho_dem.lay_hoac_tai(uid, region, tai)
+
+def chon_vung(bot, uid: str) -> str:
+    """
+    Vùng tra cứu khi người dùng không nhập vùng: vùng đã biết của UID (chỉ mục uid→vùng),
+    chuỗi rỗng nếu cần dò tự động (AUTO_REGIONS), hoặc vùng mặc định
+    """
+    bo_nho_dem = getattr(bot, "bo_nho_dem", None)
+    region = bo_nho_dem.vung_cua(uid) if bo_nho_dem is not None else ""
+    if region:
+        return region
+    return "" if getattr(bot.cau_hinh, "auto_regions", None) else bot.cau_hinh.default_region.upper()
+
+def cac_vung_ung_vien(cau_hinh) -> list:
+    """Các vùng được dò tự động, vùng mặc định đứng đầu"""
+    return list(dict.fromkeys([cau_hinh.default_region.upper()] + list(getattr(cau_hinh, "auto_regions", []))))
+
+def co_thong_tin(data) -> bool:
+    """Dữ liệu tra cứu có thông tin game thủ (basicInfo) không"""
+    return bool(data) and bool(data.get("basicInfo"))
+
+def tra_cuu_tu_dong_vung(bot, uid: str) -> tuple:
+    """
+    Tra cứu đồng thời ở các vùng ứng viên, lấy basicInfo hợp lệ đầu tiên và hủy các yêu cầu
+    chưa chạy (yêu cầu đã gửi vẫn chạy nốt và được lưu vào cache). Trả về (dữ liệu, vùng)
+    """
+    cac_vung = cac_vung_ung_vien(bot.cau_hinh)
+    pool = getattr(bot, "bo_thuc_thi_vung", None)
+    if pool is None or len(cac_vung) == 1:
+        for region in cac_vung:
+            data = tra_cuu_game_thu(bot, uid, region)
+            if co_thong_tin(data):
+                return data, region
+        return None, cac_vung[0]
+    
+    futures = {pool.submit(tra_cuu_game_thu, bot, uid, region): region for region in cac_vung}
+    try:
+        for future in as_completed(futures):
+            data = future.result()
+            if co_thong_tin(data):
+                return data, futures[future]
+    finally:
+        for future in futures:
+            future.cancel()
+    return None, cac_vung[0]
+
+def tao_tin_nhan_game_thu(data, timezone_converter, gon: bool = False) -> tuple:
+    """Tạo tin nhắn định dạng từ dữ liệu game thủ (gon=True: dạng rút gọn cho tra cứu hàng loạt)"""
     if not data or not isinstance(data, dict):
         return "❌ Không có dữ liệu hợp lệ", ""
         
@@ -70,6 +186,13 @@ def tao_tin_nhan_game_thu(data, timezone_converter) -> tuple:
     create_at_vn = timezone_converter(create_at)
     last_login_vn = timezone_converter(last_login_at)
     
+    if gon:
+        msg = (
+            f"👤 <b>{nickname}</b> · <code>{uid}</code>\n"
+            f"🎮 Lv {level} · ❤️ {liked} · 🏆 {rank} · ⏰ {last_login_vn}"
+        )
+        return msg, uid
+    
     msg = (
         "<b>🔥 THÔNG TIN GAME THỦ FREE FIRE</b>\n\n"
         f"<b>👤 Nickname:</b> {nickname}\n"
@@ -83,84 +206,96 @@ def tao_tin_nhan_game_thu(data, timezone_converter) -> tuple:
     
     return msg, uid
 
-def xu_ly_lenh_ff(bot, chat_id: int, chat_type: str, args: list, reply_id: int, user_id: int, username: str = ""):
-    """Xử lý lệnh /ff để lấy thông tin game thủ - tích hợp hướng dẫn khi cần"""
-    # Nếu không có đối số, hiển thị hướng dẫn sử dụng
-    if len(args) < 1:
-        if getattr(bot, 'la_tin_nhan_rieng', lambda x: x == "private")(chat_type):
-            huong_dan = (
-                "<b>🔥 HƯỚNG DẪN SỬ DỤNG BOT</b>\n\n"
-                "📝 <b>Cách tra cứu thông tin game thủ:</b>\n"
-                "<code>/ff &lt;uid&gt; [vùng]</code>\n\n"
-                "<b>• &lt;uid&gt;:</b> ID game thủ Free Fire (bắt buộc)\n"
-                "<b>• [vùng]:</b> Mã vùng (tùy chọn, mặc định là SG)\n\n"
-                "<b>🌏 Các vùng hỗ trợ:</b>\n"
-                "SG (Singapore), VN (Việt Nam), ID (Indonesia), TH (Thái Lan),...\n\n"
-                "<b>💡 Ví dụ:</b>\n"
-                "/ff 5498571579\n"
-                "/ff 5498571579 VN\n\n"
-                "<i>⚠️ Lưu ý: UID phải chỉ chứa chữ số</i>"
-            )
-        else:
-            huong_dan = (
-                "<b>🔥 HƯỚNG DẪN SỬ DỤNG</b>\n\n"
-                "📝 <b>Cách tra cứu trong group:</b>\n"
-                "<code>/ff &lt;uid&gt; [vùng]</code>\n\n"
-                "<b>Ví dụ:</b>\n"
-                "/ff 5498571579\n"
-                "/ff@chuong2k8_bot 5498571579 VN\n\n"
-                "<i>💡 Để trải nghiệm đầy đủ, hãy nhắn tin riêng với bot!</i>"
-            )
-        bot.gui_tin_nhan(chat_id, huong_dan, reply_id)
-        return
-    
-    uid = xac_thuc_uid(args[0])
-    region = args[1].upper() if len(args) > 1 else bot.cau_hinh.default_region
-    
-    if not uid:
-        error_msg = (
-            "❌ <b>UID không hợp lệ</b>\n\n"
-            "UID phải chỉ chứa chữ số.\n"
-            "Vui lòng kiểm tra lại và thử lại.\n\n"
-            "<b>Ví dụ đúng:</b> /ff 5498571579"
-        )
-        bot.gui_tin_nhan(chat_id, error_msg, reply_id)
-        return
-    
-    # Hiển thị thông báo đang xử lý trong tin nhắn riêng
-    if getattr(bot, 'la_tin_nhan_rieng', lambda x: x == "private")(chat_type):
-        bot.gui_tin_nhan(chat_id, "🔍 <b>Đang tra cứu thông tin...</b>", reply_id)
+# ===== NỘI DUNG TIN NHẮN =====
+TIN_UID_KHONG_HOP_LE = (
+    "❌ <b>UID không hợp lệ</b>\n\n"
+    "UID phải chỉ chứa chữ số.\n"
+    "Vui lòng kiểm tra lại và thử lại.\n\n"
+    "<b>Ví dụ đúng:</b> /ff 5498571579"
+)
+
+TIN_DANG_TRA_CUU = "🔍 <b>Đang tra cứu thông tin...</b>"
+
+TIN_KHONG_TIM_THAY = (
+    "❌ <b>Không tìm thấy thông tin game thủ</b>\n\n"
+    "Vui lòng kiểm tra:\n"
+    "• UID có chính xác không\n"
+    "• Vùng có đúng không (SG, VN, ID...)\n\n"
+    "<b>Ví dụ:</b> /ff 5498571579 VN"
+)
+
+TIN_KHONG_CO_QUYEN = "❌ Bạn không có quyền sử dụng lệnh này!"
+
+# Thông báo khi yêu cầu tra cứu bị từ chối (chỉ gửi một lần trong mỗi khoảng thời gian)
+TIN_TU_CHOI = {
+    GIOI_HAN_USER: "⏳ Bạn tra cứu quá nhanh, vui lòng thử lại sau ít phút.",
+    GIOI_HAN_CHAT: "⏳ Group đang tra cứu quá nhiều, vui lòng thử lại sau ít phút.",
+    QUA_TAI: "🚦 Bot đang quá tải, vui lòng thử lại sau ít phút.",
+}
+
+TIN_HUONG_DAN_CHUNG = (
+    "❓ <b>Tôi chỉ hỗ trợ tra cứu thông tin Free Fire</b>\n\n"
+    "📝 <b>Cách sử dụng:</b>\n"
+    "<code>/ff &lt;uid&gt; [vùng]</code>\n\n"
+    "<b>Ví dụ:</b>\n"
+    "/ff 5498571579\n"
+    "/ff 5498571579 VN\n\n"
+    "<i>UID là dãy số ID game thủ bạn muốn tra cứu</i>"
+)
+
+def kiem_soat_tra_cuu(bot, chat_id: int, user_id: int, command: str, args: list) -> tuple:
+    """
+    Kiểm tra giới hạn tốc độ/trùng lặp/quá tải trước khi tra cứu.
+    Trả về (được phép, nội dung thông báo hoặc None nếu không cần trả lời)
+    """
+    kiem_soat = getattr(bot, "kiem_soat", None)
+    if kiem_soat is None or user_id in bot.cau_hinh.admin_ids:
+        return True, None
     
-    data = lay_thong_tin_game_thu(uid, region)
+    so_viec_dang_cho = getattr(bot, "so_viec_dang_cho", lambda: 0)()
+    ket_qua = kiem_soat.kiem_tra(user_id, chat_id, f"{command} {' '.join(args).upper()}", so_viec_dang_cho)
+    if ket_qua == CHO_PHEP:
+        return True, None
     
-    if not data:
-        error_msg = (
-            "❌ <b>Không tìm thấy thông tin game thủ</b>\n\n"
-            "Vui lòng kiểm tra:\n"
-            "• UID có chính xác không\n"
-            "• Vùng có đúng không (SG, VN, ID...)\n\n"
-            "<b>Ví dụ:</b> /ff 5498571579 VN"
+    dem_su_kien(bot, "admission_rejected", reason=ket_qua)
+    return False, TIN_TU_CHOI.get(ket_qua) if kiem_soat.nen_thong_bao(ket_qua, user_id, chat_id) else None
+
+def la_tin_nhan_rieng(bot, chat_type: str) -> bool:
+    """Kiểm tra tin nhắn riêng qua bot nếu bot hỗ trợ"""
+    return getattr(bot, 'la_tin_nhan_rieng', lambda x: x == "private")(chat_type)
+
+def tao_huong_dan_ff(la_rieng: bool) -> str:
+    """Tạo hướng dẫn sử dụng lệnh /ff"""
+    if la_rieng:
+        return (
+            "<b>🔥 HƯỚNG DẪN SỬ DỤNG BOT</b>\n\n"
+            "📝 <b>Cách tra cứu thông tin game thủ:</b>\n"
+            "<code>/ff &lt;uid&gt; [vùng]</code>\n\n"
+            "<b>• &lt;uid&gt;:</b> ID game thủ Free Fire (bắt buộc)\n"
+            "<b>• [vùng]:</b> Mã vùng (tùy chọn, bỏ trống để dùng vùng đã biết của UID hoặc vùng mặc định)\n\n"
+            "<b>🌏 Các vùng hỗ trợ:</b>\n"
+            "SG (Singapore), VN (Việt Nam), ID (Indonesia), TH (Thái Lan),...\n\n"
+            "<b>💡 Ví dụ:</b>\n"
+            "/ff 5498571579\n"
+            "/ff 5498571579 VN\n\n"
+            "<b>📋 Tra cứu nhiều UID cùng lúc:</b>\n"
+            "/ff 5498571579 1234567890 2345678901 VN\n\n"
+            "<i>⚠️ Lưu ý: UID phải chỉ chứa chữ số</i>"
         )
-        bot.gui_tin_nhan(chat_id, error_msg, reply_id)
-        return
-    
-    msg, player_uid = tao_tin_nhan_game_thu(data, bot.doi_thoi_gian)
-    
-    # Thêm thông tin người dùng trong group chat
-    if chat_type != "private":
-        user_info = f"@{username}" if username else f"Người dùng ID {user_id}"
-        msg = f"<i>Yêu cầu từ {user_info}:</i>\n\n{msg}"
-    
-    # Gửi kết quả
-    if bot.cau_hinh.enable_photos:
-        bot.gui_anh_dai_dien(chat_id, player_uid, msg, reply_id)
-    else:
-        bot.gui_tin_nhan(chat_id, msg, reply_id)
+    return (
+        "<b>🔥 HƯỚNG DẪN SỬ DỤNG</b>\n\n"
+        "📝 <b>Cách tra cứu trong group:</b>\n"
+        "<code>/ff &lt;uid&gt; [vùng]</code>\n\n"
+        "<b>Ví dụ:</b>\n"
+        "/ff 5498571579\n"
+        "/ff@chuong2k8_bot 5498571579 VN\n\n"
+        "<i>💡 Để trải nghiệm đầy đủ, hãy nhắn tin riêng với bot!</i>"
+    )
 
-def xu_ly_lenh_start(bot, chat_id: int, chat_type: str):
-    """Xử lý lệnh /start - giới thiệu bot và hướng dẫn sử dụng"""
-    if getattr(bot, 'la_tin_nhan_rieng', lambda x: x == "private")(chat_type):
-        welcome = (
+def tao_tin_chao_mung(la_rieng: bool) -> str:
+    """Tạo tin nhắn chào mừng cho lệnh /start"""
+    if la_rieng:
+        return (
             "<b>🎉 Chào mừng đến với Bot Tra Cứu Free Fire!</b>\n\n"
             "✨ <b>Tính năng chính:</b>\n"
             "• Tra cứu thông tin game thủ nhanh chóng\n"
@@ -173,24 +308,28 @@ def xu_ly_lenh_start(bot, chat_id: int, chat_type: str):
             "/ff 5498571579 VN\n\n"
             "<i>💡 UID là dãy số bạn thấy trong game khi vào profile của người chơi</i>"
         )
-    else:
-        welcome = (
-            "<b>🎉 Xin chào group!</b>\n\n"
-            "Tôi là bot tra cứu thông tin Free Fire.\n\n"
-            "📝 <b>Cách sử dụng:</b>\n"
-            "/ff &lt;uid&gt; - Tra cứu thông tin game thủ\n\n"
-            "<b>Ví dụ:</b> /ff 5498571579\n\n"
-            "<i>💡 Nhắn tin riêng với bot để được hỗ trợ đầy đủ hơn!</i>"
-        )
-    
-    bot.gui_tin_nhan(chat_id, welcome)
+    return (
+        "<b>🎉 Xin chào group!</b>\n\n"
+        "Tôi là bot tra cứu thông tin Free Fire.\n\n"
+        "📝 <b>Cách sử dụng:</b>\n"
+        "/ff &lt;uid&gt; - Tra cứu thông tin game thủ\n\n"
+        "<b>Ví dụ:</b> /ff 5498571579\n\n"
+        "<i>💡 Nhắn tin riêng với bot để được hỗ trợ đầy đủ hơn!</i>"
+    )
 
-def xu_ly_lenh_status(bot, chat_id: int, user_id: int):
-    """Xử lý lệnh /status (chỉ admin)"""
-    if user_id not in bot.cau_hinh.admin_ids:
-        bot.gui_tin_nhan(chat_id, "❌ Bạn không có quyền sử dụng lệnh này!")
-        return
+def tao_ket_qua_ff(bot, data: dict, chat_type: str, user_id: int, username: str = "") -> tuple:
+    """Tạo tin nhắn kết quả /ff, thêm người yêu cầu khi ở trong group"""
+    msg, player_uid = tao_tin_nhan_game_thu(data, bot.doi_thoi_gian)
+    
+    # Thêm thông tin người dùng trong group chat
+    if chat_type != "private":
+        user_info = f"@{username}" if username else f"Người dùng ID {user_id}"
+        msg = f"<i>Yêu cầu từ {user_info}:</i>\n\n{msg}"
     
+    return msg, player_uid
+
+def tao_tin_trang_thai(bot) -> str:
+    """Tạo nội dung lệnh /status"""
     uptime = time.time() - bot.start_time
     days, remainder = divmod(uptime, 86400)
     hours, remainder = divmod(remainder, 3600)
@@ -204,13 +343,316 @@ def xu_ly_lenh_status(bot, chat_id: int, user_id: int):
         f"🤖 <b>Bot ID:</b> {bot.bot_id}\n"
         f"🌍 <b>Múi giờ:</b> UTC{bot.cau_hinh.timezone_offset:+d} (Việt Nam)"
     )
-    bot.gui_tin_nhan(chat_id, status)
+    
+    bo_nho_dem = getattr(bot, "bo_nho_dem", None)
+    if bo_nho_dem is not None:
+        tk = bo_nho_dem.thong_ke
+        tong = tk["hit"] + tk["hit_db"] + tk["miss"]
+        ti_le = (tk["hit"] + tk["hit_db"]) / tong * 100 if tong else 0.0
+        status += (
+            f"\n🗃 <b>Cache:</b> {tk['hit']} hit, {tk['hit_db']} hit (SQLite), {tk['miss']} miss "
+            f"({ti_le:.1f}% hit), {tk['gop']} yêu cầu gộp, {len(bo_nho_dem)} mục"
+        )
+    
+    bo_lap_lich = getattr(bot, "bo_lap_lich", None)
+    if bo_lap_lich is not None:
+        tk = bo_lap_lich.thong_ke_cho()
+        status += (
+            f"\n📤 <b>Hàng đợi gửi:</b> {tk['do_sau']} đang chờ, chờ TB {tk['cho_trung_binh'] * 1000:.0f}ms, "
+            f"tối đa {tk['cho_toi_da'] * 1000:.0f}ms, {tk['da_gui']} đã gửi, {tk['lan_429']} lần 429"
+        )
+    
+    kiem_soat = getattr(bot, "kiem_soat", None)
+    if kiem_soat is not None:
+        tk = kiem_soat.thong_ke
+        status += (
+            f"\n🛡 <b>Kiểm soát tra cứu:</b> {tk['cho_phep']} cho phép, {tk['gioi_han_user']} vượt giới hạn người dùng, "
+            f"{tk['gioi_han_chat']} vượt giới hạn group, {tk['trung_lap']} trùng lặp, {tk['qua_tai']} từ chối do quá tải "
+            f"({getattr(bot, 'so_viec_dang_cho', lambda: 0)()} việc tồn đọng)"
+        )
+    
+    ket_noi = getattr(bot, "ket_noi_upstream", None)
+    cac_nguon = ket_noi.tinh_trang_nguon() if hasattr(ket_noi, "tinh_trang_nguon") else []
+    if cac_nguon:
+        chi_tiet = ", ".join(
+            f"{html.escape(urlparse(url).netloc or url)} "
+            + ("🔌 đang ngắt" if dang_mo else f"{do_tre * 1000:.0f}ms" if do_tre is not None else "chưa dùng")
+            for url, do_tre, dang_mo in cac_nguon
+        )
+        bo_do = getattr(bot, "bo_do", None)
+        so_hedge = sum(bo_do.tom_tat_bo_dem("upstream_hedges").values()) if bo_do is not None else 0
+        status += f"\n🌐 <b>Upstream:</b> {chi_tiet} ({so_hedge} yêu cầu hedge)"
+    
+    so_bi_bo = so_log_bi_bo()
+    if so_bi_bo:
+        status += f"\n🧾 <b>Log:</b> {so_bi_bo} dòng bị bỏ do hàng đợi log đầy"
+    
+    bo_do = getattr(bot, "bo_do", None)
+    if bo_do is not None:
+        giai_doan = bo_do.tom_tat_giai_doan()
+        if giai_doan:
+            status += "\n\n<b>⏱ Độ trễ theo giai đoạn (p50 / p99):</b>"
+            for ten, (so_lan, p50, p99) in giai_doan.items():
+                status += f"\n• {html.escape(ten)}: {p50 * 1000:.1f}ms / {p99 * 1000:.1f}ms ({so_lan} lần)"
+        for ten, tieu_de in (("commands", "📨 Lệnh"), ("regions", "🌏 Vùng"), ("errors", "⚠️ Lỗi")):
+            bo_dem = bo_do.tom_tat_bo_dem(ten)
+            if bo_dem:
+                chi_tiet = ", ".join(f"{html.escape(k)}={v}" for k, v in sorted(bo_dem.items(), key=lambda x: -x[1]))
+                status += f"\n{tieu_de}: {chi_tiet}"
+    return status
 
-def xu_ly_tin_nhan(bot, update: dict):
-    """Xử lý tin nhắn/update nhận được - chỉ tập trung vào lệnh /ff"""
+# ===== TRA CỨU HÀNG LOẠT =====
+def tach_danh_sach_uid(args: list, default_region: str) -> tuple:
+    """
+    Tách danh sách UID (cách nhau bởi dấu cách, dấu phẩy hoặc xuống dòng)
+    và mã vùng tùy chọn ở cuối. Trả về (uid hợp lệ, đối số không hợp lệ, vùng)
+    """
+    tokens = [t for arg in args for t in arg.replace(",", " ").replace(";", " ").split()]
+    region = default_region.upper()
+    if len(tokens) > 1 and tokens[-1].isalpha():
+        region = tokens.pop().upper()
+    
+    uids, khong_hop_le = [], []
+    for token in tokens:
+        uid = xac_thuc_uid(token)
+        if uid:
+            uids.append(uid)
+        else:
+            khong_hop_le.append(token)
+    return list(dict.fromkeys(uids)), khong_hop_le, region
+
+def la_lenh_hang_loat(args: list) -> bool:
+    """/ff có từ hai UID trở lên"""
+    uids, _, _ = tach_danh_sach_uid(args, "")
+    return len(uids) > 1
+
+def tra_cuu_nhieu_game_thu(bot, uids: list, region: str) -> list:
+    """Tra cứu đồng thời nhiều UID qua pool của bot, trả về [(uid, data)] theo đúng thứ tự"""
+    pool = getattr(bot, "bo_thuc_thi_tra_cuu", None)
+    if pool is None:
+        return [(uid, tra_cuu_game_thu(bot, uid, region)) for uid in uids]
+    
+    futures = [pool.submit(tra_cuu_game_thu, bot, uid, region) for uid in uids]
+    return [(uid, future.result()) for uid, future in zip(uids, futures)]
+
+def do_dai_tin_nhan(text: str) -> int:
+    """Độ dài theo cách Telegram đếm (UTF-16), tính cả thẻ HTML nên luôn dư an toàn"""
+    return len(text.encode("utf-16-le")) // 2
+
+def chia_tin_nhan(khoi: list, gioi_han: int = GIOI_HAN_TIN_NHAN) -> list:
+    """Ghép các khối nội dung thành ít tin nhắn nhất, mỗi tin nhắn không vượt quá giới hạn"""
+    tin_nhan, hien_tai = [], ""
+    for phan in khoi:
+        ung_vien = f"{hien_tai}\n\n{phan}" if hien_tai else phan
+        if hien_tai and do_dai_tin_nhan(ung_vien) > gioi_han:
+            tin_nhan.append(hien_tai)
+            hien_tai = phan
+        else:
+            hien_tai = ung_vien
+    if hien_tai:
+        tin_nhan.append(hien_tai)
+    return tin_nhan
+
+def tao_ket_qua_hang_loat(bot, ket_qua: list, khong_hop_le: list, region: str, so_bo_qua: int,
+                          chat_type: str, user_id: int, username: str = "") -> list:
+    """Tạo các tin nhắn kết quả tra cứu hàng loạt, gộp gọn và chia theo giới hạn 4096 ký tự"""
+    so_tim_thay = sum(1 for _, data in ket_qua if co_thong_tin(data))
+    dau = f"<b>🔥 KẾT QUẢ TRA CỨU {so_tim_thay}/{len(ket_qua)} GAME THỦ ({region})</b>"
+    if chat_type != "private":
+        user_info = f"@{username}" if username else f"Người dùng ID {user_id}"
+        dau = f"<i>Yêu cầu từ {user_info}:</i>\n\n{dau}"
+    
+    khoi = [dau]
+    for uid, data in ket_qua:
+        if co_thong_tin(data):
+            khoi.append(tao_tin_nhan_game_thu(data, bot.doi_thoi_gian, gon=True)[0])
+        else:
+            khoi.append(f"❌ <code>{uid}</code>: không tìm thấy")
+    
+    if khong_hop_le:
+        khoi.append("⚠️ Bỏ qua UID không hợp lệ: " + ", ".join(html.escape(x) for x in khong_hop_le))
+    if so_bo_qua:
+        khoi.append(f"⚠️ Chỉ tra cứu {len(ket_qua)} UID đầu tiên, bỏ qua {so_bo_qua} UID")
+    
+    return chia_tin_nhan(khoi)
+
+def tao_tra_loi_ff(bot, ke_hoach: dict, data: dict, region: str) -> tuple:
+    """Nội dung trả lời /ff sau khi tra cứu xong: (tin nhắn, UID game thủ để gửi kèm ảnh hoặc rỗng)"""
+    dem_su_kien(bot, "regions", region=nhan_vung(region))
+    if not data:
+        dem_su_kien(bot, "errors", kind="not_found")
+        return TIN_KHONG_TIM_THAY, ""
+    
+    with do_giai_doan(bot, "render"):
+        return tao_ket_qua_ff(bot, data, ke_hoach["chat_type"], ke_hoach["user_id"], ke_hoach["username"])
+
+def tao_tra_loi_hang_loat(bot, ke_hoach: dict, ket_qua: list) -> list:
+    """Các tin nhắn trả lời tra cứu hàng loạt: phần đầu thay vào placeholder, các phần sau gửi thành tin mới"""
+    with do_giai_doan(bot, "render"):
+        return tao_ket_qua_hang_loat(bot, ket_qua, ke_hoach["khong_hop_le"], ke_hoach["region"],
+                                     ke_hoach["so_bo_qua"], ke_hoach["chat_type"], ke_hoach["user_id"],
+                                     ke_hoach["username"])
+
+def kieu_bao_dang_tra_cuu(bot, chat_type: str, co_anh: bool = False):
+    """
+    Cách báo đang tra cứu: None nếu gửi placeholder (tin nhắn riêng có kết quả dạng văn bản, để sửa thành
+    kết quả sau), còn lại là hành động sendChatAction vì Telegram không cho sửa tin nhắn văn bản thành ảnh
+    """
+    if la_tin_nhan_rieng(bot, chat_type) and not co_anh:
+        return None
+    return "upload_photo" if co_anh else "typing"
+
+def gui_kem_anh(bot, uid: str) -> bool:
+    """Kết quả có gửi kèm ảnh đại diện không (khi đó không sửa placeholder mà gửi tin mới)"""
+    return bool(uid) and bot.cau_hinh.enable_photos
+
+def bao_dang_tra_cuu(bot, chat_id: int, chat_type: str, reply_id: int, text: str, co_anh: bool = False):
+    """Báo cho người dùng biết bot đang tra cứu, trả về Future chứa tin nhắn placeholder hoặc None"""
+    hanh_dong = kieu_bao_dang_tra_cuu(bot, chat_type, co_anh)
+    if hanh_dong is None:
+        return bot.gui_tin_nhan(chat_id, text, reply_id)
+    gui_hanh_dong = getattr(bot, "gui_hanh_dong", None)
+    if gui_hanh_dong is not None:
+        gui_hanh_dong(chat_id, hanh_dong)
+    return None
+
+def _ket_qua_gui(future: Future):
+    """Tin nhắn trong Future gửi đã xong, None nếu gửi thất bại"""
+    return None if future.cancelled() or future.exception() is not None else future.result()
+
+def tra_loi_ket_qua(bot, chat_id: int, reply_id: int, placeholder, text: str, uid: str = "") -> Future:
+    """
+    Gửi kết quả: sửa placeholder (Future từ bao_dang_tra_cuu, nếu có) thành kết quả, không sửa được
+    thì gửi tin nhắn mới và xóa placeholder. uid khác rỗng: gửi kèm ảnh đại diện khi ENABLE_PHOTOS bật.
+    Các bước được nối vào Future nên worker không phải chờ placeholder được gửi xong.
+    """
+    co_anh = gui_kem_anh(bot, uid)
+    
+    def gui_moi():
+        if co_anh:
+            return bot.gui_anh_dai_dien(chat_id, uid, text, reply_id)
+        return bot.gui_tin_nhan(chat_id, text, reply_id, uu_tien=UU_TIEN_KET_QUA)
+    
+    if placeholder is None:
+        return gui_moi()
+    
+    def sau_placeholder(future: Future):
+        message_id = (_ket_qua_gui(future) or {}).get("message_id")
+        if not message_id:
+            return gui_moi()
+    
+        def gui_moi_va_xoa(_=None):
+            def xoa_placeholder(da_gui: Future):
+                bot.xoa_tin_nhan(chat_id, message_id)
+                return _ket_qua_gui(da_gui)
+            return noi_tiep(gui_moi(), xoa_placeholder)
+    
+        if co_anh:
+            return gui_moi_va_xoa()
+        return noi_tiep(
+            bot.sua_tin_nhan(chat_id, message_id, text),
+            lambda da_sua: _ket_qua_gui(da_sua) if _ket_qua_gui(da_sua) is not None else gui_moi_va_xoa()
+        )
+    
+    return noi_tiep(placeholder, sau_placeholder)
+
+# ===== QUYẾT ĐỊNH XỬ LÝ (DÙNG CHUNG CHO CÁC ENGINE) =====
+# Các hàm quyet_dinh_* chỉ phân tích và chọn nội dung trả lời, không gọi Telegram hay upstream.
+# Kết quả là (loại hành động, tham số) hoặc None; engine đa luồng (thuc_hien) và engine asyncio
+# (FreeFireBotAsync.thuc_hien_async) chỉ lo phần gửi/nhận tương ứng.
+TRA_LOI = "tra_loi"  # (chat_id, nội dung, reply_id): gửi một tin nhắn văn bản
+TRA_CUU = "tra_cuu"  # kế hoạch tra cứu một UID (dict, xem quyet_dinh_ff)
+TRA_CUU_HANG_LOAT = "tra_cuu_hang_loat"  # kế hoạch tra cứu nhiều UID (dict, xem quyet_dinh_ff_hang_loat)
+TRA_LOI_INLINE = "tra_loi_inline"  # (query_id, kết quả, cache_time): trả lời inline query ngay
+TRA_CUU_INLINE = "tra_cuu_inline"  # (query_id, user_id, uid, vùng): tra cứu sau debounce rồi trả lời
+
+def quyet_dinh_ff(bot, chat_id: int, chat_type: str, args: list, reply_id: int, user_id: int, username: str = ""):
+    """Quyết định cho lệnh /ff: hướng dẫn, báo UID sai, chuyển sang tra cứu hàng loạt hoặc tra cứu một UID"""
+    # Nếu không có đối số, hiển thị hướng dẫn sử dụng
+    if len(args) < 1:
+        return TRA_LOI, (chat_id, tao_huong_dan_ff(la_tin_nhan_rieng(bot, chat_type)), reply_id)
+    
+    if la_lenh_hang_loat(args):
+        return quyet_dinh_ff_hang_loat(bot, chat_id, chat_type, args, reply_id, user_id, username)
+    
+    uid = xac_thuc_uid(args[0])
+    if not uid:
+        return TRA_LOI, (chat_id, TIN_UID_KHONG_HOP_LE, reply_id)
+    
+    region = args[1].upper() if len(args) > 1 else chon_vung(bot, uid)
+    
+    # Có sẵn trong cache thì trả lời ngay, không cần báo đang tra cứu
+    bo_nho_dem = getattr(bot, "bo_nho_dem", None)
+    co_trong_cache, data = bo_nho_dem.xem(uid, region) if bo_nho_dem is not None and region else (False, None)
+    return TRA_CUU, {
+        "chat_id": chat_id, "chat_type": chat_type, "reply_id": reply_id, "user_id": user_id, "username": username,
+        "uid": uid, "region": region,  # region rỗng: dò vùng tự động
+        "co_trong_cache": co_trong_cache, "data": data,
+    }
+
+def quyet_dinh_ff_hang_loat(bot, chat_id: int, chat_type: str, args: list, reply_id: int, user_id: int,
+                            username: str = ""):
+    """Quyết định cho /ff (hoặc /ffbatch) với nhiều UID: danh sách UID, vùng và nội dung placeholder"""
+    if len(args) < 1:
+        return TRA_LOI, (chat_id, tao_huong_dan_ff(la_tin_nhan_rieng(bot, chat_type)), reply_id)
+    
+    uids, khong_hop_le, region = tach_danh_sach_uid(args, bot.cau_hinh.default_region)
+    if not uids:
+        return TRA_LOI, (chat_id, TIN_UID_KHONG_HOP_LE, reply_id)
+    
+    so_bo_qua = max(0, len(uids) - bot.cau_hinh.batch_max_uids)
+    uids = uids[:bot.cau_hinh.batch_max_uids]
+    dem_su_kien(bot, "regions", region=nhan_vung(region))
+    return TRA_CUU_HANG_LOAT, {
+        "chat_id": chat_id, "chat_type": chat_type, "reply_id": reply_id, "user_id": user_id, "username": username,
+        "uids": uids, "khong_hop_le": khong_hop_le, "region": region, "so_bo_qua": so_bo_qua,
+        "tin_cho": f"🔍 <b>Đang tra cứu {len(uids)} UID...</b>",
+    }
+
+def quyet_dinh_start(bot, chat_id: int, chat_type: str, *_):
+    """Lệnh /start - giới thiệu bot và hướng dẫn sử dụng"""
+    return TRA_LOI, (chat_id, tao_tin_chao_mung(la_tin_nhan_rieng(bot, chat_type)), None)
+
+def quyet_dinh_status(bot, chat_id: int, chat_type: str, args: list, msg_id: int, user_id: int, username: str = ""):
+    """Lệnh /status (chỉ admin)"""
+    if user_id not in bot.cau_hinh.admin_ids:
+        return TRA_LOI, (chat_id, TIN_KHONG_CO_QUYEN, None)
+    return TRA_LOI, (chat_id, tao_tin_trang_thai(bot), None)
+
+def quyet_dinh_inline(bot, inline_query: dict):
+    """Inline query dạng "@bot <uid> [vùng]": trả lời ngay từ cache, nếu chưa có thì tra cứu sau debounce"""
+    query_id = inline_query.get("id")
+    user_id = inline_query.get("from", {}).get("id")
+    parts = inline_query.get("query", "").split()
+    
+    uid = xac_thuc_uid(parts[0]) if parts else ""
+    if not uid:
+        return TRA_LOI_INLINE, (query_id, [], bot.cau_hinh.inline_cache_time)
+    region = parts[1].upper() if len(parts) > 1 else (chon_vung(bot, uid) or bot.cau_hinh.default_region.upper())
+    
+    bo_nho_dem = getattr(bot, "bo_nho_dem", None)
+    if bo_nho_dem is not None:
+        co_trong_cache, data = bo_nho_dem.xem(uid, region)
+        if co_trong_cache:
+            return TRA_LOI_INLINE, (query_id,) + tao_tra_loi_inline(bot, uid, region, data)
+    return TRA_CUU_INLINE, (query_id, user_id, uid, region)
+
+def quyet_dinh_update(bot, update: dict):
+    """Quyết định cho một update: cập nhật quyền, phân tích lệnh, kiểm soát tra cứu và chọn lệnh"""
+    member_update = update.get("my_chat_member")
+    if member_update:
+        xu_ly_thay_doi_thanh_vien(bot, member_update)
+        return None
+    
+    inline_query = update.get("inline_query")
+    if inline_query:
+        if getattr(bot.cau_hinh, "enable_inline", True):
+            return quyet_dinh_inline(bot, inline_query)
+        return None
+    
     message = update.get("message") or update.get("edited_message")
-    if not message:
-        return
+    if not message or la_update_bo_qua(update, bot.cau_hinh.bot_username):
+        return None
     
     chat = message.get("chat", {})
     chat_id = chat.get("id")
@@ -222,37 +664,173 @@ def xu_ly_tin_nhan(bot, update: dict):
     username = user.get("username", "")
     first_name = user.get("first_name", "")
     
-    # Log thông tin tin nhắn
-    chat_info = f"{'💬 Group' if chat_type != 'private' else '👤 Private'} (ID: {chat_id})"
-    user_info = f"{first_name} (@{username})" if username else first_name
-    bot.logger.info(f"📩 Nhận tin nhắn từ {user_info} (ID: {user_id}) trong {chat_info}: {text}")
+    # Log thông tin tin nhắn: chuỗi được định dạng trong luồng ghi log, nội dung tin nhắn chỉ ghi ở mức DEBUG
+    bot.logger.info("📩 Nhận tin nhắn từ %s (@%s, ID: %s) trong %s (ID: %s)", first_name, username, user_id,
+                "💬 Group" if chat_type != "private" else "👤 Private", chat_id)
+    bot.logger.debug("📝 Nội dung tin nhắn từ %s: %s", user_id, text)
     
     # Chỉ xử lý tin nhắn có text
     if not text:
-        return
+        return None
+    
+    with do_giai_doan(bot, "phan_tich"):
+        command, args = phan_tich_lenh(text, bot.cau_hinh.bot_username)
+    if command:
+        dem_su_kien(bot, "commands", command=command if command in BANG_LENH else "other")
     
-    command, args = phan_tich_lenh(text, bot.cau_hinh.bot_username)
+    if command in LENH_TRA_CUU and args:
+        cho_phep, thong_bao = kiem_soat_tra_cuu(bot, chat_id, user_id, command, args)
+        if not cho_phep:
+            return (TRA_LOI, (chat_id, thong_bao, msg_id)) if thong_bao else None
     
-    # Xử lý các lệnh
-    if command == "/ff":
-        xu_ly_lenh_ff(bot, chat_id, chat_type, args, msg_id, user_id, username)
-    elif command == "/start":
-        xu_ly_lenh_start(bot, chat_id, chat_type)
-    elif command == "/status":
-        xu_ly_lenh_status(bot, chat_id, user_id)
+    quyet_dinh = BANG_LENH.get(command)
+    if quyet_dinh is not None:
+        return quyet_dinh(bot, chat_id, chat_type, args, msg_id, user_id, username)
     # Không phản hồi các tin nhắn khác trong group để tránh spam
-    elif chat_type == "private":
+    if chat_type == "private":
         # Trong tin nhắn riêng, hiển thị hướng dẫn sử dụng lệnh /ff
-        huong_dan_chung = (
-            "❓ <b>Tôi chỉ hỗ trợ tra cứu thông tin Free Fire</b>\n\n"
-            "📝 <b>Cách sử dụng:</b>\n"
-            "<code>/ff &lt;uid&gt; [vùng]</code>\n\n"
-            "<b>Ví dụ:</b>\n"
-            "/ff 5498571579\n"
-            "/ff 5498571579 VN\n\n"
-            "<i>UID là dãy số ID game thủ bạn muốn tra cứu</i>"
-        )
-        bot.gui_tin_nhan(chat_id, huong_dan_chung, msg_id)
+        return TRA_LOI, (chat_id, TIN_HUONG_DAN_CHUNG, msg_id)
+    return None
+
+# ===== THỰC HIỆN (ENGINE ĐA LUỒNG) =====
+def _tra_cuu_va_tra_loi(bot, ke_hoach: dict):
+    """Tra cứu một UID theo kế hoạch từ quyet_dinh_ff rồi gửi kết quả"""
+    chat_id, reply_id = ke_hoach["chat_id"], ke_hoach["reply_id"]
+    data, region = ke_hoach["data"], ke_hoach["region"]
+    placeholder = None
+    if not ke_hoach["co_trong_cache"]:
+        placeholder = bao_dang_tra_cuu(bot, chat_id, ke_hoach["chat_type"], reply_id, TIN_DANG_TRA_CUU,
+                                       co_anh=bot.cau_hinh.enable_photos)
+        if region:
+            data = tra_cuu_game_thu(bot, ke_hoach["uid"], region)
+        else:
+            data, region = tra_cuu_tu_dong_vung(bot, ke_hoach["uid"])
+    
+    msg, player_uid = tao_tra_loi_ff(bot, ke_hoach, data, region)
+    tra_loi_ket_qua(bot, chat_id, reply_id, placeholder, msg, player_uid)
+
+def _tra_cuu_hang_loat_va_tra_loi(bot, ke_hoach: dict):
+    """Tra cứu đồng thời nhiều UID theo kế hoạch từ quyet_dinh_ff_hang_loat và gộp thành một phản hồi"""
+    chat_id, reply_id = ke_hoach["chat_id"], ke_hoach["reply_id"]
+    placeholder = bao_dang_tra_cuu(bot, chat_id, ke_hoach["chat_type"], reply_id, ke_hoach["tin_cho"])
+    
+    ket_qua = tra_cuu_nhieu_game_thu(bot, ke_hoach["uids"], ke_hoach["region"])
+    cac_tin = tao_tra_loi_hang_loat(bot, ke_hoach, ket_qua)
+    
+    # Phần đầu thay vào placeholder, các phần còn lại gửi thành tin nhắn mới sau khi phần đầu đã xong
+    def gui_phan_con_lai(_):
+        for tin in cac_tin[1:]:
+            bot.gui_tin_nhan(chat_id, tin, reply_id, uu_tien=UU_TIEN_KET_QUA)
+    
+    da_gui = tra_loi_ket_qua(bot, chat_id, reply_id, placeholder, cac_tin[0])
+    if len(cac_tin) > 1:
+        noi_tiep(da_gui, gui_phan_con_lai)
+
+def _tra_cuu_inline(bot, query_id: str, user_id: int, uid: str, region: str):
+    """Tra cứu cho inline query chưa có trong cache - chỉ tra cứu query cuối cùng của người dùng"""
+    # Mỗi lần gõ phím là một query mới
+    def tra_cuu_va_tra_loi():
+        tra_loi_inline_game_thu(bot, query_id, uid, region, tra_cuu_game_thu(bot, uid, region))
+    
+    bo_tri_hoan = getattr(bot, "bo_tri_hoan_inline", None)
+    if bo_tri_hoan is None:
+        tra_cuu_va_tra_loi()
+    else:
+        bo_tri_hoan.goi(user_id, tra_cuu_va_tra_loi)
+
+def thuc_hien(bot, hanh_dong):
+    """Thực hiện hành động từ quyet_dinh_* bằng API gửi của engine đa luồng"""
+    if hanh_dong is None:
+        return
+    loai, tham_so = hanh_dong
+    if loai == TRA_LOI:
+        bot.gui_tin_nhan(*tham_so)
+    elif loai == TRA_CUU:
+        _tra_cuu_va_tra_loi(bot, tham_so)
+    elif loai == TRA_CUU_HANG_LOAT:
+        _tra_cuu_hang_loat_va_tra_loi(bot, tham_so)
+    elif loai == TRA_LOI_INLINE:
+        bot.tra_loi_inline(*tham_so)
+    elif loai == TRA_CUU_INLINE:
+        _tra_cuu_inline(bot, *tham_so)
+
+# ===== XỬ LÝ LỆNH =====
+def xu_ly_lenh_ff(bot, chat_id: int, chat_type: str, args: list, reply_id: int, user_id: int, username: str = ""):
+    """Xử lý lệnh /ff để lấy thông tin game thủ - tích hợp hướng dẫn khi cần"""
+    thuc_hien(bot, quyet_dinh_ff(bot, chat_id, chat_type, args, reply_id, user_id, username))
+
+def xu_ly_lenh_ff_hang_loat(bot, chat_id: int, chat_type: str, args: list, reply_id: int, user_id: int,
+                            username: str = ""):
+    """Xử lý /ff (hoặc /ffbatch) với nhiều UID: tra cứu đồng thời và gộp thành một phản hồi"""
+    thuc_hien(bot, quyet_dinh_ff_hang_loat(bot, chat_id, chat_type, args, reply_id, user_id, username))
+
+def xu_ly_lenh_start(bot, chat_id: int, chat_type: str):
+    """Xử lý lệnh /start - giới thiệu bot và hướng dẫn sử dụng"""
+    thuc_hien(bot, quyet_dinh_start(bot, chat_id, chat_type))
+
+def xu_ly_lenh_status(bot, chat_id: int, user_id: int):
+    """Xử lý lệnh /status (chỉ admin)"""
+    thuc_hien(bot, quyet_dinh_status(bot, chat_id, "", [], None, user_id))
+
+# ===== INLINE QUERY =====
+def tao_ket_qua_inline(bot, uid: str, region: str, data: dict) -> list:
+    """Tạo danh sách InlineQueryResult cho một game thủ (rỗng nếu không tìm thấy)"""
+    if not co_thong_tin(data):
+        return []
+    
+    msg, player_uid = tao_tin_nhan_game_thu(data, bot.doi_thoi_gian)
+    basic = data["basicInfo"]
+    anh = f"https://profile.thug4ff.com/api/profile?uid={player_uid}"
+    return [{
+        "type": "article",
+        "id": f"{uid}-{region}",
+        "title": f"{basic.get('nickname', 'Không rõ')} ({region})",
+        "description": f"UID {player_uid} · Level {basic.get('level', '?')} · Rank {basic.get('rank', '?')}",
+        "thumbnail_url": anh,
+        "input_message_content": {
+            "message_text": msg,
+            "parse_mode": "HTML",
+            "disable_web_page_preview": True
+        }
+    }]
+
+def tao_tra_loi_inline(bot, uid: str, region: str, data: dict) -> tuple:
+    """(kết quả, cache_time) để trả lời inline query, cache_time ngắn khi không tìm thấy"""
+    ket_qua = tao_ket_qua_inline(bot, uid, region, data)
+    return ket_qua, bot.cau_hinh.inline_cache_time if ket_qua else int(bot.cau_hinh.cache_negative_ttl)
+
+def tra_loi_inline_game_thu(bot, query_id: str, uid: str, region: str, data: dict):
+    """Trả lời inline query bằng dữ liệu game thủ vừa tra cứu"""
+    bot.tra_loi_inline(query_id, *tao_tra_loi_inline(bot, uid, region, data))
+
+def xu_ly_inline_query(bot, inline_query: dict):
+    """Xử lý inline query dạng "@bot <uid> [vùng]": trả lời ngay từ cache, nếu chưa có thì tra cứu sau debounce"""
+    thuc_hien(bot, quyet_dinh_inline(bot, inline_query))
+
+def xu_ly_thay_doi_thanh_vien(bot, member_update: dict):
+    """Cập nhật cache quyền khi trạng thái của bot trong chat thay đổi"""
+    chat_id = member_update.get("chat", {}).get("id")
+    new_member = member_update.get("new_chat_member", {})
+    if chat_id is None or not hasattr(bot, "cap_nhat_quyen_chat"):
+        return
+    
+    bot.cap_nhat_quyen_chat(chat_id, new_member)
+    bot.logger.info("🔐 Trạng thái bot trong chat %s: %s", chat_id, new_member.get('status', ''))
+
+def xu_ly_tin_nhan(bot, update: dict):
+    """Xử lý tin nhắn/update nhận được - chỉ tập trung vào lệnh /ff"""
+    thuc_hien(bot, quyet_dinh_update(bot, update))
+
+# Các lệnh gọi API thông tin game thủ, đi qua kiểm soát truy cập
+LENH_TRA_CUU = ("/ff", "/ffbatch")
+
+# Bảng lệnh: lệnh -> hàm quyết định(bot, chat_id, chat_type, args, msg_id, user_id, username), dùng cho cả hai engine
+BANG_LENH = {
+    "/ff": quyet_dinh_ff,
+    "/ffbatch": quyet_dinh_ff_hang_loat,
+    "/start": quyet_dinh_start,
+    "/status": quyet_dinh_status,
+}
 
 def xu_ly_lenh(update: dict, bot):
     """Hàm điểm vào để xử lý lệnh"""
@@ -0,0 +1,106 @@
+"""
+Điều phối update tới nhóm worker - các update cùng chat luôn được xử lý theo thứ tự
+"""
+
+import queue
+import threading
+
+# Đánh dấu kết thúc hàng đợi của worker
+_KET_THUC = object()
+
+def lay_khoa_dinh_tuyen(update: dict) -> int:
+    """Lấy khóa định tuyến (chat_id, hoặc user_id với inline query) của update"""
+    for loai in ("message", "edited_message", "my_chat_member"):
+        obj = update.get(loai)
+        if obj:
+            return obj.get("chat", {}).get("id", 0)
+
+    inline_query = update.get("inline_query")
+    if inline_query:
+        return inline_query.get("from", {}).get("id", 0)
+    return 0
+
+class BoDieuPhoi:
+    """
+    Phân phối update cho N worker theo hash của chat_id.
+    Mỗi worker có hàng đợi riêng nên thứ tự trong cùng một chat được giữ nguyên,
+    còn các chat khác nhau được xử lý song song.
+    """
+    def __init__(self, xu_ly, so_worker: int, kich_thuoc_hang_doi: int, logger):
+        self.xu_ly = xu_ly
+        self.logger = logger
+        self.hang_doi = [queue.Queue(maxsize=kich_thuoc_hang_doi) for _ in range(so_worker)]
+        self.workers = [
+            threading.Thread(target=self._vong_lap_worker, args=(q,), name=f"ff-worker-{i}", daemon=True)
+            for i, q in enumerate(self.hang_doi)
+        ]
+
+    def bat_dau(self):
+        """Khởi chạy các worker"""
+        for worker in self.workers:
+            worker.start()
+        self.logger.info(f"👷 Đã khởi chạy {len(self.workers)} worker xử lý update")
+
+    def gui(self, update: dict):
+        """
+        Giao update cho worker phụ trách chat tương ứng.
+        Chặn lại khi hàng đợi của worker đầy (backpressure cho vòng lặp polling).
+        """
+        khoa = lay_khoa_dinh_tuyen(update)
+        self.hang_doi[hash(khoa) % len(self.hang_doi)].put(update)
+
+    def so_viec_dang_cho(self) -> int:
+        """Tổng số update đang chờ trong tất cả hàng đợi"""
+        return sum(q.qsize() for q in self.hang_doi)
+
+    def dung(self, timeout: float = 30.0):
+        """Dừng các worker sau khi xử lý hết các update đã nhận"""
+        for q in self.hang_doi:
+            q.put(_KET_THUC)
+        for worker in self.workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                self.logger.warning(f"⚠️ Worker {worker.name} chưa xử lý xong sau {timeout}s")
+
+    def _vong_lap_worker(self, q: queue.Queue):
+        while True:
+            update = q.get()
+            if update is _KET_THUC:
+                return
+            try:
+                self.xu_ly(update)
+            except Exception as e:
+                self.logger.exception(f"🔥 Lỗi khi xử lý update {update.get('update_id')}: {str(e)}")
+
+class BoTriHoan:
+    """
+    Trì hoãn (debounce) theo khóa: chỉ lần gọi cuối cùng trong khoảng do_tre giây được thực thi.
+    Dùng cho inline query, nơi Telegram gửi một query mới sau mỗi lần gõ phím.
+    """
+    def __init__(self, do_tre: float, thuc_thi=None):
+        self.do_tre = do_tre
+        self.thuc_thi = thuc_thi  # Ví dụ ThreadPoolExecutor.submit, mặc định chạy trong luồng hẹn giờ
+        self._hen_gio = {}
+        self._khoa = threading.Lock()
+
+    def goi(self, khoa, ham, *args):
+        """Hẹn gọi ham(*args), hủy lần hẹn trước đó của cùng khóa"""
+        with self._khoa:
+            cu = self._hen_gio.pop(khoa, None)
+            if cu is not None:
+                cu.cancel()
+            hen_gio = threading.Timer(self.do_tre, self._den_gio, (khoa, ham, args))
+            hen_gio.daemon = True
+            self._hen_gio[khoa] = hen_gio
+            hen_gio.start()
+
+    def _den_gio(self, khoa, ham, args):
+        with self._khoa:
+            # Bỏ qua nếu đã có lần hẹn mới hơn thay thế (hủy không kịp)
+            if self._hen_gio.get(khoa) is not threading.current_thread():
+                return
+            del self._hen_gio[khoa]
+        if self.thuc_thi is not None:
+            self.thuc_thi(ham, *args)
+        else:
+            ham(*args)
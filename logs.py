@@ -0,0 +1,140 @@
+"""
+Ghi log không chặn: bản ghi được đẩy vào hàng đợi và định dạng/ghi ra trong luồng nền,
+kèm lấy mẫu, giới hạn tốc độ cho từng dòng log nóng và tùy chọn xuất JSON mỗi dòng
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+
+from scheduler import BoDemToken
+
+DINH_DANG_VAN_BAN = '%(asctime)s [%(levelname)s] %(name)s: %(message)s'
+DINH_DANG_NGAY = '%Y-%m-%d %H:%M:%S'
+
+# ===== ĐỊNH DẠNG JSON =====
+class DinhDangJSON(logging.Formatter):
+    """Mỗi bản ghi thành một dòng JSON để đưa vào hệ thống thu thập log"""
+    def format(self, record: logging.LogRecord) -> str:
+        du_lieu = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage()
+        }
+        if record.exc_info:
+            du_lieu["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            du_lieu["exc"] = record.exc_text
+        return json.dumps(du_lieu, ensure_ascii=False)
+
+# ===== LẤY MẪU VÀ GIỚI HẠN TỐC ĐỘ =====
+class BoLocTanSuat(logging.Filter):
+    """Lấy mẫu DEBUG/INFO và giới hạn số dòng mỗi giây cho từng vị trí gọi log.
+
+    WARNING trở lên không bị lấy mẫu, ERROR trở lên luôn được giữ. Khi một vị trí log
+    bị chặn rồi được ghi lại, dòng đó kèm số bản ghi đã bỏ qua.
+    """
+    def __init__(self, toc_do: float, ti_le_mau: float):
+        super().__init__()
+        self.toc_do = toc_do
+        self.ti_le_mau = ti_le_mau
+        self._xo: dict = {}  # (pathname, lineno) -> [BoDemToken, số bản ghi đã bỏ]
+        self._khoa = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR:
+            return True
+        if record.levelno < logging.WARNING and self.ti_le_mau < 1.0 and random.random() >= self.ti_le_mau:
+            return False
+        if self.toc_do <= 0:
+            return True
+
+        khoa = (record.pathname, record.lineno)
+        with self._khoa:
+            o = self._xo.get(khoa)
+            if o is None:
+                o = self._xo[khoa] = [BoDemToken(self.toc_do, max(1.0, self.toc_do)), 0]
+        if not o[0].lay():
+            o[1] += 1
+            return False
+        if o[1]:
+            # Gắn số bản ghi bị bỏ vào chính dòng này, không tạo thêm dòng log mới
+            record.msg = f"{record.msg} (bỏ qua {o[1]} dòng tương tự)"
+            o[1] = 0
+        return True
+
+# ===== HÀNG ĐỢI LOG =====
+class XuLyHangDoi(logging.handlers.QueueHandler):
+    """Chỉ đẩy bản ghi vào hàng đợi, phần định dạng chuỗi để luồng nền làm.
+
+    Hàng đợi có giới hạn: khi đầy thì bỏ bản ghi thay vì chặn luồng đang xử lý update.
+    """
+    def __init__(self, hang_doi: queue.Queue):
+        super().__init__(hang_doi)
+        self.so_bi_bo = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Bản ghi được định dạng trong luồng nền nên chỉ cần chuyển exc_info thành chuỗi
+        # trước khi traceback bị giải phóng
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.so_bi_bo += 1
+
+_trinh_nghe = None
+_xu_ly_hang_doi = None
+_da_thiet_lap = False
+
+def thiet_lap_log(muc: str = "INFO", che_do: str = "queue", dinh_dang: str = "text",
+                  toc_do: float = 0.0, ti_le_mau: float = 1.0, kich_thuoc_hang_doi: int = 10000):
+    """Cấu hình logger gốc một lần cho cả process (gọi lại sẽ không làm gì)"""
+    global _trinh_nghe, _xu_ly_hang_doi, _da_thiet_lap
+    if _da_thiet_lap:
+        return
+    _da_thiet_lap = True
+    goc = logging.getLogger()
+
+    dau_ra = logging.StreamHandler(sys.stderr)
+    if dinh_dang == "json":
+        dau_ra.setFormatter(DinhDangJSON())
+    else:
+        dau_ra.setFormatter(logging.Formatter(DINH_DANG_VAN_BAN, DINH_DANG_NGAY))
+
+    bo_loc = BoLocTanSuat(toc_do, ti_le_mau)
+    if che_do == "queue":
+        _xu_ly_hang_doi = XuLyHangDoi(queue.Queue(max(1, kich_thuoc_hang_doi)))
+        # Lọc trước khi vào hàng đợi để dòng bị bỏ không tốn chỗ trong hàng đợi
+        _xu_ly_hang_doi.addFilter(bo_loc)
+        goc.addHandler(_xu_ly_hang_doi)
+        _trinh_nghe = logging.handlers.QueueListener(_xu_ly_hang_doi.queue, dau_ra, respect_handler_level=True)
+        _trinh_nghe.start()
+        atexit.register(dung_log)
+    else:
+        dau_ra.addFilter(bo_loc)
+        goc.addHandler(dau_ra)
+    goc.setLevel(getattr(logging, muc.upper(), logging.INFO))
+
+def so_log_bi_bo() -> int:
+    """Số bản ghi bị bỏ vì hàng đợi log đầy"""
+    return _xu_ly_hang_doi.so_bi_bo if _xu_ly_hang_doi else 0
+
+def dung_log():
+    """Ghi nốt các bản ghi còn trong hàng đợi rồi dừng luồng nền"""
+    global _trinh_nghe
+    if _trinh_nghe is not None:
+        _trinh_nghe.stop()
+        _trinh_nghe = None
@@ -0,0 +1,150 @@
+"""
+Đo độ trễ từng giai đoạn xử lý và đếm sự kiện - histogram trượt, xuất định dạng Prometheus
+"""
+
+import bisect
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Ngưỡng bucket (giây) của histogram, giống mặc định của thư viện Prometheus
+CAC_MOC = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class BieuDoTruot:
+    """
+    Histogram của một giai đoạn: bucket cố định cộng dồn từ lúc khởi động (cho Prometheus)
+    và cửa sổ các mẫu gần nhất để tính p50/p99 hiện tại
+    """
+    def __init__(self, so_mau: int = 1024):
+        self.dem_bucket = [0] * (len(CAC_MOC) + 1)
+        self.tong = 0.0
+        self.so_lan = 0
+        self._mau = deque(maxlen=so_mau)
+        self._khoa = threading.Lock()
+
+    def ghi(self, giay: float):
+        vi_tri = bisect.bisect_left(CAC_MOC, giay)
+        with self._khoa:
+            self.dem_bucket[vi_tri] += 1
+            self.tong += giay
+            self.so_lan += 1
+            self._mau.append(giay)
+
+    def phan_vi(self, *cac_p: float) -> list:
+        """Phân vị (giây) trên cửa sổ mẫu gần nhất, ví dụ phan_vi(50, 99)"""
+        with self._khoa:
+            mau = sorted(self._mau)
+        if not mau:
+            return [0.0 for _ in cac_p]
+        return [mau[min(len(mau) - 1, int(p / 100 * len(mau)))] for p in cac_p]
+
+class BoDoLuong:
+    """Tập hợp histogram theo giai đoạn và bộ đếm có nhãn (theo lệnh, vùng, loại lỗi...)"""
+    def __init__(self, so_mau: int = 1024):
+        self.so_mau = so_mau
+        self._bieu_do = {}
+        self._dem = Counter()
+        self._khoa = threading.Lock()
+
+    def _lay_bieu_do(self, giai_doan: str) -> BieuDoTruot:
+        bieu_do = self._bieu_do.get(giai_doan)
+        if bieu_do is None:
+            with self._khoa:
+                bieu_do = self._bieu_do.setdefault(giai_doan, BieuDoTruot(self.so_mau))
+        return bieu_do
+
+    def ghi_thoi_gian(self, giai_doan: str, giay: float):
+        self._lay_bieu_do(giai_doan).ghi(giay)
+
+    @contextmanager
+    def do(self, giai_doan: str):
+        """Đo thời gian của khối lệnh: with bo_do.do("upstream"): ..."""
+        bat_dau = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.ghi_thoi_gian(giai_doan, time.perf_counter() - bat_dau)
+
+    def dem(self, ten: str, **nhan):
+        """Tăng bộ đếm, ví dụ dem("errors", loai="upstream_timeout")"""
+        khoa = (ten, tuple(sorted(nhan.items())))
+        with self._khoa:
+            self._dem[khoa] += 1
+
+    def tom_tat_giai_doan(self) -> dict:
+        """giai_doan -> (số lần, p50, p99)"""
+        return {
+            giai_doan: (bieu_do.so_lan, *bieu_do.phan_vi(50, 99))
+            for giai_doan, bieu_do in sorted(self._bieu_do.items())
+        }
+
+    def tom_tat_bo_dem(self, ten: str) -> dict:
+        """Giá trị các bộ đếm cùng tên, khóa là giá trị nhãn (ví dụ "/ff" hoặc "upstream_timeout")"""
+        with self._khoa:
+            return {
+                ",".join(str(v) for _, v in nhan): so for (t, nhan), so in self._dem.items() if t == ten
+            }
+
+    def xuat_prometheus(self, tien_to: str = "ffbot") -> str:
+        """Xuất toàn bộ số liệu theo định dạng text của Prometheus"""
+        dong = [
+            f"# HELP {tien_to}_stage_seconds Thời gian xử lý từng giai đoạn",
+            f"# TYPE {tien_to}_stage_seconds histogram"
+        ]
+        for giai_doan, bieu_do in sorted(self._bieu_do.items()):
+            with bieu_do._khoa:
+                dem_bucket, tong, so_lan = list(bieu_do.dem_bucket), bieu_do.tong, bieu_do.so_lan
+            cong_don = 0
+            for moc, so in zip(CAC_MOC + ("+Inf",), dem_bucket):
+                cong_don += so
+                dong.append(f'{tien_to}_stage_seconds_bucket{{stage="{giai_doan}",le="{moc}"}} {cong_don}')
+            dong.append(f'{tien_to}_stage_seconds_sum{{stage="{giai_doan}"}} {tong:.6f}')
+            dong.append(f'{tien_to}_stage_seconds_count{{stage="{giai_doan}"}} {so_lan}')
+
+        with self._khoa:
+            bo_dem = sorted(self._dem.items())
+        da_khai_bao = set()
+        for (ten, nhan), so in bo_dem:
+            if ten not in da_khai_bao:
+                dong.append(f"# TYPE {tien_to}_{ten}_total counter")
+                da_khai_bao.add(ten)
+            chuoi_nhan = ",".join(f'{k}="{v}"' for k, v in nhan)
+            dong.append(f"{tien_to}_{ten}_total{{{chuoi_nhan}}} {so}")
+        return "\n".join(dong) + "\n"
+
+class MayChuMetrics:
+    """Máy chủ HTTP phục vụ GET /metrics cho Prometheus"""
+    def __init__(self, host: str, port: int, bo_do: BoDoLuong, logger):
+        self.logger = logger
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = bo_do.xuat_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.server.daemon_threads = True
+        self._luong = threading.Thread(target=self.server.serve_forever, name="ff-metrics", daemon=True)
+
+    def bat_dau(self):
+        self._luong.start()
+        host, port = self.server.server_address[:2]
+        self.logger.info(f"📈 Metrics Prometheus tại http://{host}:{port}/metrics")
+
+    def dung(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,395 @@
+"""
+Lập lịch gửi tin nhắn ra Telegram - tuân thủ giới hạn tốc độ và retry_after khi gặp 429
+"""
+
+import asyncio
+import itertools
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+# Mức ưu tiên: số nhỏ được gửi trước
+UU_TIEN_KET_QUA = 0  # Kết quả tra cứu /ff
+UU_TIEN_THUONG = 1   # Hướng dẫn, thông báo...
+
+class BoDemToken:
+    """Token bucket: nạp toc_do token mỗi giây, tối đa dung_luong token"""
+    def __init__(self, toc_do: float, dung_luong: float):
+        self.toc_do = toc_do
+        self.dung_luong = dung_luong
+        self.token = dung_luong
+        self.cap_nhat_luc = time.monotonic()
+        self.tam_dung_den = 0.0
+        self._khoa = threading.Lock()
+
+    def _nap(self, now: float):
+        if now > self.cap_nhat_luc:
+            self.token = min(self.dung_luong, self.token + (now - self.cap_nhat_luc) * self.toc_do)
+            self.cap_nhat_luc = now
+
+    def thoi_gian_cho(self, now: float = None) -> float:
+        """Số giây cần chờ cho tới khi có 1 token (0 nếu có sẵn)"""
+        now = time.monotonic() if now is None else now
+        with self._khoa:
+            self._nap(now)
+            cho = max(0.0, self.tam_dung_den - now)
+            if self.token < 1:
+                cho = max(cho, (1 - self.token) / self.toc_do)
+            return cho
+
+    def lay(self, now: float = None) -> bool:
+        """Lấy 1 token nếu có, trả về False nếu phải chờ"""
+        now = time.monotonic() if now is None else now
+        with self._khoa:
+            self._nap(now)
+            if now < self.tam_dung_den or self.token < 1:
+                return False
+            self.token -= 1
+            return True
+
+    def tam_dung(self, giay: float):
+        """Không cấp token trong giay giây (dùng khi Telegram trả về retry_after)"""
+        with self._khoa:
+            self.tam_dung_den = max(self.tam_dung_den, time.monotonic() + giay)
+            self.token = 0
+
+    @property
+    def day(self) -> bool:
+        with self._khoa:
+            self._nap(time.monotonic())
+            return self.token >= self.dung_luong and time.monotonic() >= self.tam_dung_den
+
+def da_xong(gia_tri=None) -> Future:
+    """Future đã có sẵn kết quả"""
+    future = Future()
+    future.set_result(gia_tri)
+    return future
+
+def _chuyen_ket_qua(nguon: Future, dich: Future):
+    if nguon.cancelled():
+        dich.cancel()
+    elif nguon.exception() is not None:
+        dich.set_exception(nguon.exception())
+    else:
+        dich.set_result(nguon.result())
+
+def noi_tiep(future: Future, ham) -> Future:
+    """
+    Chạy ham(future) khi future xong mà không chặn luồng gọi, trả về Future chứa kết quả của ham.
+    ham trả về Future thì Future kết quả chờ tiếp Future đó (dùng để nối các lần gửi theo thứ tự).
+    """
+    ket_qua = Future()
+
+    def khi_xong(f: Future):
+        try:
+            gia_tri = ham(f)
+        except Exception as e:
+            ket_qua.set_exception(e)
+            return
+        if isinstance(gia_tri, Future):
+            gia_tri.add_done_callback(lambda g: _chuyen_ket_qua(g, ket_qua))
+        else:
+            ket_qua.set_result(gia_tri)
+
+    future.add_done_callback(khi_xong)
+    return ket_qua
+
+class _ViecGui:
+    """Một lệnh gọi Bot API đang chờ gửi"""
+    def __init__(self, uu_tien: int, thu_tu: int, chat_id: int, method: str, data: dict):
+        self.uu_tien = uu_tien
+        self.thu_tu = thu_tu
+        self.chat_id = chat_id
+        self.method = method
+        self.data = data
+        self.future = Future()
+        self.tao_luc = time.monotonic()
+        self.san_sang_luc = self.tao_luc
+        self.so_lan_429 = 0
+        self.da_bat_dau = False
+
+class _GioiHanGui:
+    """Token bucket toàn cục và theo chat cùng thống kê, dùng chung cho bộ lập lịch đa luồng và asyncio"""
+    def __init__(self, cau_hinh, logger):
+        self.logger = logger
+        self.cau_hinh = cau_hinh
+        self.so_lan_429_toi_da = cau_hinh.send_max_retries
+        self._toan_cuc = BoDemToken(cau_hinh.send_rate_global, cau_hinh.send_rate_global)
+        self._theo_chat = {}
+        self._thoi_gian_cho = deque(maxlen=1000)
+        self.thong_ke = {"da_gui": 0, "lan_429": 0, "that_bai": 0}
+
+    def _bucket_chat(self, chat_id: int) -> BoDemToken:
+        bucket = self._theo_chat.get(chat_id)
+        if bucket is None:
+            if len(self._theo_chat) > 10000:
+                # Dọn các bucket đã đầy (chat lâu không gửi) để giới hạn bộ nhớ
+                self._theo_chat = {k: v for k, v in self._theo_chat.items() if not v.day}
+            if chat_id < 0:
+                bucket = BoDemToken(self.cau_hinh.send_rate_group / 60.0, self.cau_hinh.send_burst)
+            else:
+                bucket = BoDemToken(self.cau_hinh.send_rate_chat, self.cau_hinh.send_burst)
+            self._theo_chat[chat_id] = bucket
+        return bucket
+
+    def _ghi_nhan_429(self, chat_id: int, ket_qua: dict) -> float:
+        """Tạm dừng bucket của chat theo parameters.retry_after, trả về số giây phải chờ"""
+        try:
+            retry_after = float((ket_qua.get("parameters") or {}).get("retry_after", 1))
+        except (AttributeError, TypeError, ValueError):
+            retry_after = 1.0
+        self.thong_ke["lan_429"] += 1
+        self.logger.warning("⏳ Telegram giới hạn tốc độ chat %s, gửi lại sau %.0fs", chat_id, retry_after)
+        self._bucket_chat(chat_id).tam_dung(retry_after)
+        return retry_after
+
+    def thong_ke_cho(self) -> dict:
+        """Độ sâu hàng đợi và thời gian chờ (giây) trước khi được gửi"""
+        mau = list(self._thoi_gian_cho)
+        return {
+            "do_sau": self.so_viec_dang_cho(),
+            "cho_trung_binh": sum(mau) / len(mau) if mau else 0.0,
+            "cho_toi_da": max(mau) if mau else 0.0,
+            **self.thong_ke
+        }
+
+class BoLapLichGui(_GioiHanGui):
+    """
+    Hàng đợi gửi tin nhắn dùng token bucket cho giới hạn toàn cục (~30/s),
+    theo chat riêng (~1/s) và theo group (~20/phút). Khi Telegram trả về 429,
+    việc gửi được lên lịch lại theo parameters.retry_after thay vì bị bỏ.
+    Mỗi chat gửi lần lượt theo thứ tự đưa vào (tối đa một lệnh gọi đang chạy mỗi chat),
+    người gọi không phải chờ: nối việc tiếp theo vào Future trả về bằng noi_tiep.
+    """
+    def __init__(self, thuc_hien, cau_hinh, logger):
+        super().__init__(cau_hinh, logger)
+        self.thuc_hien = thuc_hien  # thuc_hien(method, data) -> requests.Response
+        self._cho = []
+        self._dang_gui_chat = set()  # Chat đang có lệnh gọi chạy, chưa được gửi việc tiếp theo
+        self._thu_tu = itertools.count()
+        self._cond = threading.Condition()
+        self._dang_chay = True
+        self._huy = False  # Dừng hẳn: không chờ việc đang chạy, không gửi lại khi 429
+        self._pool = ThreadPoolExecutor(cau_hinh.send_workers, thread_name_prefix="ff-send")
+        self._luong = threading.Thread(target=self._vong_lap, name="ff-send-scheduler", daemon=True)
+        self._luong.start()
+
+    def gui(self, chat_id: int, method: str, data: dict, uu_tien: int = UU_TIEN_THUONG) -> Future:
+        """Đưa một lệnh gọi vào hàng đợi, trả về Future chứa requests.Response"""
+        viec = _ViecGui(uu_tien, next(self._thu_tu), chat_id, method, data)
+        with self._cond:
+            if not self._luong.is_alive():
+                viec.future.set_exception(RuntimeError("Bộ lập lịch gửi đã dừng"))
+                return viec.future
+            self._cho.append(viec)
+            self._cond.notify()
+        return viec.future
+
+    def _chon_viec(self, now: float) -> tuple:
+        """Chọn việc ưu tiên cao nhất có thể gửi ngay, hoặc thời gian cần chờ"""
+        cho_toan_cuc = self._toan_cuc.thoi_gian_cho(now)
+        if cho_toan_cuc > 0:
+            return None, cho_toan_cuc
+
+        # Mỗi chat chỉ xét việc được đưa vào sớm nhất để tin nhắn trong chat giữ đúng thứ tự,
+        # mức ưu tiên chỉ quyết định chat nào được gửi trước
+        dau_chat = {}
+        for viec in self._cho:
+            if viec.chat_id in self._dang_gui_chat:
+                continue
+            truoc = dau_chat.get(viec.chat_id)
+            if truoc is None or viec.thu_tu < truoc.thu_tu:
+                dau_chat[viec.chat_id] = viec
+
+        cho_it_nhat = 1.0
+        for viec in sorted(dau_chat.values(), key=lambda v: (v.uu_tien, v.thu_tu)):
+            cho = max(viec.san_sang_luc - now, self._bucket_chat(viec.chat_id).thoi_gian_cho(now))
+            if cho <= 0:
+                return viec, 0.0
+            cho_it_nhat = min(cho_it_nhat, cho)
+        return None, cho_it_nhat
+
+    def _vong_lap(self):
+        while True:
+            with self._cond:
+                while self._dang_chay and not self._cho:
+                    self._cond.wait()
+                if not self._cho:
+                    if self._dang_gui_chat and not self._huy:
+                        # Việc đang chạy có thể nối thêm việc mới (ví dụ sửa placeholder) khi xong
+                        self._cond.wait(0.5)
+                        continue
+                    return
+
+                now = time.monotonic()
+                qua_han = self._lay_viec_qua_han(now)
+                viec, cho = self._chon_viec(now) if not qua_han else (None, 0.0)
+                if viec is None and not qua_han:
+                    self._cond.wait(cho)
+                    continue
+
+                if viec is not None:
+                    self._cho.remove(viec)
+                    self._toan_cuc.lay(now)
+                    self._bucket_chat(viec.chat_id).lay(now)
+
+                    if not viec.da_bat_dau:
+                        if not viec.future.set_running_or_notify_cancel():
+                            continue  # Người gọi đã hủy
+                        viec.da_bat_dau = True
+                    self._dang_gui_chat.add(viec.chat_id)
+
+            # Báo lỗi sau khi nhả khóa: các việc nối tiếp (noi_tiep) chạy ngay trong luồng này
+            for viec_qua_han in qua_han:
+                viec_qua_han.future.set_exception(FutureTimeoutError(
+                    f"{viec_qua_han.method} chờ quá {self.cau_hinh.send_queue_timeout:.0f}s trong hàng đợi gửi"
+                ))
+            if viec is None:
+                continue
+            self._thoi_gian_cho.append(now - viec.tao_luc)
+            self._pool.submit(self._thuc_hien_viec, viec)
+
+    def _lay_viec_qua_han(self, now: float) -> list:
+        """Lấy ra các việc chờ quá SEND_QUEUE_TIMEOUT mà chưa gửi lần nào (gọi khi đang giữ khóa)"""
+        han = self.cau_hinh.send_queue_timeout
+        qua_han = [v for v in self._cho if not v.da_bat_dau and now - v.tao_luc > han]
+        for viec in qua_han:
+            self._cho.remove(viec)
+            self.thong_ke["that_bai"] += 1
+        return qua_han
+
+    def _xong_viec(self, viec: _ViecGui):
+        """Cho phép chat gửi việc tiếp theo (sau khi Future đã xong và các việc nối tiếp đã vào hàng đợi)"""
+        with self._cond:
+            self._dang_gui_chat.discard(viec.chat_id)
+            self._cond.notify()
+
+    def _thuc_hien_viec(self, viec: _ViecGui):
+        try:
+            resp = self.thuc_hien(viec.method, viec.data)
+        except Exception as e:
+            self.thong_ke["that_bai"] += 1
+            viec.future.set_exception(e)
+            self._xong_viec(viec)
+            return
+
+        if resp.status_code == 429 and viec.so_lan_429 < self.so_lan_429_toi_da and not self._huy:
+            try:
+                ket_qua = resp.json()
+            except ValueError:
+                ket_qua = {}
+            with self._cond:
+                retry_after = self._ghi_nhan_429(viec.chat_id, ket_qua)
+                viec.so_lan_429 += 1
+                viec.san_sang_luc = time.monotonic() + retry_after
+                self._cho.append(viec)
+                self._dang_gui_chat.discard(viec.chat_id)
+                self._cond.notify()
+            return
+
+        self.thong_ke["da_gui"] += 1
+        viec.future.set_result(resp)
+        self._xong_viec(viec)
+
+    def so_viec_dang_cho(self) -> int:
+        return len(self._cho)
+
+    def dung(self):
+        """Gửi nốt các việc còn trong hàng đợi rồi dừng"""
+        with self._cond:
+            self._dang_chay = False
+            self._cond.notify_all()
+        # Việc chưa gửi được bị bỏ sau SEND_QUEUE_TIMEOUT, chờ thêm cho lệnh gọi cuối cùng
+        self._luong.join(self.cau_hinh.send_queue_timeout + self.cau_hinh.request_timeout)
+        if self._luong.is_alive():
+            # Còn việc gửi lại vì 429 với retry_after quá dài: dừng vòng lặp trước khi tắt pool
+            with self._cond:
+                self._huy = True
+                con_lai, self._cho = self._cho, []
+                self._cond.notify_all()
+            self._luong.join()
+            self.thong_ke["that_bai"] += len(con_lai)
+            self.logger.warning("⚠️ Bỏ %s lệnh gọi chưa gửi được khi dừng bộ lập lịch gửi", len(con_lai))
+            for viec in con_lai:
+                if not viec.future.done():
+                    viec.future.set_exception(RuntimeError("Bộ lập lịch gửi đã dừng"))
+        self._pool.shutdown(wait=True)
+
+class BoLapLichGuiAsync(_GioiHanGui):
+    """
+    Phiên bản asyncio của BoLapLichGui cho RUNTIME=async: cùng các token bucket, cùng cách gửi lại
+    theo retry_after khi gặp 429 và cùng SEND_QUEUE_TIMEOUT. Mỗi chat gửi lần lượt theo thứ tự
+    (asyncio.Lock theo chat), kết quả tra cứu được nhường token toàn cục trước các tin nhắn thường.
+    """
+    def __init__(self, thuc_hien, cau_hinh, logger):
+        super().__init__(cau_hinh, logger)
+        self.thuc_hien = thuc_hien  # coroutine thuc_hien(method, data) -> (mã HTTP, JSON phản hồi)
+        self._khoa_chat = weakref.WeakValueDictionary()  # chat_id -> asyncio.Lock
+        self._so_dang_cho = 0
+        self._ket_qua_cho_toan_cuc = 0  # Số kết quả tra cứu chỉ còn chờ token toàn cục
+
+    async def _cho_token(self, chat_id: int, uu_tien: int, het_han: float):
+        """Chờ tới khi lấy được token của chat và token toàn cục, quá het_han thì báo hết thời gian"""
+        bucket = self._bucket_chat(chat_id)
+        while True:
+            now = time.monotonic()
+            cho_chat = bucket.thoi_gian_cho(now)
+            cho_toan_cuc = self._toan_cuc.thoi_gian_cho(now)
+            nhuong = uu_tien > UU_TIEN_KET_QUA and self._ket_qua_cho_toan_cuc > 0
+            if cho_chat <= 0 and cho_toan_cuc <= 0 and not nhuong:
+                # Không có await giữa lúc kiểm tra và lúc lấy nên không coroutine nào chen vào được
+                self._toan_cuc.lay(now)
+                bucket.lay(now)
+                return
+            if now >= het_han:
+                raise FutureTimeoutError(f"Chờ quá {self.cau_hinh.send_queue_timeout:.0f}s trong hàng đợi gửi")
+
+            cho = min(max(cho_chat, cho_toan_cuc, 0.01), het_han - now)
+            if uu_tien <= UU_TIEN_KET_QUA and cho_chat <= 0:
+                self._ket_qua_cho_toan_cuc += 1
+                try:
+                    await asyncio.sleep(cho)
+                finally:
+                    self._ket_qua_cho_toan_cuc -= 1
+            else:
+                await asyncio.sleep(cho)
+
+    async def gui(self, chat_id: int, method: str, data: dict, uu_tien: int = UU_TIEN_THUONG) -> tuple:
+        """Gửi một lệnh gọi theo giới hạn tốc độ, trả về (mã HTTP, JSON phản hồi)"""
+        tao_luc = time.monotonic()
+        khoa = self._khoa_chat.get(chat_id)
+        if khoa is None:
+            khoa = asyncio.Lock()
+            self._khoa_chat[chat_id] = khoa
+
+        self._so_dang_cho += 1
+        try:
+            async with khoa:
+                so_lan_429 = 0
+                while True:
+                    # Hết thời gian chờ chỉ áp dụng trước lần gửi đầu tiên, như bộ lập lịch đa luồng
+                    het_han = tao_luc + self.cau_hinh.send_queue_timeout if so_lan_429 == 0 else float("inf")
+                    try:
+                        await self._cho_token(chat_id, uu_tien, het_han)
+                        if so_lan_429 == 0:
+                            self._thoi_gian_cho.append(time.monotonic() - tao_luc)
+                        status, ket_qua = await self.thuc_hien(method, data)
+                    except Exception:
+                        self.thong_ke["that_bai"] += 1
+                        raise
+
+                    if status == 429 and so_lan_429 < self.so_lan_429_toi_da:
+                        # Bucket của chat bị tạm dừng nên lần chờ token tiếp theo đã bao gồm retry_after
+                        self._ghi_nhan_429(chat_id, ket_qua)
+                        so_lan_429 += 1
+                        continue
+
+                    self.thong_ke["da_gui"] += 1
+                    return status, ket_qua
+        finally:
+            self._so_dang_cho -= 1
+
+    def so_viec_dang_cho(self) -> int:
+        return self._so_dang_cho
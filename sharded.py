@@ -0,0 +1,231 @@
+"""
+Chạy worker trên nhiều process (RUNTIME=sharded) - process chính nhận update rồi chia theo chat_id
+cho các process worker qua hàng đợi IPC, mỗi process tự tra cứu và gửi tin nhắn
+"""
+
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from collections import deque
+
+from dispatch import lay_khoa_dinh_tuyen
+
+MA_LOI_KHOI_DONG = 3  # Mã thoát khi shard không khởi động được (getMe thất bại)
+THOI_GIAN_ON_DINH = 30.0  # Shard chạy được lâu hơn số giây này thì không tính là lỗi liên tiếp
+CHO_KHOI_DONG_LAI_TOI_DA = 60.0
+
+def _chay_worker(chi_so: int, hang_doi, da_xu_ly):
+    """
+    Điểm vào của process worker: tạo bot riêng và xử lý các update được giao.
+    da_xu_ly (multiprocessing.Value) luôn giữ update_id lớn nhất mà mọi update shard đã nhận
+    có id nhỏ hơn hoặc bằng đều đã xử lý xong, để process chính biết update nào cần giao lại
+    """
+    # Import trong process con vì process được tạo bằng spawn
+    from app import CauHinh, FreeFireBot
+    from command import xu_ly_lenh
+    from dispatch import BoDieuPhoi
+
+    cau_hinh = CauHinh()
+    # Giới hạn gửi toàn cục của Telegram áp dụng cho cả bot nên chia đều cho các shard
+    cau_hinh.send_rate_global = cau_hinh.send_rate_global / max(1, cau_hinh.shard_count)
+    bot = FreeFireBot(cau_hinh)
+    # Ctrl+C và systemd (KillMode=control-group) gửi tín hiệu cho cả nhóm process: bỏ qua ở shard để
+    # process chính điều phối việc dừng, shard chỉ dừng khi nhận None sau khi xử lý nốt hàng đợi
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    if not bot.khoi_dong():
+        bot.logger.error(f"❌ Shard {chi_so} không thể khởi động")
+        bot._giai_phong_tai_nguyen()
+        sys.exit(MA_LOI_KHOI_DONG)
+    process_chinh = os.getppid()
+
+    dang_xu_ly = set()  # update_id đã nhận nhưng chưa xử lý xong
+    lon_nhat = da_xu_ly.value
+    khoa = threading.Lock()
+
+    def xu_ly(update: dict):
+        try:
+            xu_ly_lenh(update, bot)
+        finally:
+            with khoa:
+                dang_xu_ly.discard(update.get("update_id", 0))
+                da_xu_ly.value = min(dang_xu_ly) - 1 if dang_xu_ly else lon_nhat
+
+    bo_dieu_phoi = None
+    if bot.cau_hinh.worker_count > 0:
+        bo_dieu_phoi = BoDieuPhoi(
+            xu_ly,
+            bot.cau_hinh.worker_count,
+            bot.cau_hinh.worker_queue_size,
+            bot.logger
+        )
+        bo_dieu_phoi.bat_dau()
+        bot.bo_dieu_phoi = bo_dieu_phoi
+    bot.logger.info(f"🧩 Shard {chi_so} sẵn sàng (PID {os.getpid()})")
+
+    while bot.running:
+        try:
+            update = hang_doi.get(timeout=1.0)
+        except queue.Empty:
+            if os.getppid() != process_chinh:
+                break  # Process chính đã chết đột ngột, không còn ai gửi None
+            continue
+        if update is None:
+            break
+        with khoa:
+            dang_xu_ly.add(update.get("update_id", 0))
+            lon_nhat = max(lon_nhat, update.get("update_id", 0))
+        if bo_dieu_phoi:
+            bo_dieu_phoi.gui(update)
+        else:
+            try:
+                xu_ly(update)
+            except Exception as e:
+                bot.logger.exception(f"🔥 Lỗi khi xử lý update {update.get('update_id')}: {str(e)}")
+
+    if bo_dieu_phoi:
+        bo_dieu_phoi.dung()
+    bot._giai_phong_tai_nguyen()
+
+class BoPhanManh:
+    """
+    Cùng giao diện với dispatch.BoDieuPhoi nhưng mỗi worker là một process riêng (không bị GIL giới hạn).
+    Update được chia theo hash của chat_id nên thứ tự trong cùng một chat được giữ nguyên;
+    process worker bị chết sẽ được khởi động lại và nhận lại các update đã giao mà chưa xử lý xong.
+    """
+    def __init__(self, so_process: int, kich_thuoc_hang_doi: int, logger):
+        self.logger = logger
+        self.kich_thuoc_hang_doi = kich_thuoc_hang_doi
+        self._ctx = multiprocessing.get_context("spawn")
+        self.hang_doi = [self._ctx.Queue(maxsize=kich_thuoc_hang_doi) for _ in range(max(1, so_process))]
+        self.processes = [None] * len(self.hang_doi)
+        # Update đã giao cho từng shard mà shard chưa báo xử lý xong (qua da_xu_ly), giao lại khi shard chết
+        self._da_giao = [deque() for _ in self.hang_doi]
+        self._da_xu_ly = [self._ctx.Value("q", 0) for _ in self.hang_doi]
+        self._khoa_giao = [threading.Lock() for _ in self.hang_doi]
+        self._bat_dau_luc = [0.0] * len(self.hang_doi)
+        self._loi_lien_tiep = [0] * len(self.hang_doi)
+        self._hen_khoi_dong = [None] * len(self.hang_doi)  # Thời điểm khởi động lại shard đang chờ backoff
+        self.so_lan_khoi_dong_lai = 0
+        self._dang_chay = True
+        self._khoa = threading.Lock()
+        self._luong_giam_sat = threading.Thread(target=self._giam_sat, name="ff-shard-supervisor", daemon=True)
+
+    def _khoi_chay(self, chi_so: int):
+        process = self._ctx.Process(
+            target=_chay_worker, args=(chi_so, self.hang_doi[chi_so], self._da_xu_ly[chi_so]),
+            name=f"ff-shard-{chi_so}", daemon=True
+        )
+        process.start()
+        self.processes[chi_so] = process
+        self._bat_dau_luc[chi_so] = time.monotonic()
+
+    def bat_dau(self):
+        """Khởi chạy các process worker và luồng giám sát"""
+        for chi_so in range(len(self.hang_doi)):
+            self._khoi_chay(chi_so)
+        self._luong_giam_sat.start()
+        self.logger.info(f"🧩 Đã khởi chạy {len(self.processes)} process worker")
+
+    def _giam_sat(self):
+        while self._dang_chay:
+            time.sleep(1.0)
+            with self._khoa:
+                now = time.monotonic()
+                for chi_so, process in enumerate(self.processes):
+                    if not self._dang_chay:
+                        break
+                    if self._hen_khoi_dong[chi_so] is not None:
+                        if now >= self._hen_khoi_dong[chi_so]:
+                            self._hen_khoi_dong[chi_so] = None
+                            self.so_lan_khoi_dong_lai += 1
+                            self._khoi_chay(chi_so)
+                    elif process.exitcode is not None:
+                        self._khoi_dong_lai(chi_so, process, now)
+
+    def _khoi_dong_lai(self, chi_so: int, process, now: float):
+        """Thay hàng đợi của shard đã dừng và hẹn khởi động lại, chờ lâu dần nếu shard lỗi liên tiếp"""
+        # Process chết giữa chừng có thể vẫn giữ khóa đọc của hàng đợi nên không đọc lại hàng đợi cũ mà
+        # giao lại từ danh sách đã giao: mọi update shard chưa xử lý xong (trong hàng đợi hoặc đang xử lý)
+        with self._khoa_giao[chi_so]:
+            da_xu_ly = self._da_xu_ly[chi_so].value
+            con_lai = sorted((u for u in self._da_giao[chi_so] if u.get("update_id", 0) > da_xu_ly),
+                             key=lambda u: u.get("update_id", 0))
+            moi = self._ctx.Queue(maxsize=self.kich_thuoc_hang_doi + len(con_lai))
+            for update in con_lai:
+                moi.put_nowait(update)
+            cu, self.hang_doi[chi_so] = self.hang_doi[chi_so], moi
+            self._da_giao[chi_so] = deque(con_lai)
+        # Không còn ai đọc hàng đợi cũ: không chờ đẩy nốt dữ liệu của nó khi process chính thoát
+        cu.cancel_join_thread()
+        cu.close()
+
+        if process.exitcode == MA_LOI_KHOI_DONG or now - self._bat_dau_luc[chi_so] < THOI_GIAN_ON_DINH:
+            self._loi_lien_tiep[chi_so] += 1
+        else:
+            self._loi_lien_tiep[chi_so] = 0
+        cho = min(CHO_KHOI_DONG_LAI_TOI_DA, 2 ** self._loi_lien_tiep[chi_so] - 1)
+        self._hen_khoi_dong[chi_so] = now + cho
+        self.logger.warning(
+            f"⚠️ Shard {chi_so} (PID {process.pid}) đã dừng với mã {process.exitcode}, "
+            f"khởi động lại sau {cho:.0f}s ({len(con_lai)} update chưa xử lý được giao lại)"
+        )
+
+    def gui(self, update: dict):
+        """
+        Giao update cho process phụ trách chat tương ứng.
+        Chặn lại khi hàng đợi đầy (backpressure cho vòng lặp polling/webhook).
+        """
+        chi_so = hash(lay_khoa_dinh_tuyen(update)) % len(self.hang_doi)
+        while True:
+            with self._khoa_giao[chi_so]:
+                try:
+                    # Lấy lại hàng đợi sau mỗi lần chờ vì shard có thể đã được khởi động lại với hàng đợi mới
+                    self.hang_doi[chi_so].put(update, timeout=1.0)
+                except queue.Full:
+                    pass
+                else:
+                    da_giao = self._da_giao[chi_so]
+                    da_giao.append(update)
+                    da_xu_ly = self._da_xu_ly[chi_so].value
+                    while da_giao and da_giao[0].get("update_id", 0) <= da_xu_ly:
+                        da_giao.popleft()
+                    return
+            time.sleep(0.05)  # Nhả khóa để luồng giám sát kịp thay hàng đợi nếu shard đã dừng
+
+    def offset_an_toan(self, offset: int) -> int:
+        """Offset nên lưu vào OFFSET_FILE: không vượt quá update nhỏ nhất đã giao mà shard chưa xử lý xong"""
+        for chi_so, khoa in enumerate(self._khoa_giao):
+            with khoa:
+                da_xu_ly = self._da_xu_ly[chi_so].value
+                chua_xong = [u.get("update_id", 0) for u in self._da_giao[chi_so] if u.get("update_id", 0) > da_xu_ly]
+            if chua_xong:
+                offset = min(offset, min(chua_xong))
+        return offset
+
+    def so_viec_dang_cho(self) -> int:
+        """Tổng số update đang chờ trong tất cả hàng đợi"""
+        try:
+            return sum(q.qsize() for q in self.hang_doi)
+        except NotImplementedError:
+            return 0  # qsize() không được hỗ trợ trên macOS
+
+    def dung(self, timeout: float = 30.0):
+        """Dừng các process worker sau khi xử lý hết các update đã nhận"""
+        with self._khoa:
+            self._dang_chay = False
+        for q, process in zip(self.hang_doi, self.processes):
+            # Shard đã dừng (đang chờ khởi động lại) không đọc hàng đợi nữa, put có thể bị chặn mãi
+            if process.is_alive():
+                q.put(None)
+        for chi_so, process in enumerate(self.processes):
+            process.join(timeout)
+            if process.exitcode == MA_LOI_KHOI_DONG or self._hen_khoi_dong[chi_so] is not None:
+                self.logger.warning(f"⚠️ Shard {chi_so} không chạy khi dừng, update trong hàng đợi của nó bị bỏ")
+            if process.is_alive():
+                self.logger.warning(f"⚠️ Shard {chi_so} chưa xử lý xong sau {timeout}s, buộc dừng")
+                process.terminate()
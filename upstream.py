@@ -0,0 +1,427 @@
+"""
+Client HTTP dùng chung cho API thông tin game thủ - giữ kết nối, thử lại có giới hạn,
+chọn mirror theo độ trễ, gửi yêu cầu dự phòng (hedge) và ngắt mirror lỗi (circuit breaker)
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError as LoiKetNoi, RequestException, Timeout
+
+try:
+    import aiohttp  # Chỉ cần cho engine asyncio (RUNTIME=async)
+except ImportError:
+    aiohttp = None
+
+# Mã HTTP nên thử lại (quá tải hoặc lỗi tạm thời phía server)
+MA_THU_LAI = {429, 500, 502, 503, 504}
+
+HAN_HEDGE_MAC_DINH = 1.0  # Giây chờ trước khi hedge khi mirror chưa đủ mẫu độ trễ
+SO_MAU_TOI_THIEU = 20  # Số mẫu tối thiểu để tính phân vị độ trễ của một mirror
+TI_LE_KHAM_PHA = 0.05  # Tỉ lệ yêu cầu gửi tới mirror xếp thứ hai để cập nhật độ trễ của nó
+
+def doc_retry_after(value) -> float:
+    """Đọc header Retry-After (số giây hoặc ngày giờ HTTP), trả về số giây cần chờ"""
+    if not value:
+        return 0.0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0.0
+
+def _loi_ket_noi_async(e: BaseException) -> bool:
+    """Lỗi aiohttp nên thử lại: không kết nối được hoặc kết nối bị đóng, không gồm hết hạn đọc"""
+    if isinstance(e, asyncio.TimeoutError):
+        # aiohttp cũ không tách hết hạn kết nối và hết hạn đọc, khi đó coi như hết hạn đọc
+        return isinstance(e, getattr(aiohttp, "ConnectionTimeoutError", ()))
+    return isinstance(e, aiohttp.ClientConnectionError)
+
+class TinhTrangNguon:
+    """
+    Số liệu của một mirror: độ trễ trung bình trượt (EWMA), các mẫu gần nhất để tính phân vị
+    và circuit breaker - mở sau nguong_loi lỗi liên tiếp, hết thoi_gian_mo thì cho đúng một yêu cầu thử
+    """
+    def __init__(self, url: str, nguong_loi: int, thoi_gian_mo: float):
+        self.url = url
+        self.nguong_loi = nguong_loi  # 0 = không ngắt
+        self.thoi_gian_mo = thoi_gian_mo
+        self.do_tre = None  # EWMA (giây), None khi chưa có phản hồi nào
+        self.loi_lien_tiep = 0
+        self._mo_den = 0.0
+        self._dang_thu = False
+        self._mau = deque(maxlen=200)
+        self._khoa = threading.Lock()
+
+    def _dang_ngat(self) -> bool:
+        return bool(self.nguong_loi) and self.loi_lien_tiep >= self.nguong_loi
+
+    def dang_mo(self) -> bool:
+        """Breaker đang mở (chưa hết thời gian chờ hoặc đang có yêu cầu thử)"""
+        with self._khoa:
+            return self._dang_ngat() and (time.monotonic() < self._mo_den or self._dang_thu)
+
+    def cho_phep(self) -> bool:
+        """Có được gửi yêu cầu tới mirror không (nửa mở: chỉ yêu cầu đầu tiên được gửi thử)"""
+        with self._khoa:
+            if not self._dang_ngat():
+                return True
+            if time.monotonic() < self._mo_den or self._dang_thu:
+                return False
+            self._dang_thu = True
+            return True
+
+    def ghi_thanh_cong(self, giay: float):
+        with self._khoa:
+            self.do_tre = giay if self.do_tre is None else 0.8 * self.do_tre + 0.2 * giay
+            self._mau.append(giay)
+            self.loi_lien_tiep = 0
+            self._dang_thu = False
+
+    def ghi_that_bai(self) -> bool:
+        """Ghi một lỗi, trả về True nếu breaker vừa chuyển sang mở"""
+        with self._khoa:
+            da_ngat, dang_thu = self._dang_ngat(), self._dang_thu
+            self.loi_lien_tiep += 1
+            self._dang_thu = False
+            # Lỗi của các yêu cầu đã gửi trước lúc ngắt không kéo dài thời gian ngắt
+            if not self._dang_ngat() or (da_ngat and not dang_thu):
+                return False
+            self._mo_den = time.monotonic() + self.thoi_gian_mo
+            return True
+
+    def bo_thu(self):
+        """Yêu cầu bị hủy giữa chừng (hedge thua cuộc): không giữ lượt thử của breaker nửa mở"""
+        with self._khoa:
+            self._dang_thu = False
+
+    def phan_vi(self, p: float):
+        """Phân vị độ trễ (giây) trên các mẫu gần nhất, None nếu chưa đủ mẫu"""
+        with self._khoa:
+            mau = sorted(self._mau)
+        if len(mau) < SO_MAU_TOI_THIEU:
+            return None
+        return mau[min(len(mau) - 1, int(p / 100 * len(mau)))]
+
+class KetNoiUpstream:
+    """
+    Client sống lâu do bot sở hữu: pool kết nối keep-alive, timeout kết nối/đọc riêng,
+    thử lại có giới hạn với backoff ngẫu nhiên và tôn trọng Retry-After khi gặp 429/5xx.
+    Với nhiều mirror (lay_json_nhieu_nguon): ưu tiên mirror có độ trễ gần đây thấp nhất,
+    gửi thêm tới mirror kế tiếp nếu quá hạn hedge và bỏ qua mirror đang bị ngắt.
+    """
+    def __init__(self, cau_hinh, logger, bo_do=None):
+        self.logger = logger
+        self.bo_do = bo_do  # metrics.BoDoLuong, đếm lỗi theo loại (tùy chọn)
+        self.timeout = (cau_hinh.connect_timeout, cau_hinh.read_timeout)
+        self.so_lan_thu_lai = cau_hinh.upstream_retries
+        self.backoff = cau_hinh.upstream_backoff
+        self.backoff_toi_da = cau_hinh.upstream_backoff_max
+        self.hedge_phan_vi = cau_hinh.upstream_hedge_percentile  # 0 = không hedge
+        self.hedge_toi_thieu = cau_hinh.upstream_hedge_min_delay
+        self.nguong_loi = cau_hinh.breaker_failures
+        self.thoi_gian_mo = cau_hinh.breaker_cooldown
+        self._cac_nguon = {}  # url -> TinhTrangNguon
+        self._khoa_nguon = threading.Lock()
+        self._bo_thuc_thi = None  # Pool cho yêu cầu hedge, tạo khi cần
+        self.pool_size = cau_hinh.upstream_pool_size
+        self.session = self._tao_session(cau_hinh.upstream_pool_size)
+
+    def _tao_session(self, pool_size: int) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=False)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({
+            "User-Agent": "FreeFireInfoBot/2.0",
+            "Accept": "application/json",
+            "Connection": "keep-alive"
+        })
+        return session
+
+    def _thoi_gian_cho(self, lan: int) -> float:
+        """Backoff lũy thừa với full jitter"""
+        return random.uniform(0, min(self.backoff_toi_da, self.backoff * (2 ** lan)))
+
+    def _dem(self, ten: str, **nhan):
+        if self.bo_do is not None:
+            self.bo_do.dem(ten, **nhan)
+
+    def _ghi_loi(self, loai: str):
+        self._dem("errors", kind=loai)
+
+    # ===== CHỌN MIRROR =====
+    def _nguon(self, url: str) -> TinhTrangNguon:
+        nguon = self._cac_nguon.get(url)
+        if nguon is None:
+            with self._khoa_nguon:
+                nguon = self._cac_nguon.setdefault(url, TinhTrangNguon(url, self.nguong_loi, self.thoi_gian_mo))
+        return nguon
+
+    def _ghi_that_bai(self, nguon: TinhTrangNguon):
+        if nguon.ghi_that_bai():
+            self._dem("upstream_circuit_trips")
+            self.logger.warning(
+                f"🔌 Tạm ngắt upstream {nguon.url} trong {nguon.thoi_gian_mo:.0f}s "
+                f"sau {nguon.loi_lien_tiep} lỗi liên tiếp"
+            )
+
+    def _xep_hang(self, cac_url: list) -> list:
+        """Các mirror đang nhận yêu cầu, độ trễ gần đây thấp nhất trước (mirror chưa có số liệu được thử trước)"""
+        cac_nguon = sorted((self._nguon(url) for url in cac_url), key=lambda n: n.do_tre or 0.0)
+        cac_nguon = [n for n in cac_nguon if not n.dang_mo()]
+        if len(cac_nguon) > 1 and random.random() < TI_LE_KHAM_PHA:
+            # Thỉnh thoảng ưu tiên mirror thứ hai để độ trễ của nó không bị cũ
+            cac_nguon[0], cac_nguon[1] = cac_nguon[1], cac_nguon[0]
+        return cac_nguon
+
+    def _han_hedge(self, nguon: TinhTrangNguon) -> float:
+        """Thời gian chờ mirror chính trước khi hedge: phân vị độ trễ của nó, giới hạn trong [tối thiểu, READ_TIMEOUT]"""
+        han = nguon.phan_vi(self.hedge_phan_vi)
+        if han is None:
+            han = HAN_HEDGE_MAC_DINH
+        return min(max(han, self.hedge_toi_thieu), self.timeout[1])
+
+    def tinh_trang_nguon(self) -> list:
+        """(url, độ trễ EWMA hoặc None, breaker đang mở) của từng mirror đã dùng"""
+        return [(n.url, n.do_tre, n.dang_mo()) for n in list(self._cac_nguon.values())]
+
+    # ===== GỌI API =====
+    def lay_json(self, url: str, params: dict = None):
+        """GET và trả về JSON, hoặc None nếu thất bại sau khi đã thử lại"""
+        return self._lay_json(url, params)[1]
+
+    def _lay_json(self, url: str, params: dict = None) -> tuple:
+        """Trả về (mirror có phản hồi hợp lệ không, JSON hoặc None)"""
+        nguon = self._nguon(url)
+        for lan in range(self.so_lan_thu_lai + 1):
+            con_luot = lan < self.so_lan_thu_lai
+            if not nguon.cho_phep():
+                self._ghi_loi("upstream_circuit_open")
+                return False, None
+            bat_dau = time.monotonic()
+            try:
+                resp = self.session.get(url, params=params, timeout=self.timeout)
+            except RequestException as e:
+                self._ghi_loi("upstream_timeout" if isinstance(e, Timeout) else "upstream_connection")
+                self._ghi_that_bai(nguon)
+                # Chỉ thử lại lỗi kết nối (gồm ConnectTimeout): hết hạn đọc nghĩa là mirror đang chậm,
+                # thử lại chỉ nhân thời gian người dùng phải chờ lên
+                if not con_luot or not isinstance(e, LoiKetNoi):
+                    self.logger.error(f"❌ Lỗi kết nối upstream {url}: {str(e)}")
+                    return False, None
+                time.sleep(self._thoi_gian_cho(lan))
+                continue
+
+            if resp.status_code != 200:
+                self._ghi_loi(f"upstream_http_{resp.status_code}")
+
+            if resp.status_code in MA_THU_LAI:
+                self._ghi_that_bai(nguon)
+                cho = max(doc_retry_after(resp.headers.get("Retry-After")), self._thoi_gian_cho(lan))
+                # Không chờ quá lâu trong luồng xử lý, bỏ cuộc nếu upstream yêu cầu chờ vượt giới hạn
+                if not con_luot or cho > self.backoff_toi_da:
+                    self.logger.error(f"❌ Upstream {url} trả về HTTP {resp.status_code}")
+                    return False, None
+                time.sleep(cho)
+                continue
+
+            if resp.status_code != 200:
+                nguon.ghi_thanh_cong(time.monotonic() - bat_dau)
+                self.logger.warning("⚠️ Upstream %s trả về HTTP %s", url, resp.status_code)
+                return True, None
+
+            try:
+                data = resp.json()
+            except ValueError:
+                self._ghi_loi("upstream_json")
+                self._ghi_that_bai(nguon)
+                self.logger.error(f"❌ Upstream {url} trả về dữ liệu không phải JSON")
+                return False, None
+            nguon.ghi_thanh_cong(time.monotonic() - bat_dau)
+            return True, data
+        return False, None
+
+    def lay_json_nhieu_nguon(self, cac_url: list, params: dict = None):
+        """
+        GET từ danh sách mirror: gửi tới mirror nhanh nhất, quá hạn hedge mà chưa có phản hồi thì gửi thêm
+        một yêu cầu tới mirror kế tiếp và dùng kết quả về trước; mirror lỗi thì chuyển ngay sang mirror sau
+        """
+        cac_nguon = self._xep_hang(cac_url)
+        if not cac_nguon:
+            self._ghi_loi("upstream_circuit_open")
+            self.logger.warning("⚠️ Tất cả upstream đang bị tạm ngắt")
+            return None
+        if len(cac_nguon) == 1 or not self.hedge_phan_vi:
+            for nguon in cac_nguon:
+                thanh_cong, data = self._lay_json(nguon.url, params)
+                if thanh_cong:
+                    return data
+            return None
+
+        if self._bo_thuc_thi is None:
+            with self._khoa_nguon:
+                if self._bo_thuc_thi is None:
+                    # Mỗi lượt tra cứu giữ tối đa hai luồng: đủ rộng để yêu cầu không phải xếp hàng chờ luồng
+                    self._bo_thuc_thi = ThreadPoolExecutor(max(32, 4 * self.pool_size), thread_name_prefix="ff-upstream")
+        dang_cho = set()
+        da_hedge = False
+
+        def gui_tiep():
+            dang_cho.add(self._bo_thuc_thi.submit(self._lay_json, cac_nguon.pop(0).url, params))
+
+        han = self._han_hedge(cac_nguon[0])
+        gui_tiep()
+        while dang_cho:
+            xong, dang_cho = wait(dang_cho, timeout=han if cac_nguon and not da_hedge else None,
+                                  return_when=FIRST_COMPLETED)
+            if not xong:
+                # Mirror chính chậm hơn phân vị độ trễ thường ngày: gửi thêm tới mirror kế tiếp
+                da_hedge = True
+                self._dem("upstream_hedges")
+                gui_tiep()
+                continue
+            for tuong_lai in xong:
+                thanh_cong, data = tuong_lai.result()
+                if thanh_cong:
+                    # Yêu cầu còn lại không hủy được khi đã gửi đi, kết quả của nó vẫn được dùng để cập nhật độ trễ
+                    for con_lai in dang_cho:
+                        con_lai.cancel()
+                    return data
+            if not dang_cho and cac_nguon:
+                gui_tiep()
+        return None
+
+    def dong(self):
+        """Đóng các kết nối trong pool"""
+        if self._bo_thuc_thi is not None:
+            self._bo_thuc_thi.shutdown(wait=False)
+        self.session.close()
+
+class KetNoiUpstreamAsync(KetNoiUpstream):
+    """Phiên bản asyncio của KetNoiUpstream dùng aiohttp, cùng chính sách timeout và thử lại"""
+    def _tao_session(self, pool_size: int):
+        # Session aiohttp phải được tạo bên trong event loop nên tạo trễ ở lần gọi đầu tiên
+        return None
+
+    def _lay_session(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=0, limit_per_host=self.pool_size, keepalive_timeout=30),
+                # sock_connect thay vì connect: thời gian chờ kết nối rảnh trong pool không phải lỗi của mirror
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=self.timeout[0], sock_read=self.timeout[1]),
+                headers={"User-Agent": "FreeFireInfoBot/2.0", "Accept": "application/json"}
+            )
+        return self.session
+
+    async def lay_json(self, url: str, params: dict = None):
+        """GET và trả về JSON, hoặc None nếu thất bại sau khi đã thử lại"""
+        return (await self._lay_json(url, params))[1]
+
+    async def _lay_json(self, url: str, params: dict = None) -> tuple:
+        """Trả về (mirror có phản hồi hợp lệ không, JSON hoặc None)"""
+        session = self._lay_session()
+        nguon = self._nguon(url)
+        for lan in range(self.so_lan_thu_lai + 1):
+            con_luot = lan < self.so_lan_thu_lai
+            if not nguon.cho_phep():
+                self._ghi_loi("upstream_circuit_open")
+                return False, None
+            bat_dau = time.monotonic()
+            try:
+                async with session.get(url, params=params) as resp:
+                    if resp.status != 200:
+                        self._ghi_loi(f"upstream_http_{resp.status}")
+                    if resp.status not in MA_THU_LAI:
+                        if resp.status != 200:
+                            nguon.ghi_thanh_cong(time.monotonic() - bat_dau)
+                            self.logger.warning("⚠️ Upstream %s trả về HTTP %s", url, resp.status)
+                            return True, None
+                        try:
+                            data = await resp.json(content_type=None)
+                        except ValueError:
+                            self._ghi_loi("upstream_json")
+                            self._ghi_that_bai(nguon)
+                            self.logger.error(f"❌ Upstream {url} trả về dữ liệu không phải JSON")
+                            return False, None
+                        nguon.ghi_thanh_cong(time.monotonic() - bat_dau)
+                        return True, data
+                    cho = max(doc_retry_after(resp.headers.get("Retry-After")), self._thoi_gian_cho(lan))
+            except asyncio.CancelledError:
+                nguon.bo_thu()
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self._ghi_loi("upstream_timeout" if isinstance(e, asyncio.TimeoutError) else "upstream_connection")
+                self._ghi_that_bai(nguon)
+                if not con_luot or not _loi_ket_noi_async(e):
+                    self.logger.error(f"❌ Lỗi kết nối upstream {url}: {str(e)}")
+                    return False, None
+                await asyncio.sleep(self._thoi_gian_cho(lan))
+                continue
+
+            # Upstream quá tải: chờ rồi thử lại (sau khi đã trả kết nối về pool)
+            self._ghi_that_bai(nguon)
+            if not con_luot or cho > self.backoff_toi_da:
+                self.logger.error(f"❌ Upstream {url} trả về HTTP {resp.status}")
+                return False, None
+            await asyncio.sleep(cho)
+        return False, None
+
+    async def lay_json_nhieu_nguon(self, cac_url: list, params: dict = None):
+        """Giống KetNoiUpstream.lay_json_nhieu_nguon, yêu cầu thua cuộc được hủy ngay"""
+        cac_nguon = self._xep_hang(cac_url)
+        if not cac_nguon:
+            self._ghi_loi("upstream_circuit_open")
+            self.logger.warning("⚠️ Tất cả upstream đang bị tạm ngắt")
+            return None
+        if len(cac_nguon) == 1 or not self.hedge_phan_vi:
+            for nguon in cac_nguon:
+                thanh_cong, data = await self._lay_json(nguon.url, params)
+                if thanh_cong:
+                    return data
+            return None
+
+        dang_cho = set()
+        da_hedge = False
+
+        def gui_tiep():
+            dang_cho.add(asyncio.ensure_future(self._lay_json(cac_nguon.pop(0).url, params)))
+
+        han = self._han_hedge(cac_nguon[0])
+        gui_tiep()
+        try:
+            while dang_cho:
+                xong, dang_cho = await asyncio.wait(
+                    dang_cho, timeout=han if cac_nguon and not da_hedge else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not xong:
+                    da_hedge = True
+                    self._dem("upstream_hedges")
+                    gui_tiep()
+                    continue
+                for tac_vu in xong:
+                    thanh_cong, data = tac_vu.result()
+                    if thanh_cong:
+                        return data
+                if not dang_cho and cac_nguon:
+                    gui_tiep()
+            return None
+        finally:
+            for tac_vu in dang_cho:
+                tac_vu.cancel()
+
+    async def dong(self):
+        """Đóng session aiohttp"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
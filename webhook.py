@@ -0,0 +1,71 @@
+"""
+Máy chủ webhook nhận update từ Telegram - xác nhận ngay rồi giao update cho worker
+"""
+
+import hmac
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HEADER_SECRET = "X-Telegram-Bot-Api-Secret-Token"
+
+def tao_handler(duong_dan: str, secret: str, nhan_update, logger):
+    """Tạo lớp handler HTTP gắn với đường dẫn webhook và hàm nhận update"""
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def _tra_loi(self, code: int, body: bytes = b""):
+            self.send_response(code)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if body:
+                self.wfile.write(body)
+
+        def do_GET(self):
+            # Dùng cho health check khi triển khai
+            self._tra_loi(200 if self.path == "/healthz" else 404, b"ok" if self.path == "/healthz" else b"")
+
+        def do_POST(self):
+            if self.path != duong_dan:
+                self._tra_loi(404)
+                return
+
+            if secret and not hmac.compare_digest(self.headers.get(HEADER_SECRET, ""), secret):
+                logger.warning("🚫 Webhook từ chối yêu cầu sai secret token từ %s", self.client_address[0])
+                self._tra_loi(403)
+                return
+
+            try:
+                do_dai = int(self.headers.get("Content-Length") or 0)
+                update = json.loads(self.rfile.read(do_dai) or b"{}")
+            except ValueError:
+                self._tra_loi(400)
+                return
+
+            # Xác nhận với Telegram trước, xử lý update sau
+            self._tra_loi(200)
+            if isinstance(update, dict):
+                nhan_update(update)
+
+        def log_message(self, format, *args):
+            logger.debug("🌐 Webhook %s - " + format, self.address_string(), *args)
+
+    return WebhookHandler
+
+class MayChuWebhook:
+    """Máy chủ HTTP đa luồng nhận update qua webhook"""
+    def __init__(self, host: str, port: int, duong_dan: str, secret: str, nhan_update, logger):
+        self.logger = logger
+        self.server = ThreadingHTTPServer((host, port), tao_handler(duong_dan, secret, nhan_update, logger))
+        self.server.daemon_threads = True
+        self._luong = threading.Thread(target=self.server.serve_forever, name="ff-webhook", daemon=True)
+
+    @property
+    def dia_chi(self) -> tuple:
+        return self.server.server_address
+
+    def bat_dau(self):
+        self._luong.start()
+        self.logger.info(f"🌐 Webhook đang lắng nghe tại {self.dia_chi[0]}:{self.dia_chi[1]}")
+
+    def dung(self):
+        self.server.shutdown()
+        self.server.server_close()